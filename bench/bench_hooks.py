@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+# Memory Fabric hook benchmark
+# Runs the four hooks (through dispatch.py, or each script with --direct) end
+# to end, installed into a throwaway HOME, against the stub memory-hub in
+# bench/stub_hub. Reports per hook: cold start (first run on a fresh
+# install), warm wall time p50/p95, subprocesses spawned, memory-hub calls
+# and peak RSS. Baselines are saved as JSON under bench/baselines/.
+#
+# Usage:
+#   python bench/bench_hooks.py                          # default scenario
+#   python bench/bench_hooks.py --latency-ms 80 --registry 500 --no-daemon
+#   python bench/bench_hooks.py --save-baseline main
+#   python bench/bench_hooks.py --compare main           # exit 1 on regression
+
+import argparse
+import fcntl
+import json
+import os
+import platform
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO_ROOT = BENCH_DIR.parent
+HOOKS_SRC = REPO_ROOT / "claude" / "hooks" / "memory_fabric"
+CORPUS = BENCH_DIR / "corpus" / "prompts.jsonl"
+BASELINE_DIR = BENCH_DIR / "baselines"
+
+sys.path.insert(0, str(HOOKS_SRC))
+
+from episode_config import DEFAULTS as CONFIG_DEFAULTS
+from metrics import percentile
+
+HOOKS = (
+    ("UserPromptSubmit", "user_prompt_submit.py"),
+    ("Stop", "stop.py"),
+    ("PreCompact", "pre_compact.py"),
+    ("SessionEnd", "session_end.py"),
+)
+
+# Same store.gen bumps as the wrapper install.sh writes, so daemon caching behaves alike
+WRAPPER = """#!/usr/bin/env bash
+GEN="{runtime}/store.gen"
+case "${{1:-}} ${{2:-}}" in
+  " "|"--help "*|"-h "*|"assemble "*|"search "*|"episode match"|"episode list")
+    exec "{python}" -m stub_hub "$@"
+    ;;
+esac
+printf . >> "${{GEN}}" 2>/dev/null || true
+"{python}" -m stub_hub "$@"
+rc=$?
+printf . >> "${{GEN}}" 2>/dev/null || true
+exit $rc
+"""
+
+# A regression must exceed both the relative tolerance and this absolute floor
+MIN_DELTA = {"p50_ms": 5.0, "p95_ms": 10.0, "cold_ms": 20.0,
+             "spawns": 0.5, "hub_calls": 0.5, "peak_rss_mb": 2.0}
+
+# How long to wait for the write-queue flusher between runs
+SETTLE_TIMEOUT = 15
+
+
+def load_corpus(path: Path) -> list:
+    prompts = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                prompts.append(json.loads(line)["prompt"])
+    return prompts
+
+
+def assistant_reply(prompt: str) -> str:
+    """A plausible last_assistant_message for the Stop hook."""
+    first = prompt.splitlines()[0][:120]
+    return (f"I looked into \"{first}\". The change touches the hook utilities and the registry; "
+            "I updated the call sites, ran the affected checks and noted the follow-ups in the session. "
+            "Nothing else needed changing.")
+
+
+def provision(home: Path, python: str) -> Path:
+    """Install the hooks and a stub memory-hub wrapper into home; return the project dir."""
+    hooks_dst = home / ".claude" / "hooks" / "memory_fabric"
+    hooks_dst.mkdir(parents=True)
+    for src in HOOKS_SRC.glob("*.py"):
+        shutil.copy2(src, hooks_dst / src.name)
+    (hooks_dst / "cache").mkdir()
+    (hooks_dst / "logs").mkdir()
+    # As install.sh does
+    subprocess.run([python, "-m", "compileall", "-q", str(hooks_dst)], check=True)
+
+    runtime = home / ".local" / "share" / "memory-fabric"
+    (runtime / "bin").mkdir(parents=True)
+    wrapper = runtime / "bin" / "memory-hub"
+    wrapper.write_text(WRAPPER.format(runtime=runtime, python=python))
+    wrapper.chmod(0o755)
+
+    # A git work tree with a remote, as most sessions run in
+    project = home / "work" / "bench_project"
+    (project / ".git").mkdir(parents=True)
+    (project / ".git" / "HEAD").write_text("ref: refs/heads/main\n")
+    (project / ".git" / "config").write_text(
+        '[remote "origin"]\n\turl = https://github.com/bench/bench_project.git\n'
+    )
+    return project
+
+
+def hook_env(home: Path, args, spawn_log: Path, call_log: Path) -> dict:
+    """Environment for every hook run: user overrides stripped, scenario applied."""
+    env = {k: v for k, v in os.environ.items()
+           if not k.startswith(("MEMORY_FABRIC_", "STUB_HUB_", "MEMORY_HUB_")) and k not in CONFIG_DEFAULTS}
+    env.update({
+        "HOME": str(home),
+        # bench/ first: stub_hub for the wrapper and daemon, sitecustomize for spawn counting
+        "PYTHONPATH": str(BENCH_DIR),
+        "MEMORY_FABRIC_BENCH_SPAWN_LOG": str(spawn_log),
+        "MEMORY_FABRIC_DAEMON": "1" if args.daemon else "0",
+        "MEMORY_FABRIC_DAEMON_IDLE": "120",
+        "STUB_HUB_CALL_LOG": str(call_log),
+        "STUB_HUB_LATENCY_MS": str(args.latency_ms),
+        "STUB_HUB_WRITE_LATENCY_MS": str(args.write_latency_ms
+                                         if args.write_latency_ms is not None else args.latency_ms),
+        "STUB_HUB_IMPORT_MS": str(args.import_ms),
+        "STUB_HUB_ITEMS": str(args.items),
+        "STUB_HUB_ITEM_CHARS": str(args.item_chars),
+        "STUB_HUB_REGISTRY": str(args.registry),
+        "STUB_HUB_EPISODES": str(args.episodes),
+        "EPISODES_AUTO_INJECT": args.inject,
+    })
+    return env
+
+
+def run_process(cmd: list, payload: str, env: dict, cwd: str) -> dict:
+    """Run one process to completion; return wall time, peak RSS and output."""
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL, env=env, cwd=cwd)
+    try:
+        proc.stdin.write(payload.encode("utf-8"))
+        proc.stdin.close()
+    except BrokenPipeError:
+        pass
+    output = proc.stdout.read()
+    proc.stdout.close()
+    # wait4 instead of wait(): the rusage is this process's own peak RSS
+    _, status, usage = os.wait4(proc.pid, 0)
+    wall_ms = (time.perf_counter() - start) * 1000
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss_mb = usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return {"wall_ms": wall_ms, "rss_mb": rss_mb, "returncode": proc.returncode,
+            "stdout": output.decode("utf-8", "replace")}
+
+
+class LogTail:
+    """Read lines appended to a log since the last call."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.offset = 0
+
+    def new_timestamps(self) -> list:
+        try:
+            with open(self.path) as f:
+                f.seek(self.offset)
+                data = f.read()
+                self.offset = f.tell()
+        except OSError:
+            return []
+        stamps = []
+        for line in data.splitlines():
+            try:
+                stamps.append(float(json.loads(line)["ts"]) if line.startswith("{")
+                              else float(line.split("\t", 1)[0]))
+            except (ValueError, KeyError, IndexError):
+                continue
+        return stamps
+
+
+def wait_for_queue(home: Path):
+    """Wait until the write-behind flusher has drained the journal and exited."""
+    queue = home / ".local" / "share" / "memory-fabric" / "queue"
+    deadline = time.time() + SETTLE_TIMEOUT
+    while time.time() < deadline:
+        journal = queue / "journal.jsonl"
+        busy = (journal.exists() and journal.stat().st_size > 0) or any(queue.glob("journal.*.processing"))
+        if not busy and (queue / "flush.lock").exists():
+            fd = os.open(str(queue / "flush.lock"), os.O_RDWR)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                busy = True
+            finally:
+                os.close(fd)
+        if not busy:
+            return
+        time.sleep(0.02)
+
+
+def ledger_count(home: Path) -> int:
+    """Writes the flusher recorded for compaction (0: their output carried no memory id)."""
+    import sqlite3
+
+    ledger = home / ".local" / "share" / "memory-fabric" / "ledger.db"
+    if not ledger.exists():
+        return 0
+    conn = sqlite3.connect(str(ledger))
+    try:
+        return conn.execute("SELECT COUNT(*) FROM memories").fetchone()[0]
+    except sqlite3.Error:
+        return 0
+    finally:
+        conn.close()
+
+
+def stop_daemon(home: Path):
+    """Terminate the hub daemon started by the hooks, if any."""
+    path = home / ".local" / "share" / "memory-fabric" / "run" / "memory-hub.sock"
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(2)
+        sock.connect(str(path))
+        sock.sendall(b'{"op": "ping"}\n')
+        with sock.makefile("rb") as f:
+            pid = json.loads(f.readline().decode("utf-8"))["pid"]
+        os.kill(pid, signal.SIGTERM)
+    except (OSError, ValueError, KeyError):
+        pass
+    finally:
+        sock.close()
+
+
+def interpreter_floor(python: str, runs: int, env: dict) -> float:
+    """Median wall time of `python -c pass`: the part no hook change can remove."""
+    times = sorted(run_process([python, "-c", "pass"], "", env, "/")["wall_ms"] for _ in range(runs))
+    return percentile(times, 50)
+
+
+def run_scenario(args, home: Path) -> dict:
+    """Drive the corpus through the hooks; return per-hook samples."""
+    python = args.python
+    project = provision(home, python)
+    hooks_dst = home / ".claude" / "hooks" / "memory_fabric"
+    spawn_log = home / "bench_spawns.log"
+    call_log = home / "bench_hub_calls.jsonl"
+    env = hook_env(home, args, spawn_log, call_log)
+    spawns, calls = LogTail(spawn_log), LogTail(call_log)
+
+    corpus = load_corpus(Path(args.corpus))
+    samples = {name: [] for name, _ in HOOKS}
+    background = {"spawns": 0, "hub_calls": 0}
+
+    def run(name: str, payload: dict):
+        if args.direct:
+            cmd = [python, str(hooks_dst / dict(HOOKS)[name])]
+        else:
+            cmd = [python, str(hooks_dst / "dispatch.py"), name]
+        start_ts = time.time()
+        result = run_process(cmd, json.dumps(payload), env, str(project))
+        end_ts = time.time()
+        if name in ("Stop", "SessionEnd"):
+            wait_for_queue(home)
+        spawn_ts, call_ts = spawns.new_timestamps(), calls.new_timestamps()
+        # Work after the hook exited (queue flusher) is off the critical path
+        result["spawns"] = sum(1 for ts in spawn_ts if ts <= end_ts)
+        result["hub_calls"] = sum(1 for ts in call_ts if start_ts <= ts <= end_ts)
+        background["spawns"] += len(spawn_ts) - result["spawns"]
+        background["hub_calls"] += sum(1 for ts in call_ts if ts > end_ts)
+        if result["returncode"] != 0:
+            print(f"warning: {name} exited {result['returncode']}", file=sys.stderr)
+        del result["stdout"]
+        samples[name].append(result)
+
+    floor = interpreter_floor(python, 5, env)
+    n = 0
+    for s in range(args.sessions):
+        session_id = f"bench-{s:03d}"
+        base = {"session_id": session_id, "cwd": str(project)}
+        for p in range(args.prompts):
+            prompt = corpus[n % len(corpus)]
+            n += 1
+            run("UserPromptSubmit", dict(base, prompt=prompt))
+            run("Stop", dict(base, last_assistant_message=assistant_reply(prompt)))
+            if p == args.prompts // 2:
+                run("PreCompact", base)
+        run("SessionEnd", dict(base, reason="exit"))
+
+    stage_report = ""
+    if args.stages:
+        stage_report = subprocess.run(
+            [python, str(hooks_dst / "metrics.py"), "report", "--since", "1d"],
+            capture_output=True, text=True, env=env
+        ).stdout
+    stop_daemon(home)
+    background["ledgered"] = ledger_count(home)
+    if not background["ledgered"]:
+        print("warning: no write reached the compaction ledger", file=sys.stderr)
+    return {"samples": samples, "background": background, "interpreter_ms": floor,
+            "stage_report": stage_report}
+
+
+def summarize(samples: dict) -> dict:
+    """Collapse raw runs into the numbers a baseline keeps."""
+    summary = {}
+    for name, runs in samples.items():
+        if not runs:
+            continue
+        warm = sorted(r["wall_ms"] for r in runs[1:]) or [runs[0]["wall_ms"]]
+        summary[name] = {
+            "runs": len(runs),
+            "cold_ms": round(runs[0]["wall_ms"], 2),
+            "p50_ms": round(percentile(warm, 50), 2),
+            "p95_ms": round(percentile(warm, 95), 2),
+            "max_ms": round(warm[-1], 2),
+            "spawns": round(sum(r["spawns"] for r in runs) / len(runs), 2),
+            "hub_calls": round(sum(r["hub_calls"] for r in runs) / len(runs), 2),
+            "peak_rss_mb": round(max(r["rss_mb"] for r in runs), 2),
+        }
+    return summary
+
+
+def format_table(rows: list) -> str:
+    widths = [max(len(r[i]) for r in rows) for i in range(len(rows[0]))]
+    return "\n".join(
+        "  ".join(cell.ljust(w) if i == 0 else cell.rjust(w) for i, (cell, w) in enumerate(zip(r, widths)))
+        for r in rows
+    )
+
+
+def format_summary(summary: dict, interpreter_ms: float, background: dict) -> str:
+    rows = [("hook", "runs", "cold ms", "p50 ms", "p95 ms", "max ms", "spawns", "hub calls", "peak RSS MB")]
+    for name, s in summary.items():
+        rows.append((name, str(s["runs"]), f"{s['cold_ms']:.1f}", f"{s['p50_ms']:.1f}", f"{s['p95_ms']:.1f}",
+                     f"{s['max_ms']:.1f}", f"{s['spawns']:.2f}", f"{s['hub_calls']:.2f}",
+                     f"{s['peak_rss_mb']:.1f}"))
+    return (format_table(rows)
+            + f"\n\ninterpreter floor (python -c pass): {interpreter_ms:.1f} ms"
+            + f"\nbackground (queue flusher): {background['spawns']} spawns, {background['hub_calls']} hub calls,"
+            + f" {background.get('ledgered', 0)} writes ledgered")
+
+
+def compare(summary: dict, baseline: dict, tolerance: float) -> tuple[str, bool]:
+    """Table of changes against a baseline; True if any metric regressed."""
+    rows = [("hook", "metric", "baseline", "current", "change", "")]
+    regressed = False
+    for name, current in summary.items():
+        old = baseline.get("hooks", {}).get(name)
+        if not old:
+            continue
+        for metric, floor in MIN_DELTA.items():
+            before, after = old.get(metric), current.get(metric)
+            if before is None or after is None:
+                continue
+            delta = after - before
+            change = f"{delta / before * 100:+.1f}%" if before else f"{delta:+.2f}"
+            bad = delta > floor and delta > before * tolerance
+            regressed = regressed or bad
+            rows.append((name, metric, f"{before:.2f}", f"{after:.2f}", change, "REGRESSION" if bad else ""))
+    return format_table(rows), regressed
+
+
+def scenario_config(args) -> dict:
+    return {
+        "sessions": args.sessions, "prompts": args.prompts, "corpus": Path(args.corpus).name,
+        "latency_ms": args.latency_ms, "write_latency_ms": args.write_latency_ms,
+        "import_ms": args.import_ms, "items": args.items, "item_chars": args.item_chars,
+        "registry": args.registry, "episodes": args.episodes, "inject": args.inject,
+        "daemon": args.daemon, "direct": args.direct,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Memory Fabric hooks against a stub memory-hub")
+    parser.add_argument("--sessions", type=int, default=5, help="sessions to simulate (default 5)")
+    parser.add_argument("--prompts", type=int, default=6, help="prompts per session (default 6)")
+    parser.add_argument("--corpus", default=str(CORPUS), help="JSONL file of {\"prompt\": ...} lines")
+    parser.add_argument("--latency-ms", type=int, default=20, help="stub latency per read call (default 20)")
+    parser.add_argument("--write-latency-ms", type=int, help="stub latency per write (default: --latency-ms)")
+    parser.add_argument("--import-ms", type=int, default=150, help="stub import cost per process (default 150)")
+    parser.add_argument("--items", type=int, default=8, help="memories per assemble result (default 8)")
+    parser.add_argument("--item-chars", type=int, default=400, help="characters per memory (default 400)")
+    parser.add_argument("--registry", type=int, default=20, help="projects in the global registry (default 20)")
+    parser.add_argument("--episodes", type=int, default=10, help="stored episodes per project (default 10)")
+    parser.add_argument("--inject", default=CONFIG_DEFAULTS["EPISODES_AUTO_INJECT"], choices=["smart", "0", "1"],
+                        help="EPISODES_AUTO_INJECT mode")
+    parser.add_argument("--no-daemon", dest="daemon", action="store_false", help="run with MEMORY_FABRIC_DAEMON=0")
+    parser.add_argument("--python", default=sys.executable, help="interpreter the hooks run under")
+    parser.add_argument("--direct", action="store_true",
+                        help="run each hook script directly instead of through dispatch.py")
+    parser.add_argument("--stages", action="store_true", help="also print the per-stage metrics report")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary HOME for inspection")
+    parser.add_argument("--save-baseline", metavar="NAME", help="save results to bench/baselines/NAME.json")
+    parser.add_argument("--compare", metavar="NAME", help="compare with bench/baselines/NAME.json")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="relative slowdown allowed before --compare fails (default 0.15)")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        baseline = json.loads((BASELINE_DIR / f"{args.compare}.json").read_text())
+
+    home = Path(tempfile.mkdtemp(prefix="memory-fabric-bench-"))
+    try:
+        result = run_scenario(args, home)
+    finally:
+        if args.keep:
+            print(f"kept {home}", file=sys.stderr)
+        else:
+            shutil.rmtree(home, ignore_errors=True)
+
+    summary = summarize(result["samples"])
+    record = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": scenario_config(args),
+        "interpreter_ms": round(result["interpreter_ms"], 2),
+        "background": result["background"],
+        "hooks": summary,
+    }
+
+    if args.json:
+        print(json.dumps(record, indent=2))
+    else:
+        print(format_summary(summary, result["interpreter_ms"], result["background"]))
+        if result["stage_report"]:
+            print("\n" + result["stage_report"].rstrip())
+
+    if args.save_baseline:
+        BASELINE_DIR.mkdir(exist_ok=True)
+        path = BASELINE_DIR / f"{args.save_baseline}.json"
+        path.write_text(json.dumps(record, indent=2) + "\n")
+        print(f"\nbaseline saved: {path}")
+
+    if baseline is not None:
+        if baseline.get("config") != record["config"]:
+            print("\nwarning: scenario differs from the baseline's; numbers are not comparable", file=sys.stderr)
+        table, regressed = compare(summary, baseline, args.tolerance)
+        print(f"\ncompared with {args.compare} ({baseline.get('created', '?')}):\n{table}")
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+# Memory Fabric redaction benchmark
+# Measures the fallback redaction engine (claude/hooks/memory_fabric/
+# redaction.py) on synthetic log text with secrets sprinkled in: the old
+# one-re.sub-per-pattern loop, the single-pass Redactor.redact(), and
+# Redactor.stream() over fixed-size chunks. Checks that all three produce
+# the same output, including secrets placed across chunk boundaries, and
+# that secrets glued onto each other are redacted whole.
+#
+# Usage:
+#   python bench/bench_redaction.py                  # 4 MB, 64 KB chunks
+#   python bench/bench_redaction.py --mb 16 --chunk-kb 4 --repeat 5
+
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO_ROOT = BENCH_DIR.parent
+HOOKS_SRC = REPO_ROOT / "claude" / "hooks" / "memory_fabric"
+
+sys.path.insert(0, str(HOOKS_SRC))
+
+from redaction import RULES, Redactor
+
+WORDS = ("session", "tool", "result", "pytest", "passed", "failed", "import", "module", "config",
+         "error", "retry", "/usr/lib/python3", "user_prompt_submit.py", "HTTP", "200", "401",
+         "token", "key", "commit", "a1b2c3d4", "deploy", "cache", "hit", "miss", "ms")
+
+
+def secret(rng: random.Random) -> str:
+    alnum = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+    kind = rng.randrange(5)
+    if kind == 0:
+        return "sk-ant-api03-" + "".join(rng.choices(alnum + "-_", k=40))
+    if kind == 1:
+        return "sk-" + "".join(rng.choices(alnum, k=48))
+    if kind == 2:
+        return "ghp_" + "".join(rng.choices(alnum, k=36))
+    if kind == 3:
+        return "".join(rng.choices("abcdefghij.", k=8)).strip(".") + "x@example.com"
+    return "AKIA" + "".join(rng.choices("ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789", k=16))
+
+
+def make_text(size: int, chunk_size: int, seed: int = 7) -> str:
+    """About size characters of log-like lines, with a secret every ~50 lines
+    and one straddling each chunk boundary."""
+    rng = random.Random(seed)
+    lines = []
+    total = 0
+    while total < size:
+        words = rng.choices(WORDS, k=rng.randint(6, 18))
+        if rng.random() < 0.02:
+            words.insert(rng.randrange(len(words)), secret(rng))
+        line = f"[2026-01-01T12:00:{total % 60:02d}] " + " ".join(words) + "\n"
+        lines.append(line)
+        total += len(line)
+    text = "".join(lines)
+
+    # Splice a secret across every chunk boundary
+    parts = []
+    pos = 0
+    for boundary in range(chunk_size, len(text), chunk_size):
+        s = secret(rng)
+        start = boundary - len(s) // 2
+        parts.append(text[pos:start] + " " + s + " ")
+        pos = start + len(s) + 2
+    parts.append(text[pos:])
+    return "".join(parts)[:size]
+
+
+# The previous fallback in session_end.py: one re.sub per pattern
+LEGACY_PATTERNS = (
+    (r'sk-[a-zA-Z0-9]{20,}', '<REDACTED_TOKEN>'),
+    (r'sk-ant-[a-zA-Z0-9\-_]+', '<REDACTED_TOKEN>'),
+    (r'gh[pousr]_[a-zA-Z0-9]{36,}', '<REDACTED_TOKEN>'),
+    (r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[A-Za-z]{2,}', '<REDACTED_EMAIL>'),
+    (r'AKIA[0-9A-Z]{16}', '<REDACTED_AWS_KEY>'),
+)
+
+
+def legacy_redact(text: str) -> str:
+    for pattern, replacement in LEGACY_PATTERNS:
+        text = re.sub(pattern, replacement, text)
+    return text
+
+
+# Secrets glued onto each other, where one rule's match runs into the next
+# secret. The old loop replaced keys before emails, so these stay equal to it.
+GLUED_CASES = {
+    "a@b.cosk-ant-abc_def-1": "<REDACTED_EMAIL><REDACTED_TOKEN>",
+    "me@host.iosk-ant-api03-xyz rest": "<REDACTED_EMAIL><REDACTED_TOKEN> rest",
+    "ghp_" + "a" * 36 + "sk-ant-key_1": "<REDACTED_TOKEN><REDACTED_TOKEN>",
+    # An email without a local part isn't redacted, but what is glued onto it is
+    "see @corp.sk-ant-api03-SECRETKEY here": "see @corp.<REDACTED_TOKEN> here",
+    "@Q.sk-ant-secret123": "@Q.<REDACTED_TOKEN>",
+    # Three glued: the key merged onto the email is cut where the third starts
+    "a@corp.ghp_" + "b" * 36 + "sk-" + "c" * 24: "<REDACTED_EMAIL><REDACTED_TOKEN>",
+}
+
+
+def check_glued(redactor: Redactor, count: int, seed: int = 11) -> tuple:
+    """(failed fixed cases, fuzzed inputs leaking the end of a secret).
+
+    An email's secret part is its local part: "x@a.com" glued after another
+    email leaves "@a.com" behind, as the old loop did.
+    """
+    failed = [text for text, want in GLUED_CASES.items() if redactor.redact(text) != want]
+    rng = random.Random(seed)
+    leaked = 0
+    for _ in range(count):
+        pieces = [secret(rng) if rng.random() < 0.6 else rng.choice(WORDS + ("a@b.co",))
+                  for _ in range(rng.randint(2, 4))]
+        out = redactor.redact("".join(pieces))
+        secrets = [p.split("@")[0] for p in pieces if p not in WORDS and len(p) > 12]
+        leaked += any(p[-8:] in out for p in secrets)
+    return failed, leaked
+
+
+def best_of(repeat: int, fn) -> tuple:
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the fallback redaction engine")
+    parser.add_argument("--mb", type=float, default=4.0, help="Text size in MB")
+    parser.add_argument("--chunk-kb", type=int, default=64, help="Chunk size for the streaming run")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per variant (best is reported)")
+    args = parser.parse_args()
+
+    size = int(args.mb * 1024 * 1024)
+    chunk_size = args.chunk_kb * 1024
+    text = make_text(size, chunk_size)
+    chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+    redactor = Redactor(RULES)
+
+    variants = (
+        ("legacy (re.sub per pattern)", lambda: legacy_redact(text)),
+        ("single pass", lambda: redactor.redact(text)),
+        (f"stream ({args.chunk_kb} KB chunks)", lambda: "".join(redactor.stream(chunks))),
+    )
+    mb = len(text) / (1024 * 1024)
+    print(f"text: {mb:.1f} MB, {len(chunks)} chunks, {len(RULES)} rules")
+    results = []
+    for name, fn in variants:
+        elapsed, out = best_of(args.repeat, fn)
+        results.append(out)
+        print(f"  {name:<32} {elapsed * 1000:8.1f} ms  {mb / elapsed:7.1f} MB/s")
+
+    # Chunking the input naively would leave halves of the straddling secrets behind
+    naive = "".join(redactor.redact(c) for c in chunks)
+    ok = results[1] == results[2] and results[0] == results[1]
+    print(f"outputs equal: {'yes' if ok else 'NO'}"
+          f" (per-chunk redaction without carry-over would differ: {'yes' if naive != results[1] else 'no'})")
+
+    failed, leaked = check_glued(redactor, 20000)
+    for text in failed:
+        print(f"glued case wrong: {text!r} -> {redactor.redact(text)!r}")
+    print(f"glued secrets: {len(GLUED_CASES) - len(failed)}/{len(GLUED_CASES)} cases ok,"
+          f" {leaked} of 20000 fuzzed inputs leaked a secret's tail")
+    ok = ok and not failed and not leaked
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,23 @@
+# Benchmark spawn counter
+# Loaded by every Python process the benchmark starts (bench/ is first on
+# PYTHONPATH). When MEMORY_FABRIC_BENCH_SPAWN_LOG is set, each subprocess a
+# hook, the daemon or the queue flusher starts is appended to it as
+# "<ts>\t<pid>\t<executable>" so the harness can count them per run.
+
+import os
+import sys
+
+_SPAWN_LOG = os.environ.get("MEMORY_FABRIC_BENCH_SPAWN_LOG")
+
+if _SPAWN_LOG:
+    def _audit(event, args):
+        if event not in ("subprocess.Popen", "os.system", "os.posix_spawn", "os.exec"):
+            return
+        import time
+        try:
+            with open(_SPAWN_LOG, "a") as f:
+                f.write(f"{time.time()}\t{os.getpid()}\t{args[0]}\n")
+        except Exception:
+            pass
+
+    sys.addaudithook(_audit)
@@ -0,0 +1,220 @@
+from __future__ import annotations
+# Stub memory-hub for benchmarks
+# Answers the CLI calls the hooks make (assemble, search, write, delete,
+# episode, batch) with synthetic, deterministic results. Shape and cost are set by
+# environment variables so runs are reproducible:
+#
+#   STUB_HUB_LATENCY_MS        added to every read (assemble/search/episode match|list)
+#   STUB_HUB_WRITE_LATENCY_MS  added to every write (default: STUB_HUB_LATENCY_MS)
+#   STUB_HUB_IMPORT_MS         one-off import cost, like loading memory_hub + its index
+#   STUB_HUB_ITEMS             memories per assemble result (summaries: a third of that)
+#   STUB_HUB_ITEM_CHARS        characters per memory
+#   STUB_HUB_REGISTRY          project snapshots in the global registry
+#   STUB_HUB_EPISODES          stored episodes per project
+#   STUB_HUB_CALL_LOG          if set, one JSON line per call is appended here
+#
+# Run as `python -m stub_hub <command> ...`; the benchmark's memory-hub
+# wrapper does exactly that, and the hub daemon finds the module from it.
+
+import json
+import os
+import random
+import sys
+import time
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+LATENCY_MS = _env_int("STUB_HUB_LATENCY_MS", 20)
+WRITE_LATENCY_MS = _env_int("STUB_HUB_WRITE_LATENCY_MS", LATENCY_MS)
+IMPORT_MS = _env_int("STUB_HUB_IMPORT_MS", 150)
+ITEMS = _env_int("STUB_HUB_ITEMS", 8)
+ITEM_CHARS = _env_int("STUB_HUB_ITEM_CHARS", 400)
+REGISTRY = _env_int("STUB_HUB_REGISTRY", 20)
+EPISODES = _env_int("STUB_HUB_EPISODES", 10)
+CALL_LOG = os.environ.get("STUB_HUB_CALL_LOG", "")
+
+# Paid once per process, like the real package's imports
+time.sleep(IMPORT_MS / 1000.0)
+
+WORDS = (
+    "hook cache registry session project memory episode daemon queue write "
+    "assemble retry timeout socket journal token budget prompt index schema "
+    "migration deploy rollback config redaction summary latency snapshot"
+).split()
+
+USAGE = "usage: memory-hub {assemble,search,write,delete,episode,batch} ..."
+
+
+def _options(args: list) -> dict:
+    """Parse --key value / --flag pairs after the positional arguments."""
+    options = {}
+    i = 0
+    while i < len(args):
+        if args[i].startswith("--"):
+            if i + 1 < len(args) and not args[i + 1].startswith("--"):
+                options[args[i][2:]] = args[i + 1]
+                i += 2
+                continue
+            options[args[i][2:]] = True
+        i += 1
+    return options
+
+
+def _text(rng: random.Random, chars: int) -> str:
+    words = []
+    size = 0
+    while size < chars:
+        word = rng.choice(WORDS)
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)[:chars]
+
+
+def _rng(*parts) -> random.Random:
+    # Same arguments, same result: runs are comparable across machines
+    return random.Random("|".join(str(p) for p in parts))
+
+
+def assemble(query: str, options: dict) -> dict:
+    rng = _rng("assemble", query, options.get("project", ""), options.get("type", ""))
+    memories = [
+        {"id": f"m{i}", "type": options.get("type") or rng.choice(["note", "decision", "constraint"]),
+         "content": _text(rng, ITEM_CHARS), "score": round(1.0 - i * 0.05, 2)}
+        for i in range(ITEMS)
+    ]
+    summaries = [{"content": _text(rng, ITEM_CHARS // 2)} for _ in range(ITEMS // 3)]
+    result = {"query": query, "memories": memories, "summaries": summaries,
+              "token_count": sum(len(m["content"]) for m in memories) // 4}
+    if options.get("with-episodes") and EPISODES:
+        best = _episode(options.get("project", "default"), sum(map(ord, query)) % EPISODES)
+        result["episode_context"] = (f"## Best Known Path\n{best['intent']}\n"
+                                     + "".join(f"- {step}\n" for step in best["steps"])
+                                     + f"## Pitfalls\n- {best['error_signatures'][0]}\n")
+    return result
+
+
+def search(query: str, options: dict) -> list:
+    top_k = int(options.get("top-k", 10))
+    if options.get("project") == "global:project_registry":
+        count = min(REGISTRY, top_k)
+        return [
+            {"content": f"bench_project_{i:03d} | https://github.com/bench/bench_project_{i:03d} | "
+                        f"2026-01-{1 + i % 28:02d}T12:{i % 60:02d}:00 | {_text(_rng('summary', i), 80)}"}
+            for i in range(count)
+        ]
+    rng = _rng("search", query)
+    return [{"content": _text(rng, ITEM_CHARS), "score": round(1.0 - i * 0.05, 2)} for i in range(min(ITEMS, top_k))]
+
+
+def _episode(project: str, i: int) -> dict:
+    rng = _rng("episode", project, i)
+    return {
+        "id": f"ep_{project}_{i}",
+        "project_id": project,
+        "intent": _text(rng, 60),
+        "outcome": rng.choice(["success", "failure", "unknown"]),
+        "steps": [_text(rng, 50) for _ in range(3)],
+        "error_signatures": [rng.choice(["HTTP 401", "permission denied", "timeout"])],
+    }
+
+
+def episode(args: list, options: dict):
+    sub = args[0] if args else ""
+    project = options.get("project", "default")
+    if sub == "match":
+        k = min(int(options.get("k", 3)), EPISODES)
+        offset = sum(map(ord, str(options.get("prompt", "")))) % max(EPISODES, 1)
+        return [{"episode": _episode(project, (offset + i) % EPISODES), "score": round(0.9 - i * 0.1, 2)}
+                for i in range(k)]
+    if sub == "list":
+        return [_episode(project, i) for i in range(EPISODES)]
+    if sub == "record":
+        return {"ok": True, "id": f"ep_{time.time_ns()}"}
+    raise ValueError(f"unknown episode command: {sub}")
+
+
+def dispatch(args: list, input_data: str = "") -> tuple[str, int]:
+    """Run one CLI invocation; return (output, returncode), output being stderr if it failed."""
+    if not args or args[0] in ("-h", "--help"):
+        return USAGE + "\n", 0
+
+    command, rest = args[0], args[1:]
+    positional = []
+    while rest and not rest[0].startswith("--"):
+        positional.append(rest.pop(0))
+    options = _options(rest)
+
+    if command == "batch":
+        try:
+            ops = json.loads(input_data or "")
+        except json.JSONDecodeError as e:
+            return json.dumps({"ok": False, "error": f"invalid JSON: {e}", "results": []}), 2
+        # Same contract as hub_batch: after the first failure the rest are skipped (-1)
+        results = []
+        failed = False
+        for op in ops:
+            if failed:
+                results.append({"returncode": -1, "stdout": ""})
+                continue
+            output, code = dispatch([str(a) for a in op.get("args", [])], op.get("input") or "")
+            results.append({"returncode": code, "stdout": output})
+            failed = code != 0
+        return json.dumps({"ok": not failed, "results": results}), 1 if failed else 0
+
+    if command in ("write", "delete") or (command == "episode" and positional[:1] == ["record"]):
+        time.sleep(WRITE_LATENCY_MS / 1000.0)
+    else:
+        time.sleep(LATENCY_MS / 1000.0)
+
+    try:
+        if command == "assemble":
+            result = assemble(positional[0] if positional else "", options)
+        elif command == "search":
+            result = search(positional[0] if positional else "", options)
+        elif command == "write":
+            memory_id = f"m_{time.time_ns()}"
+            if not options.get("json"):
+                # Like the real CLI: JSON only when asked for
+                return f"Stored memory {memory_id}\n", 0
+            result = {"ok": True, "id": memory_id}
+        elif command == "delete":
+            if not positional:
+                raise ValueError("delete needs a memory id")
+            result = {"ok": True, "deleted": positional[0]}
+        elif command == "episode":
+            result = episode(positional, options)
+        else:
+            return f"unknown command: {command}\n{USAGE}\n", 2
+    except (ValueError, IndexError) as e:
+        return f"error: {e}\n", 1
+    return json.dumps(result) + "\n", 0
+
+
+def _log_call(args: list, ms: float, code: int):
+    if not CALL_LOG:
+        return
+    entry = {"ts": time.time(), "pid": os.getpid(), "command": " ".join(args[:2]),
+             "ms": round(ms, 3), "returncode": code}
+    try:
+        with open(CALL_LOG, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+    except OSError:
+        pass
+
+
+def main(argv: list = None) -> int:
+    args = list(sys.argv[1:] if argv is None else argv)
+    # Only batch takes stdin; other callers may leave it inherited and open
+    input_data = sys.stdin.read() if args[:1] == ["batch"] and sys.stdin else ""
+    start = time.perf_counter()
+    output, code = dispatch(args, input_data)
+    _log_call(args, (time.perf_counter() - start) * 1000, code)
+    # Errors go to stderr, like argparse's; batch always reports on stdout, like hub_batch
+    (sys.stdout if code == 0 or args[:1] == ["batch"] else sys.stderr).write(output)
+    return code
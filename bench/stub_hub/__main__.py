@@ -0,0 +1,5 @@
+import sys
+
+from stub_hub import main
+
+sys.exit(main())
@@ -4,7 +4,6 @@ from typing import Optional
 import json
 import os
 import re
-import subprocess
 import sys
 from pathlib import Path
 
@@ -21,26 +20,29 @@ PROJECT_PATTERN = re.compile(r'^[a-z0-9_\-]{1,80}$')
 MEMORY_HUB_BIN = os.path.expanduser("~/.local/share/memory-fabric/bin/memory-hub")
 CACHE_DIR = Path(os.path.expanduser("~/.claude/hooks/memory_fabric/cache"))
 LOG_DIR = Path(os.path.expanduser("~/.claude/hooks/memory_fabric/logs"))
+RUNTIME_DIR = Path(os.path.expanduser("~/.local/share/memory-fabric"))
+DAEMON_SOCKET = RUNTIME_DIR / "run" / "memory-hub.sock"
+DAEMON_SCRIPT = Path(__file__).resolve().with_name("hub_daemon.py")
+# Appended to on every store write; its stat signature is the store generation
+STORE_GENERATION_FILE = RUNTIME_DIR / "store.gen"
+# Don't try to start another daemon within this many seconds of the last attempt
+DAEMON_SPAWN_BACKOFF = 10
+
+# memory-hub commands known to only read the store. Everything else (write,
+# delete, episode record, summarize --promote, commands added later) bumps
+# store.gen, so the daemon never serves a result cached before it ran.
+READ_ONLY_COMMANDS = (("assemble",), ("search",), ("episode", "match"), ("episode", "list"))
 
 
 def get_project_id(cwd: str) -> str:
     """Determine project_id from cwd.
 
-    Always tries git rev-parse first, then falls back to dirname.
+    Uses the git work tree root (found without spawning git, cached on
+    disk), then falls back to dirname.
     """
-    # Always try git rev-parse first (works even in subdirectories)
     try:
-        result = subprocess.run(
-            ["git", "rev-parse", "--show-toplevel"],
-            cwd=cwd,
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
-        if result.returncode == 0:
-            git_root = result.stdout.strip()
-            if git_root:
-                return os.path.basename(git_root)
+        from git_resolver import resolve
+        return resolve(cwd)["project_id"]
     except Exception:
         pass
 
@@ -52,40 +54,20 @@ def extract_project_from_prompt(prompt: str) -> Optional[str]:
     """Extract project name from user prompt.
 
     Looks for:
-    - Known project names (e.g., p009_memory_fabric_global)
     - GitHub URLs containing project slugs
+    - An explicit project:<name>
+    - Distinctive known project names as bare words (e.g., p009_memory_fabric_global)
 
     Returns validated project_id if found and valid, else None.
     """
     if not prompt:
         return None
+    from prompt_matcher import get_matcher
 
-    # 1. Check for GitHub URLs and extract project slug
-    # Pattern: github.com/owner/slug or github.com/owner/slug/...
-    gh_pattern = re.compile(r'github\.com/([a-zA-Z0-9_\-]+)/([a-zA-Z0-9_\-]+)')
-    gh_match = gh_pattern.search(prompt)
-    if gh_match:
-        slug = gh_match.group(2)
-        if _is_valid_project(slug):
-            return slug
-
-    # 2. Check for known project names directly in prompt
-    # Look for project-like patterns: alphanumeric with underscores/hyphens
-    word_pattern = re.compile(r'\b([a-z][a-z0-9_\-]{2,79})\b')
-    for match in word_pattern.finditer(prompt.lower()):
-        candidate = match.group(1)
-        # Check if it's a known project
-        if candidate in KNOWN_PROJECTS:
-            return candidate
-
-    return None
-
-
-def _is_valid_project(name: str) -> bool:
-    """Validate project name against strict pattern."""
-    if not name:
-        return False
-    return bool(PROJECT_PATTERN.match(name))
+    matcher = get_matcher()
+    # 1. GitHub URLs: github.com/owner/slug or github.com/owner/slug/...
+    # 2. project:<name>, else distinctive known project names as whole words
+    return matcher.github_slug(prompt) or matcher.project(prompt)
 
 
 def get_session_id(hook_input: dict) -> str:
@@ -93,46 +75,202 @@ def get_session_id(hook_input: dict) -> str:
     return hook_input.get("session_id", "unknown")
 
 
-def log_message(message: str, session_id: str = "general"):
-    """Log to file."""
-    LOG_DIR.mkdir(parents=True, exist_ok=True)
-    log_file = LOG_DIR / f"hook_{session_id}.log"
-    with open(log_file, "a") as f:
-        from datetime import datetime
-        f.write(f"[{datetime.now().isoformat()}] {message}\n")
+def log_message(message: str, session_id: str = "general", level: str = "info"):
+    """Log to logs/hooks.jsonl (buffered; see hook_log.py)."""
+    from hook_log import log
+    log(message, session_id, level)
 
 
-def run_memory_hub(args: list, input_data: str = None) -> tuple[str, int]:
-    """Run memory-hub command and return (output, returncode)."""
+def run_memory_hub(args: list, input_data: str = None, timeout: float = 30) -> tuple[str, int]:
+    """Run memory-hub command and return (output, returncode).
+
+    Goes through the memory-hub daemon when it is up. If it is not, starts it
+    for the next call and runs this one through the wrapper process as before.
+    """
+    if daemon_enabled():
+        # The daemon bumps the store generation itself for writes
+        response = _request_daemon(args, input_data, timeout)
+        if response is not None:
+            return response
+        start_daemon()
+
+    # Only needed on this fallback path; hooks served by the daemon skip the import
+    import subprocess
+
+    is_write = is_write_command(args)
+    if is_write:
+        # Before and after: results cached while the write runs are invalidated too
+        bump_store_generation()
     try:
         result = subprocess.run(
             [MEMORY_HUB_BIN] + args,
             input=input_data,
             capture_output=True,
             text=True,
-            timeout=30
+            timeout=timeout
         )
-        return result.stdout, result.returncode
+        # A failed command may only explain itself on stderr (argparse does)
+        return result.stdout or (result.stderr if result.returncode else ""), result.returncode
     except Exception as e:
         return str(e), 1
+    finally:
+        if is_write:
+            bump_store_generation()
 
 
-def read_cache(session_id: str) -> Optional[dict]:
-    """Read cached data for session."""
-    cache_file = CACHE_DIR / f"{session_id}.json"
-    if cache_file.exists():
+def run_memory_hub_batch(ops: list, timeout: float = 30) -> Optional[list]:
+    """Apply write operations ({"args": [...], "input": ...}) with one `memory-hub batch` call.
+
+    Returns one {"returncode", "stdout"} per op (returncode -1 = skipped
+    after an earlier failure), or None if the batch call itself failed and
+    nothing is known to have been applied.
+    """
+    output, _ = run_memory_hub(["batch", "--json"], json.dumps(ops), timeout=timeout)
+    try:
+        report = json.loads(output.strip())
+        results = report.get("results")
+    except (json.JSONDecodeError, AttributeError):
+        return None
+    if not isinstance(results, list) or len(results) != len(ops):
+        return None
+    return results
+
+
+def is_read_only_command(args: list) -> bool:
+    """Check if a memory-hub invocation is known to leave the store alone."""
+    args = [str(a) for a in args]
+    if not args or args[0] in ("--help", "-h"):
+        return True
+    return any(args[:len(command)] == list(command) for command in READ_ONLY_COMMANDS)
+
+
+def is_write_command(args: list) -> bool:
+    """Check if a memory-hub invocation may modify the store (anything not known to be read-only)."""
+    return not is_read_only_command(args)
+
+
+def get_store_generation() -> str:
+    """Current store generation: changes whenever any writer appends to the marker."""
+    try:
+        st = STORE_GENERATION_FILE.stat()
+        return f"{st.st_ino}:{st.st_size}:{st.st_mtime_ns}"
+    except OSError:
+        return "0"
+
+
+def bump_store_generation():
+    """Invalidate cached query results (one-byte O_APPEND write, safe across processes)."""
+    try:
+        STORE_GENERATION_FILE.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(str(STORE_GENERATION_FILE), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
         try:
-            return json.loads(cache_file.read_text())
-        except Exception:
-            pass
-    return None
+            os.write(fd, b".")
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+
+def daemon_enabled() -> bool:
+    """Check if hooks should use the memory-hub daemon (MEMORY_FABRIC_DAEMON=0 disables)."""
+    return os.environ.get("MEMORY_FABRIC_DAEMON", "1") != "0"
+
+
+def _request_daemon(args: list, input_data: Optional[str], timeout: float) -> Optional[tuple[str, int]]:
+    """Send one request to the daemon.
+
+    Returns None only if the daemon could not be reached, so the caller may
+    safely fall back. Once the request is sent, errors are reported as a
+    failed call rather than retried, so a write never runs twice.
+    """
+    import socket
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(min(timeout, 1))
+        sock.connect(str(DAEMON_SOCKET))
+    except OSError:
+        sock.close()
+        return None
+
+    with sock:
+        try:
+            sock.settimeout(timeout)
+            request = {"args": [str(a) for a in args], "input": input_data, "cwd": os.getcwd()}
+            sock.sendall((json.dumps(request) + "\n").encode("utf-8"))
+            with sock.makefile("rb") as f:
+                response = json.loads(f.readline().decode("utf-8"))
+            return response.get("stdout", ""), int(response.get("returncode", 1))
+        except Exception as e:
+            return str(e), 1
+
+
+def start_daemon():
+    """Start the memory-hub daemon in the background (rate-limited, never blocks)."""
+    stamp = DAEMON_SOCKET.with_name("spawn.stamp")
+    try:
+        stamp.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        import time
+        if stamp.exists() and time.time() - stamp.stat().st_mtime < DAEMON_SPAWN_BACKOFF:
+            return
+        stamp.touch()
+        spawn_detached([sys.executable, str(DAEMON_SCRIPT)])
+    except Exception:
+        pass
+
+
+def spawn_detached(argv: list):
+    """Start argv in a new session with stdio on /dev/null and don't wait for it.
+
+    Uses os.posix_spawn where it supports setsid, so hooks that only need
+    to start a background process don't import subprocess.
+    """
+    try:
+        os.posix_spawn(argv[0], argv, os.environ, setsid=True, file_actions=[
+            (os.POSIX_SPAWN_OPEN, 0, os.devnull, os.O_RDONLY, 0),
+            (os.POSIX_SPAWN_OPEN, 1, os.devnull, os.O_WRONLY, 0),
+            (os.POSIX_SPAWN_OPEN, 2, os.devnull, os.O_WRONLY, 0),
+        ])
+        return
+    except (AttributeError, NotImplementedError):
+        pass  # No posix_spawn, or no setsid support on this platform
+
+    import subprocess
+    subprocess.Popen(
+        argv,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        close_fds=True,
+        start_new_session=True
+    )
+
+
+def read_cache(session_id: str) -> Optional[dict]:
+    """Read cached data for session (see session_store.py)."""
+    try:
+        import session_store
+        return session_store.get(session_id)
+    except Exception:
+        return None
 
 
 def write_cache(session_id: str, data: dict):
-    """Write cache data for session."""
-    CACHE_DIR.mkdir(parents=True, exist_ok=True)
-    cache_file = CACHE_DIR / f"{session_id}.json"
-    cache_file.write_text(json.dumps(data))
+    """Write cache data for session, replacing what was there."""
+    try:
+        import session_store
+        session_store.put(session_id, data)
+    except Exception as e:
+        log_message(f"Error writing session cache: {e}", session_id, "error")
+
+
+def delete_cache(session_id: str):
+    """Drop cached data for session."""
+    try:
+        import session_store
+        session_store.delete(session_id)
+    except Exception:
+        pass
 
 
 def read_hook_input() -> dict:
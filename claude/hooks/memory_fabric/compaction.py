@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+# Memory Fabric Compaction
+# Tiered retention for what the hooks write to memory-hub, so the store
+# (and every assemble/search over it) stops growing with how long the tool
+# has been in use.
+#
+# Ledger: the write-queue flusher records every write it lands (memory id,
+# type, session, importance, start of a note's text) in ledger.db. Queued
+# writes pass --json; only those whose output carries an id are recorded,
+# anything else is never compacted. Compaction plans from the ledger alone and never scans the store.
+#
+# Tiers:
+#   note (importance 0.3, one per turn): a session's notes older than
+#       NOTE_MAX_AGE are deleted, then folded into one summary unless
+#       SessionEnd already wrote one for the session. Deleted notes wait in
+#       state 'unfolded' until the fold has landed, so a failed or cut-short
+#       run writes it next time; a fold is never written for notes still live
+#   project_snapshot: deleted once a newer snapshot of the same project is
+#       SNAPSHOT_GRACE old
+#   summary: deleted after SUMMARY_MAX_AGE unless importance >= KEEP_IMPORTANCE
+#   episodes and anything else: kept
+#
+# Runs: SessionEnd starts this file as a detached process at most once per
+# RUN_INTERVAL. A run stops after TIME_BUDGET seconds and the next one picks
+# up where it stopped. Deletes go through `memory-hub batch` like every
+# other write, so cached query results are invalidated. Each run first
+# checks `memory-hub --help` for a delete command; without one it is skipped,
+# and the check is repeated once UNSUPPORTED_RECHECK has passed.
+#
+# Usage:
+#   python compaction.py                 # one run (what SessionEnd starts)
+#   python compaction.py --dry-run       # print each tier's next batch
+#   python compaction.py --stats         # ledger counts by type and state
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+# Add hooks dir to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from _util import RUNTIME_DIR, log_message, spawn_detached
+
+LEDGER_DB = RUNTIME_DIR / "ledger.db"
+RUN_LOCK = RUNTIME_DIR / "compaction.lock"
+# mtime is when the last run was started
+RUN_STAMP = RUNTIME_DIR / "compaction.stamp"
+
+DAY = 24 * 3600
+NOTE_MAX_AGE = 3 * DAY
+SNAPSHOT_GRACE = DAY
+SUMMARY_MAX_AGE = 180 * DAY
+KEEP_IMPORTANCE = 0.7
+# Deleted rows stay in the ledger this long (for --stats), then go too
+LEDGER_KEEP = 30 * DAY
+
+RUN_INTERVAL = 6 * 3600
+TIME_BUDGET = 20
+UNSUPPORTED_RECHECK = 7 * DAY
+# Operations per memory-hub call
+BATCH_MAX_OPS = 50
+# A delete failing this often is given up on
+MAX_ATTEMPTS = 3
+
+# Note text kept in the ledger for folding, and the folded summary's size
+SNIPPET_CHARS = 200
+FOLD_CHARS = 800
+
+# A delete command in `memory-hub --help`: argparse's {a,b,...} choices or a command list line
+DELETE_COMMAND_PATTERN = re.compile(r'\{[\w,-]*\bdelete\b[\w,-]*\}|^\s+delete\b', re.MULTILINE)
+# memory-hub output (stdout, else stderr) for a delete of a memory that is already gone
+NOT_FOUND_PATTERN = re.compile(r'not found|no such memory|does not exist', re.IGNORECASE)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS memories (
+    id         INTEGER PRIMARY KEY,
+    memory_id  TEXT NOT NULL,
+    type       TEXT NOT NULL,
+    session_id TEXT NOT NULL DEFAULT '',
+    project_id TEXT NOT NULL DEFAULT '',
+    importance REAL NOT NULL DEFAULT 0.5,
+    snippet    TEXT NOT NULL DEFAULT '',
+    created_at REAL NOT NULL,
+    state      TEXT NOT NULL DEFAULT 'live',
+    attempts   INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS memories_due ON memories (state, type, created_at);
+CREATE INDEX IF NOT EXISTS memories_session ON memories (session_id, type, state, created_at);
+CREATE INDEX IF NOT EXISTS memories_project ON memories (project_id, type, created_at);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def _connect():
+    import sqlite3
+
+    RUNTIME_DIR.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(LEDGER_DB), timeout=5)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+@contextmanager
+def _db():
+    """Connection wrapped in a transaction, closed afterwards."""
+    conn = _connect()
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def _memory_id(output: str) -> Optional[str]:
+    """The id memory-hub reported for a write, if any."""
+    try:
+        result = json.loads(output)
+        if isinstance(result, dict):
+            value = result.get("id") or result.get("memory_id")
+            return str(value) if value else None
+    except (ValueError, TypeError):
+        pass
+    return None
+
+
+def _option(args: list, name: str, default: str = "") -> str:
+    try:
+        return str(args[args.index(name) + 1])
+    except (ValueError, IndexError):
+        return default
+
+
+def _row(session_id: str, args: list, output: str, now: float) -> Optional[tuple]:
+    """Ledger row for a landed write, or None if it can't be compacted."""
+    if not args or args[0] != "write" or len(args) < 2:
+        return None
+    memory_id = _memory_id(output)
+    if not memory_id:
+        return None
+    content = str(args[1])
+    kind = _option(args, "--type", "note")
+    source = _option(args, "--source")
+    try:
+        importance = float(_option(args, "--importance", "0.5"))
+    except ValueError:
+        importance = 0.5
+    project_id = ""
+    if kind == "project_snapshot":
+        project_id = content.split(" | ", 1)[0]
+    elif source.startswith("project:"):
+        project_id = source[len("project:"):]
+    if source.startswith("session:"):
+        session_id = source[len("session:"):]
+    else:
+        match = re.match(r'\[session-(?:end|fold):([^\]]+)\]', content)
+        if match:
+            session_id = match.group(1)
+    snippet = content[:SNIPPET_CHARS] if kind == "note" else ""
+    return (memory_id, kind, session_id, project_id, importance, snippet, now, now)
+
+
+def _insert(conn, landed: list):
+    now = time.time()
+    rows = [r for r in (_row(s, a, o, now) for s, a, o in landed) if r]
+    conn.executemany(
+        "INSERT INTO memories (memory_id, type, session_id, project_id, importance, snippet, "
+        "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        rows
+    )
+
+
+def record_writes(landed: list):
+    """Add writes that reached memory-hub to the ledger: (session_id, args, output) each."""
+    if not landed:
+        return
+    with _db() as conn:
+        _insert(conn, landed)
+
+
+def _fold_text(session_id: str, snippets: list) -> str:
+    """One summary line from a session's notes, without the repeated prefix."""
+    prefix = f"[session:{session_id}] "
+    seen = []
+    for snippet in snippets:
+        text = " ".join((snippet[len(prefix):] if snippet.startswith(prefix) else snippet).split())
+        if text and text not in seen:
+            seen.append(text)
+    body = " | ".join(seen)
+    if len(body) > FOLD_CHARS:
+        body = body[:FOLD_CHARS - 3] + "..."
+    return f"[session-fold:{session_id}] Session notes: {body}"
+
+
+def _fold_op(conn, session_id: str, cutoff: float) -> dict:
+    """Summary write for a session's deleted notes and those about to be deleted."""
+    snippets = [r[0] for r in conn.execute(
+        "SELECT snippet FROM memories WHERE session_id = ? AND type = 'note' "
+        "AND (state = 'unfolded' OR (state = 'live' AND created_at < ?)) ORDER BY created_at",
+        (session_id, cutoff)
+    )]
+    return {"args": ["write", _fold_text(session_id, snippets),
+                     "--type", "summary", "--source", f"session:{session_id}",
+                     "--importance", "0.4", "--json"],
+            "session_id": session_id}
+
+
+def _plan_notes(conn, now: float, limit: int) -> list:
+    """Delete-then-fold ops for sessions with notes past NOTE_MAX_AGE.
+
+    A batch stops at its first failure, so a fold placed after its deletes
+    only runs once all of them have landed.
+    """
+    cutoff = now - NOTE_MAX_AGE
+    plan = []
+    # Folds left over from a run that failed or stopped after the deletes
+    pending = conn.execute(
+        "SELECT DISTINCT u.session_id FROM memories u WHERE u.state = 'unfolded' AND u.type = 'note' "
+        "AND NOT EXISTS (SELECT 1 FROM memories l WHERE l.session_id = u.session_id AND l.type = 'note' "
+        "AND l.state = 'live' AND l.created_at < ?) AND NOT EXISTS (SELECT 1 FROM memories s "
+        "WHERE s.session_id = u.session_id AND s.type = 'summary' AND s.state = 'live') LIMIT ?", (cutoff, limit)
+    ).fetchall()
+    plan.extend(_fold_op(conn, session_id, cutoff) for (session_id,) in pending)
+    # Sessions of the oldest due notes: an index range scan, however many notes are due
+    sessions = conn.execute(
+        "SELECT DISTINCT session_id FROM (SELECT session_id FROM memories WHERE state = 'live' "
+        "AND type = 'note' AND created_at < ? ORDER BY created_at LIMIT ?)", (cutoff, limit)
+    ).fetchall()
+    for (session_id,) in sessions:
+        if len(plan) >= limit:
+            break
+        notes = conn.execute(
+            "SELECT id, memory_id FROM memories WHERE session_id = ? AND state = 'live' "
+            "AND type = 'note' AND created_at < ? ORDER BY created_at LIMIT ?", (session_id, cutoff, limit)
+        ).fetchall()
+        summarized = conn.execute(
+            "SELECT 1 FROM memories WHERE session_id = ? AND type = 'summary' AND state = 'live' LIMIT 1",
+            (session_id,)
+        ).fetchone()
+        fold = not summarized
+        plan.extend({"args": ["delete", memory_id], "row": row_id, "fold": fold} for row_id, memory_id in notes)
+        # A long session's notes take several batches; the fold goes after the last of them
+        if fold and len(notes) < limit:
+            plan.append(_fold_op(conn, session_id, cutoff))
+    return plan
+
+
+def _plan_snapshots(conn, now: float, limit: int) -> list:
+    """Delete ops for snapshots superseded more than SNAPSHOT_GRACE ago."""
+    rows = conn.execute(
+        "SELECT a.id, a.memory_id FROM memories a WHERE a.state = 'live' AND a.type = 'project_snapshot' "
+        "AND EXISTS (SELECT 1 FROM memories b WHERE b.type = 'project_snapshot' "
+        "AND b.project_id = a.project_id AND b.created_at > a.created_at AND b.created_at < ?) LIMIT ?",
+        (now - SNAPSHOT_GRACE, limit)
+    ).fetchall()
+    return [{"args": ["delete", memory_id], "row": row_id} for row_id, memory_id in rows]
+
+
+def _plan_summaries(conn, now: float, limit: int) -> list:
+    """Delete ops for low-importance summaries past SUMMARY_MAX_AGE."""
+    rows = conn.execute(
+        "SELECT id, memory_id FROM memories WHERE state = 'live' AND type = 'summary' "
+        "AND created_at < ? AND importance < ? LIMIT ?",
+        (now - SUMMARY_MAX_AGE, KEEP_IMPORTANCE, limit)
+    ).fetchall()
+    return [{"args": ["delete", memory_id], "row": row_id} for row_id, memory_id in rows]
+
+
+PLANNERS = (("notes", _plan_notes), ("snapshots", _plan_snapshots), ("summaries", _plan_summaries))
+
+
+def _apply(conn, plan: list) -> tuple:
+    """Run plan's ops in one memory-hub call and update the ledger: (deleted, written, stop).
+
+    stop is set when memory-hub is failing; the run should end.
+    """
+    from write_queue import SKIPPED, apply_ops
+
+    outcomes = apply_ops([{"args": op["args"]} for op in plan])
+    now = time.time()
+    deleted = written = 0
+    landed = []
+    stop = False
+    for op, (code, output) in zip(plan, outcomes):
+        if code == SKIPPED:
+            stop = True
+            continue
+        if op["args"][0] == "write":
+            if code == 0:
+                landed.append((op["session_id"], op["args"], output))
+                written += 1
+                conn.execute(
+                    "UPDATE memories SET state = 'deleted', updated_at = ? "
+                    "WHERE session_id = ? AND type = 'note' AND state = 'unfolded'",
+                    (now, op["session_id"])
+                )
+            else:
+                stop = True
+            continue
+        if code == 0 or NOT_FOUND_PATTERN.search(output or ""):
+            conn.execute("UPDATE memories SET state = ?, updated_at = ? WHERE id = ?",
+                         ("unfolded" if op.get("fold") else "deleted", now, op["row"]))
+            deleted += 1
+        else:
+            conn.execute(
+                "UPDATE memories SET attempts = attempts + 1, updated_at = ?, "
+                "state = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE state END WHERE id = ?",
+                (now, MAX_ATTEMPTS, op["row"])
+            )
+            stop = True
+    _insert(conn, landed)
+    return deleted, written, stop
+
+
+def _delete_supported(conn, now: float) -> bool:
+    """Whether memory-hub lists a delete command; a "no" is cached for UNSUPPORTED_RECHECK."""
+    from _util import run_memory_hub
+
+    row = conn.execute("SELECT value FROM meta WHERE key = 'delete_unsupported'").fetchone()
+    if row is not None and now - float(row[0]) < UNSUPPORTED_RECHECK:
+        return False
+    output, code = run_memory_hub(["--help"], timeout=10)
+    if code != 0 or not output.strip():
+        return False  # memory-hub not answering: try again next run
+    with conn:
+        if DELETE_COMMAND_PATTERN.search(output):
+            conn.execute("DELETE FROM meta WHERE key = 'delete_unsupported'")
+            return True
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('delete_unsupported', ?)", (str(now),))
+    log_message("Compaction: memory-hub has no delete command, skipping", "compaction")
+    return False
+
+
+def run(time_budget: float = TIME_BUDGET, dry_run: bool = False) -> dict:
+    """One compaction run: apply due tiers until done or out of time; returns counts."""
+    import fcntl
+
+    deadline = time.time() + time_budget
+    counts = {"deleted": 0, "folded": 0}
+    RUNTIME_DIR.mkdir(parents=True, exist_ok=True)
+    fd = os.open(str(RUN_LOCK), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return counts  # Another run is in progress
+        conn = _connect()
+        try:
+            now = time.time()
+            if not dry_run and not _delete_supported(conn, now):
+                return counts
+            for name, planner in PLANNERS:
+                while time.time() < deadline:
+                    plan = planner(conn, now, BATCH_MAX_OPS)
+                    if not plan:
+                        break
+                    if dry_run:
+                        for op in plan:
+                            print(f"{name}: {' '.join(op['args'][:2])[:120]}")
+                        break
+                    with conn:
+                        deleted, written, stop = _apply(conn, plan)
+                    counts["deleted"] += deleted
+                    counts["folded"] += written
+                    if stop:
+                        return counts
+            if not dry_run:
+                with conn:
+                    conn.execute("DELETE FROM memories WHERE state IN ('deleted', 'failed') AND updated_at < ?",
+                                 (now - LEDGER_KEEP,))
+        finally:
+            conn.close()
+    finally:
+        os.close(fd)  # Releases the lock
+    return counts
+
+
+def maybe_spawn():
+    """Start a background run if none was started in the last RUN_INTERVAL seconds."""
+    try:
+        if time.time() - RUN_STAMP.stat().st_mtime < RUN_INTERVAL:
+            return
+    except OSError:
+        pass  # First run
+    try:
+        RUNTIME_DIR.mkdir(parents=True, exist_ok=True)
+        RUN_STAMP.touch()
+        spawn_detached([sys.executable, os.path.abspath(__file__)])
+    except OSError:
+        pass
+
+
+def stats() -> dict:
+    """Ledger counts: {type: {state: n}}."""
+    with _db() as conn:
+        rows = conn.execute("SELECT type, state, COUNT(*) FROM memories GROUP BY type, state").fetchall()
+    result = {}
+    for kind, state, n in rows:
+        result.setdefault(kind, {})[state] = n
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact what Memory Fabric wrote to memory-hub")
+    parser.add_argument("--dry-run", action="store_true", help="Print planned operations only")
+    parser.add_argument("--budget", type=float, default=TIME_BUDGET, help="Seconds per run")
+    parser.add_argument("--stats", action="store_true", help="Print ledger counts and exit")
+    args = parser.parse_args()
+
+    if args.stats:
+        print(json.dumps(stats(), indent=2, sort_keys=True))
+        return
+    counts = run(args.budget, args.dry_run)
+    if counts["deleted"] or counts["folded"]:
+        log_message(f"Compaction: deleted {counts['deleted']}, folded {counts['folded']} session(s)", "compaction")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+from __future__ import annotations
+# Memory Fabric Context Budget
+# Decides what goes into the injected context under one token budget.
+# Every candidate line (registry entry, episode, memory, summary) is an
+# item with a score and an estimated token cost; items are taken greedily
+# by score per token until the budget is spent, then rendered in their
+# original section order.
+#
+# Token counts come from a local estimator that splits text the way
+# cl100k-style BPE pre-tokenizes it (letter runs, 1-3 digit groups,
+# punctuation runs) and charges long letter runs one token per 8 letters.
+# It runs as a single findall and errs on the high side for non-English text.
+#
+# item_key() identifies an item by content, so UserPromptSubmit can leave
+# out what an earlier turn of the same session already injected.
+
+import hashlib
+import re
+from typing import Optional
+
+TOKEN_PIECE = re.compile(r'[A-Za-z]{1,8}|\d{1,3}|[^\w\s]{1,3}|_+|\w')
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimated BPE token count of text."""
+    return len(TOKEN_PIECE.findall(text)) if text else 0
+
+
+def truncate_tokens(text: str, max_tokens: int, suffix: str = "...") -> str:
+    """Cut text after max_tokens estimated tokens, on a token boundary."""
+    if max_tokens <= 0:
+        return ""
+    for count, match in enumerate(TOKEN_PIECE.finditer(text), 1):
+        if count == max_tokens:
+            end = match.end()
+            return text if end >= len(text.rstrip()) else text[:end] + suffix
+    return text
+
+
+def item(section: str, text: str, score: float, max_tokens: Optional[int] = None) -> dict:
+    """A candidate line for section; text is cut to max_tokens if given."""
+    text = text.rstrip()
+    if max_tokens is not None:
+        text = truncate_tokens(text, max_tokens)
+    return {"section": section, "text": text, "score": score, "tokens": max(1, estimate_tokens(text))}
+
+
+def pack(items: list, budget: int, headers: dict = None, caps: dict = None) -> list:
+    """Choose the items that fit in budget tokens, best score per token first.
+
+    headers maps a section to the text it costs once any of its items is
+    chosen; caps limits the tokens any one section can take. Returns the
+    chosen items in their original order.
+    """
+    headers = headers or {}
+    caps = caps or {}
+    header_tokens = {section: estimate_tokens(text) for section, text in headers.items()}
+
+    order = sorted(range(len(items)), key=lambda i: items[i]["score"] / items[i]["tokens"], reverse=True)
+    used = 0
+    section_used = {}
+    chosen = []
+    for i in order:
+        it = items[i]
+        section = it["section"]
+        cost = it["tokens"] + (0 if section in section_used else header_tokens.get(section, 0))
+        if used + cost > budget:
+            continue
+        cap = caps.get(section)
+        if cap is not None and section_used.get(section, 0) + it["tokens"] > cap:
+            continue
+        used += cost
+        section_used[section] = section_used.get(section, 0) + it["tokens"]
+        chosen.append(i)
+    return [items[i] for i in sorted(chosen)]
+
+
+def item_key(it: dict) -> str:
+    """Stable id for an item's content: a changed line gets a new key."""
+    return hashlib.blake2b(f"{it['section']}\0{it['text']}".encode("utf-8"), digest_size=8).hexdigest()
+
+
+def by_section(items: list) -> dict:
+    """Group chosen items' text by section, keeping order."""
+    sections = {}
+    for it in items:
+        sections.setdefault(it["section"], []).append(it["text"])
+    return sections
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# Memory Fabric hook dispatcher - single entry point for every hook event
+#
+# Usage (see templates/hooks_block.json):
+#   python dispatch.py UserPromptSubmit|Stop|PreCompact|SessionEnd
+#
+# Only the event's handler module is imported, and from cached bytecode: a
+# hook script run directly is recompiled on every start. Handlers import
+# what they need; this file imports nothing beyond the interpreter's own
+# startup set.
+#
+# Profiling: MEMORY_FABRIC_IMPORTTIME=1 re-runs each event under
+# `python -X importtime` and appends the report to logs/importtime.log.
+
+import os
+import sys
+
+HANDLERS = {
+    "UserPromptSubmit": "user_prompt_submit",
+    "Stop": "stop",
+    "PreCompact": "pre_compact",
+    "SessionEnd": "session_end",
+}
+
+
+def reexec_with_importtime(event: str):
+    """Replace this process with one running under -X importtime, stderr to the log."""
+    from _util import LOG_DIR
+    import time
+
+    LOG_DIR.mkdir(parents=True, exist_ok=True)
+    fd = os.open(str(LOG_DIR / "importtime.log"), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+    os.write(fd, f"# {time.strftime('%Y-%m-%dT%H:%M:%S')} {event}\n".encode("utf-8"))
+    os.dup2(fd, 2)
+    os.close(fd)
+    os.execv(sys.executable, [sys.executable, "-X", "importtime", os.path.abspath(__file__), event])
+
+
+def main():
+    event = sys.argv[1] if len(sys.argv) > 1 else ""
+    module = HANDLERS.get(event)
+    if module is None:
+        sys.stderr.write(f"usage: dispatch.py {{{','.join(HANDLERS)}}}\n")
+        sys.exit(1)
+
+    if os.environ.get("MEMORY_FABRIC_IMPORTTIME") == "1" and "importtime" not in sys._xoptions:
+        reexec_with_importtime(event)
+
+    # sys.path[0] is this script's directory, so the hook modules import as-is
+    __import__(module).main()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,10 @@
 # Memory Fabric Episode Configuration
 # Resolution order: env vars > config.json > defaults
+# Loaded once per process and cached (see load_config)
 
 import json
 import os
+import time
 from pathlib import Path
 from typing import Optional
 
@@ -12,7 +14,12 @@ DEFAULTS = {
     "EPISODES_AUTO_INJECT": "smart",   # smart|0|1
     "EPISODES_REDACT": "1",            # Redact secrets
     "EPISODES_MAX_TOKENS": "350",      # Max tokens for injection
-    "EPISODES_MATCH_K": "3",           # Number of episodes to match
+    "CONTEXT_MAX_TOKENS": "1200",      # Token budget for everything UserPromptSubmit injects
+    "CONTEXT_DEDUPE": "1",             # Don't re-inject items an earlier turn of the session injected
+    "NOTE_DEDUPE": "1",                # Skip Stop notes that near-duplicate an earlier one
+    "COMPACTION": "1",                 # Age out old notes, snapshots and summaries in the background
+    "PROMPT_BUDGET_MS": "5000",        # Overall retrieval deadline per prompt
+    "REGISTRY_CACHE_TTL": "300",       # Seconds to reuse the rendered Recent Projects block
 }
 
 # Primary config path: memory-fabric (dash)
@@ -21,6 +28,15 @@ CONFIG_PATH_DASH = Path.home() / ".local/share/memory-fabric/config.json"
 CONFIG_PATH_UNDERSCORE = Path.home() / ".local/share/memory_fabric/config.json"
 
 
+# Seconds between config.json mtime checks in long-lived processes; a hook
+# is done long before the first recheck, so it reads the file at most once
+RELOAD_CHECK_INTERVAL = 2.0
+
+# Loaded config: raw strings (env > file > defaults) and their typed values
+_state = {"path": None, "mtime_ns": None, "checked_at": 0.0, "raw": None, "values": None, "signatures": None,
+          "redaction_patterns": None}
+
+
 def get_config_path() -> Optional[Path]:
     """Get config path with resolution: dash path first, fallback to underscore."""
     if CONFIG_PATH_DASH.exists():
@@ -30,6 +46,105 @@ def get_config_path() -> Optional[Path]:
     return None
 
 
+def _int(minimum: int = None):
+    def parse(value: str, default: str) -> int:
+        try:
+            number = int(value)
+        except ValueError:
+            number = int(default)
+        return number if minimum is None else max(minimum, number)
+    return parse
+
+
+def _flag(value: str, default: str) -> bool:
+    return value == "1"
+
+
+def _inject_mode(value: str, default: str) -> str:
+    # Anything but smart/1 leaves injection off, as it always has
+    return value if value in ("smart", "0", "1") else "0"
+
+
+# How each key is typed and validated; invalid numbers fall back to the default
+PARSERS = {
+    "EPISODES_AUTO_RECORD": _flag,
+    "EPISODES_AUTO_INJECT": _inject_mode,
+    "EPISODES_REDACT": _flag,
+    "EPISODES_MAX_TOKENS": _int(),
+    "CONTEXT_MAX_TOKENS": _int(minimum=100),
+    "CONTEXT_DEDUPE": _flag,
+    "NOTE_DEDUPE": _flag,
+    "COMPACTION": _flag,
+    "PROMPT_BUDGET_MS": _int(minimum=100),
+    "REGISTRY_CACHE_TTL": _int(minimum=0),
+}
+
+
+def _read_config_file(path: Optional[Path]) -> dict:
+    if path is None:
+        return {}
+    try:
+        with open(path) as f:
+            config = json.load(f)
+    except (json.JSONDecodeError, IOError):
+        return {}
+    return config if isinstance(config, dict) else {}
+
+
+def _stat_mtime(path: Optional[Path]) -> Optional[int]:
+    try:
+        return path.stat().st_mtime_ns if path else None
+    except OSError:
+        return None
+
+
+def load_config(force: bool = False) -> dict:
+    """Typed config values, loaded once per process.
+
+    Resolution order per key: environment variable, config.json, default.
+    Long-lived processes see edits to config.json: every
+    RELOAD_CHECK_INTERVAL seconds the file is stat'ed and re-read if its
+    mtime changed.
+    """
+    now = time.monotonic()
+    if _state["values"] is not None and not force:
+        if now - _state["checked_at"] < RELOAD_CHECK_INTERVAL:
+            return _state["values"]
+        _state["checked_at"] = now
+        path = get_config_path()
+        if path == _state["path"] and _stat_mtime(path) == _state["mtime_ns"]:
+            return _state["values"]
+
+    path = get_config_path()
+    mtime_ns = _stat_mtime(path)
+    config = _read_config_file(path)
+
+    raw = {}
+    for key, default in DEFAULTS.items():
+        if key in os.environ:
+            raw[key] = os.environ[key]
+        elif key in config:
+            raw[key] = str(config[key])
+        else:
+            raw[key] = default
+    values = {key: PARSERS[key](raw[key], DEFAULTS[key]) for key in DEFAULTS}
+
+    # {"episodes": {"signatureReflex": [...]}} adds to the built-in signatures
+    episodes = config.get("episodes")
+    reflex = episodes.get("signatureReflex") if isinstance(episodes, dict) else None
+    signatures = list(ERROR_SIGNATURES)
+    if isinstance(reflex, list):
+        signatures.extend(str(sig) for sig in reflex if sig)
+
+    # {"redaction": {"patterns": [...]}} adds to the fallback redaction rules
+    redaction = config.get("redaction")
+    patterns = redaction.get("patterns") if isinstance(redaction, dict) else None
+
+    _state.update(path=path, mtime_ns=mtime_ns, checked_at=now, raw=raw, values=values,
+                  signatures=signatures, redaction_patterns=patterns if isinstance(patterns, list) else [])
+    return values
+
+
 def get_config(key: str) -> str:
     """
     Get config value with resolution order:
@@ -37,54 +152,76 @@ def get_config(key: str) -> str:
     2. config.json (dash path preferred, underscore fallback)
     3. Default
     """
-    # 1. Check environment
+    load_config()
+    if key in _state["raw"]:
+        return _state["raw"][key]
+    # Keys outside DEFAULTS aren't cached
     if key in os.environ:
         return os.environ[key]
-
-    # 2. Check config file(s)
-    config_path = get_config_path()
-    if config_path:
-        try:
-            with open(config_path) as f:
-                config = json.load(f)
-                if key in config:
-                    return str(config[key])
-        except (json.JSONDecodeError, IOError):
-            pass
-
-    # 3. Return default
-    return DEFAULTS.get(key, "")
+    config = _read_config_file(_state["path"])
+    return str(config[key]) if key in config else ""
 
 
 def get_episodes_auto_record() -> bool:
     """Check if auto-record is enabled."""
-    return get_config("EPISODES_AUTO_RECORD") == "1"
+    return load_config()["EPISODES_AUTO_RECORD"]
 
 
 def get_episodes_auto_inject() -> str:
     """Get auto-inject mode: smart|0|1"""
-    return get_config("EPISODES_AUTO_INJECT")
+    return load_config()["EPISODES_AUTO_INJECT"]
 
 
 def get_episodes_redact() -> bool:
     """Check if redaction is enabled."""
-    return get_config("EPISODES_REDACT") == "1"
+    return load_config()["EPISODES_REDACT"]
 
 
 def get_episodes_max_tokens() -> int:
     """Get max tokens for episode injection."""
-    try:
-        return int(get_config("EPISODES_MAX_TOKENS"))
-    except ValueError:
-        return 350
+    return load_config()["EPISODES_MAX_TOKENS"]
 
 
-def get_episodes_match_k() -> int:
-    """Get number of episodes to match."""
-    try:
-        return int(get_config("EPISODES_MATCH_K"))
-    except ValueError:
-        return 3
+def get_context_max_tokens() -> int:
+    """Get the token budget for the whole injected context."""
+    return load_config()["CONTEXT_MAX_TOKENS"]
+
+
+def get_context_dedupe() -> bool:
+    """Check if items already injected in this session are left out."""
+    return load_config()["CONTEXT_DEDUPE"]
+
+
+def get_note_dedupe() -> bool:
+    """Check if Stop skips notes that near-duplicate an earlier one."""
+    return load_config()["NOTE_DEDUPE"]
+
+
+def get_compaction() -> bool:
+    """Check if SessionEnd starts background compaction runs."""
+    return load_config()["COMPACTION"]
+
+
+def get_prompt_budget_ms() -> int:
+    """Get the overall retrieval deadline for UserPromptSubmit (milliseconds)."""
+    return load_config()["PROMPT_BUDGET_MS"]
+
+
+def get_registry_cache_ttl() -> int:
+    """Get TTL (seconds) for the cached Recent Projects block; 0 disables the cache."""
+    return load_config()["REGISTRY_CACHE_TTL"]
+
+
+def get_error_signatures() -> list:
+    """Get error signatures for smart injection: built-ins plus episodes.signatureReflex."""
+    load_config()
+    return _state["signatures"]
+
+
+def get_redaction_patterns() -> list:
+    """Get extra redaction patterns from config.json (redaction.patterns)."""
+    load_config()
+    return _state["redaction_patterns"]
 
 
 # Known error signatures for smart injection
@@ -102,7 +239,31 @@ ERROR_SIGNATURES = [
 ]
 
 
-def should_smart_inject(prompt: str, project_id: str = "", log_content: str = "") -> bool:
+def match_episodes(prompt: str, project_id: str, k: int = 1, timeout: float = 10) -> Optional[list]:
+    """Run memory-hub episode match; return the matches, or None if the call failed."""
+    from _util import run_memory_hub
+
+    output, code = run_memory_hub([
+        "episode", "match",
+        "--project", project_id,
+        "--prompt", prompt,
+        "--k", str(k),
+        "--json"
+    ], timeout=timeout)
+    if code != 0:
+        return None
+    try:
+        matches = json.loads(output.strip())
+    except (json.JSONDecodeError, ValueError):
+        return None
+    # Handle if matches is dict with 'matches' key
+    if isinstance(matches, dict):
+        matches = matches.get("matches") or []
+    return matches if isinstance(matches, list) else None
+
+
+def should_smart_inject(prompt: str, project_id: str = "", log_content: str = "",
+                        timeout: float = 10, matches: Optional[list] = None) -> bool:
     """
     Determine if smart injection should trigger (episode-match driven).
 
@@ -110,43 +271,19 @@ def should_smart_inject(prompt: str, project_id: str = "", log_content: str = ""
     (A) Episode match exists for this prompt via memory-hub episode match --k >=1
     OR (B) Error signature match in prompt/log (secondary trigger)
 
+    Pass matches from an earlier match_episodes call to skip running the match again.
+    The match is also skipped when the local episode index rules it out.
     Falls back to keyword heuristic only if episode match fails.
     """
-    import subprocess
-
-    prompt_lower = prompt.lower()
-    log_lower = log_content.lower() if log_content else ""
-
     # Strategy A: Try episode match first
-    if project_id and project_id not in ("tmp", "default", ""):
-        try:
-            result = subprocess.run(
-                ["memory-hub", "episode", "match",
-                 "--project", project_id,
-                 "--prompt", prompt,
-                 "--k", "1",
-                 "--json"],
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            if result.returncode == 0:
-                import json
-                try:
-                    matches = json.loads(result.stdout.strip())
-                    if isinstance(matches, list) and len(matches) >= 1:
-                        return True
-                    # Handle if matches is dict with 'matches' key
-                    if isinstance(matches, dict) and matches.get("matches"):
-                        return True
-                except (json.JSONDecodeError, ValueError):
-                    pass
-        except Exception:
-            pass  # Fall through to error signature check
+    if matches is None and project_id and project_id not in ("tmp", "default", ""):
+        from episode_index import may_match
+        if may_match(project_id, prompt) is not False:
+            matches = match_episodes(prompt, project_id, k=1, timeout=timeout)
+    if matches:
+        return True
 
     # Strategy B: Error signature match (secondary trigger)
-    for error in ERROR_SIGNATURES:
-        if error.lower() in prompt_lower or error.lower() in log_lower:
-            return True
-
-    return False
+    from prompt_matcher import get_matcher
+    matcher = get_matcher()
+    return bool(matcher.signature(prompt) or matcher.signature(log_content))
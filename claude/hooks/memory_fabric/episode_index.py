@@ -0,0 +1,148 @@
+from __future__ import annotations
+# Memory Fabric Episode Index
+# Local pre-filter for episode matching. For each project it keeps the
+# intent and error-signature tokens of every stored episode, so
+# UserPromptSubmit can tell "no episode could match this prompt" without
+# a memory-hub call. Only prompts that share words with some episode go on
+# to `memory-hub episode match`.
+#
+# SessionEnd adds each episode it records; the whole index is refreshed
+# from `memory-hub episode list` when it is missing or older than
+# INDEX_MAX_AGE (episodes recorded outside the hooks).
+
+import json
+import os
+import re
+import time
+from typing import Iterable, Optional
+
+from _util import RUNTIME_DIR
+
+INDEX_DIR = RUNTIME_DIR / "episode_index"
+INDEX_LOCK = INDEX_DIR / ".lock"
+# Refresh from memory-hub after this many seconds
+INDEX_MAX_AGE = 6 * 3600
+# Oldest episodes beyond this are dropped from a project's index
+MAX_EPISODES = 2000
+# Words shared with one episode before it is worth a full match
+MIN_SHARED_TOKENS = 2
+
+WORD_PATTERN = re.compile(r'[a-z0-9]{3,}')
+STOPWORDS = frozenset("""
+    the and for are but not you all any can had her was one our out has him his how its may new now
+    see two who did get let say she too use that with have this will your from they been were what
+    when which their there then them than into some could would should about after also just like
+    make made more most much need only over such take very want well does done please help
+""".split())
+
+
+def tokens(text: str) -> frozenset:
+    """Lowercased content words of text (3+ characters, stopwords dropped)."""
+    return frozenset(WORD_PATTERN.findall(text.lower())) - STOPWORDS
+
+
+def episode_tokens(episode: dict) -> frozenset:
+    """Tokens an episode can be matched on: its intent and error signatures."""
+    signatures = episode.get("error_signatures") or []
+    if isinstance(signatures, str):
+        signatures = [signatures]
+    return tokens(" ".join([str(episode.get("intent") or "")] + [str(s) for s in signatures]))
+
+
+def _index_path(project_id: str):
+    return INDEX_DIR / (re.sub(r'[^A-Za-z0-9_.\-]', '_', project_id) + ".json")
+
+
+def _read(project_id: str) -> Optional[dict]:
+    try:
+        with open(_index_path(project_id), "r") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return data if isinstance(data, dict) and isinstance(data.get("episodes"), list) else None
+
+
+def _write(project_id: str, episodes: list, built_at: float):
+    path = _index_path(project_id)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        json.dump({"built_at": built_at, "episodes": episodes[-MAX_EPISODES:]}, f)
+    os.replace(tmp, path)
+
+
+def _locked(update):
+    import fcntl
+
+    INDEX_DIR.mkdir(parents=True, exist_ok=True)
+    fd = os.open(str(INDEX_LOCK), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        update()
+    finally:
+        os.close(fd)  # Releases the lock
+
+
+def add_episode(project_id: str, intent: str, error_signatures: Iterable[str] = ()):
+    """Add a just-recorded episode. A project without an index stays without one
+    (it is built in full from memory-hub on next use)."""
+    words = tokens(" ".join([intent or ""] + list(error_signatures)))
+    if not words:
+        return
+
+    def update():
+        data = _read(project_id)
+        if data is None:
+            return
+        data["episodes"].append(sorted(words))
+        _write(project_id, data["episodes"], data.get("built_at", 0))
+
+    _locked(update)
+
+
+def rebuild(project_id: str, episodes: list):
+    """Replace a project's index with the given episode dicts (oldest first)."""
+    entries = [sorted(t) for t in (episode_tokens(e) for e in episodes if isinstance(e, dict)) if t]
+    _locked(lambda: _write(project_id, entries, time.time()))
+
+
+def refresh(project_id: str, timeout: float = 10) -> bool:
+    """Rebuild a project's index from `memory-hub episode list`; False if the call failed."""
+    from _util import run_memory_hub
+
+    output, code = run_memory_hub(["episode", "list", "--project", project_id, "--json"], timeout=timeout)
+    if code != 0:
+        return False
+    try:
+        episodes = json.loads(output.strip())
+    except ValueError:
+        return False
+    if isinstance(episodes, dict):
+        episodes = episodes.get("episodes") or []
+    if not isinstance(episodes, list):
+        return False
+    rebuild(project_id, episodes)
+    return True
+
+
+def is_stale(project_id: str) -> bool:
+    """True if the index is missing or due for a refresh from memory-hub."""
+    data = _read(project_id)
+    return data is None or time.time() - data.get("built_at", 0) > INDEX_MAX_AGE
+
+
+def may_match(project_id: str, prompt: str) -> Optional[bool]:
+    """Could any stored episode match prompt?
+
+    False means no episode shares enough words with the prompt to be worth
+    a full match; None means there is no index to decide from.
+    """
+    data = _read(project_id)
+    if data is None:
+        return None
+    words = tokens(prompt)
+    if not words:
+        return False
+    for entry in data["episodes"]:
+        if len(words.intersection(entry)) >= min(MIN_SHARED_TOKENS, len(entry)):
+            return True
+    return False
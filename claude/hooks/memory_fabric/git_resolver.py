@@ -0,0 +1,145 @@
+from __future__ import annotations
+# Memory Fabric Git Resolver
+# Pure-Python replacement for `git rev-parse --show-toplevel` and
+# `git remote get-url origin`, with an on-disk cache keyed by cwd.
+
+import json
+import os
+from typing import Optional
+
+from _util import CACHE_DIR
+
+GIT_CACHE_FILE = CACHE_DIR / "_git_resolve.json"
+# Keep the cache small; hooks only ever see a handful of working directories
+MAX_CACHE_ENTRIES = 256
+
+
+def _mtime(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _read_gitdir_file(path: str) -> Optional[str]:
+    """Resolve a `.git` file (worktree/submodule) of the form `gitdir: <path>`."""
+    try:
+        with open(path) as f:
+            line = f.readline().strip()
+    except OSError:
+        return None
+    if not line.startswith("gitdir:"):
+        return None
+    gitdir = line[len("gitdir:"):].strip()
+    return os.path.normpath(os.path.join(os.path.dirname(path), gitdir))
+
+
+def find_git_root(cwd: str) -> tuple[Optional[str], Optional[str], list]:
+    """Walk up from cwd looking for `.git`.
+
+    Returns (work tree root, common git dir, directories visited). The common
+    git dir is where `config` lives: the main repository's `.git` for linked
+    worktrees, the module dir for submodules.
+    """
+    visited = []
+    current = os.path.realpath(cwd)
+    while True:
+        visited.append(current)
+        dot_git = os.path.join(current, ".git")
+        if os.path.isdir(dot_git):
+            return current, dot_git, visited
+        if os.path.isfile(dot_git):
+            git_dir = _read_gitdir_file(dot_git)
+            if git_dir:
+                common_dir = git_dir
+                try:
+                    # Linked worktrees point back at the main repository
+                    with open(os.path.join(git_dir, "commondir")) as f:
+                        common_dir = os.path.normpath(os.path.join(git_dir, f.read().strip()))
+                except OSError:
+                    pass
+                return current, common_dir, visited
+        parent = os.path.dirname(current)
+        if parent == current:
+            return None, None, visited
+        current = parent
+
+
+def read_remote_url(config_path: str, remote: str = "origin") -> str:
+    """Read `remote.<name>.url` from a git config file."""
+    section = f'[remote "{remote}"]'
+    in_section = False
+    try:
+        with open(config_path) as f:
+            for raw in f:
+                line = raw.strip()
+                if line.startswith("["):
+                    in_section = line.replace("\t", " ") == section
+                    continue
+                if in_section and "=" in line:
+                    key, value = line.split("=", 1)
+                    if key.strip().lower() == "url":
+                        return value.strip().strip('"')
+    except OSError:
+        pass
+    return ""
+
+
+def _load_cache() -> dict:
+    try:
+        return json.loads(GIT_CACHE_FILE.read_text())
+    except Exception:
+        return {}
+
+
+def _save_cache(cache: dict):
+    if len(cache) > MAX_CACHE_ENTRIES:
+        for key in list(cache)[:len(cache) - MAX_CACHE_ENTRIES]:
+            del cache[key]
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = GIT_CACHE_FILE.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(cache))
+        os.replace(tmp, GIT_CACHE_FILE)
+    except OSError:
+        pass
+
+
+def _is_fresh(entry: dict) -> bool:
+    """An entry is valid while none of the directories it depends on changed."""
+    for path, mtime in entry.get("mtimes", {}).items():
+        if _mtime(path) != mtime:
+            return False
+    return True
+
+
+def resolve(cwd: str) -> dict:
+    """Resolve cwd to {"project_id", "git_root", "remote_url"}.
+
+    project_id is the basename of the work tree root (as with
+    `git rev-parse --show-toplevel`), else the basename of cwd.
+    """
+    cache = _load_cache()
+    entry = cache.get(cwd)
+    if entry and _is_fresh(entry):
+        return entry["result"]
+
+    git_root, common_dir, visited = find_git_root(cwd)
+    remote_url = ""
+    # Creating or removing .git in any visited directory changes its mtime
+    mtimes = {path: _mtime(path) for path in visited}
+    if common_dir:
+        config_path = os.path.join(common_dir, "config")
+        remote_url = read_remote_url(config_path)
+        mtimes[config_path] = _mtime(config_path)
+
+    if git_root:
+        project_id = os.path.basename(git_root)
+    else:
+        project_id = os.path.basename(cwd.rstrip(os.sep)) or "default"
+
+    result = {"project_id": project_id, "git_root": git_root or "", "remote_url": remote_url}
+    cache.pop(cwd, None)  # Re-insert so eviction drops the oldest resolutions first
+    cache[cwd] = {"result": result, "mtimes": mtimes}
+    _save_cache(cache)
+    return result
@@ -0,0 +1,203 @@
+from __future__ import annotations
+# Memory Fabric Hook Log
+# Structured log shared by every hook, the daemon and the queue flusher:
+# one JSONL file, logs/hooks.jsonl, with the session id as a field.
+# Records are buffered in memory and appended in one write when the process
+# exits, through one file descriptor per process. Long-lived processes (the
+# daemon, the queue flusher) call start_flush_thread(), which writes the
+# buffer every FLUSH_INTERVAL seconds even while nothing else is logged; a
+# burst of FLUSH_RECORDS records is written right away.
+#
+# Record: {"ts": "2026-01-01T12:00:00.123", "level": "info", "pid": 123,
+#          "session_id": "...", "msg": "..."}
+#
+# Rotation: when hooks.jsonl passes MAX_BYTES or its first record is older
+# than MAX_AGE, the writer renames it to hooks.<stamp>.jsonl (cheap, under a
+# flock). compress_rotated(), run by SessionEnd, gzips those, keeps the
+# newest KEEP_ROTATED and deletes the old per-session hook_<id>.log files.
+#
+# Level filter: MEMORY_FABRIC_LOG_LEVEL=debug|info|warning|error (default info).
+
+import atexit
+import json
+import os
+import threading
+import time
+
+from _util import LOG_DIR
+
+LOG_FILE = LOG_DIR / "hooks.jsonl"
+LOG_LOCK = LOG_DIR / ".hooks.lock"
+
+MAX_BYTES = 5 * 1024 * 1024
+MAX_AGE = 24 * 3600
+KEEP_ROTATED = 10
+# Rotated files untouched this long are safe to compress
+ROTATED_SETTLE = 60
+# Pre-JSONL per-session logs older than this are deleted
+LEGACY_MAX_AGE = 7 * 24 * 3600
+
+FLUSH_INTERVAL = 2.0
+FLUSH_RECORDS = 200
+
+LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+
+_buffer = []
+_lock = threading.Lock()
+_state = {"fd": None, "flushed_at": time.monotonic(), "min_level": None, "thread": None}
+
+
+def _min_level() -> int:
+    if _state["min_level"] is None:
+        name = os.environ.get("MEMORY_FABRIC_LOG_LEVEL", "info").lower()
+        _state["min_level"] = LEVELS.get(name, LEVELS["info"])
+    return _state["min_level"]
+
+
+def _timestamp(t: float) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(t)) + f".{int(t % 1 * 1000):03d}"
+
+
+def log(message: str, session_id: str = "general", level: str = "info"):
+    """Buffer one record; written at exit or on the next periodic flush."""
+    if LEVELS.get(level, LEVELS["info"]) < _min_level():
+        return
+    t = time.time()
+    record = {"ts": _timestamp(t), "level": level, "pid": os.getpid(),
+              "session_id": session_id, "msg": message}
+    with _lock:
+        _buffer.append(record)
+        due = len(_buffer) >= FLUSH_RECORDS or time.monotonic() - _state["flushed_at"] >= FLUSH_INTERVAL
+    if due:
+        flush()
+
+
+def _first_record_time(path) -> float:
+    """ts of the first record in path as epoch seconds, or now if unreadable."""
+    try:
+        with open(path, "r") as f:
+            first = json.loads(f.readline())
+        return time.mktime(time.strptime(first["ts"][:19], "%Y-%m-%dT%H:%M:%S"))
+    except (OSError, ValueError, KeyError, TypeError):
+        return time.time()
+
+
+def _rotate_if_due():
+    """Rename hooks.jsonl aside when it is too big or too old; the caller reopens it."""
+    try:
+        st = os.stat(LOG_FILE)
+    except OSError:
+        return False
+    if st.st_size < MAX_BYTES and time.time() - _first_record_time(LOG_FILE) < MAX_AGE:
+        return False
+    import fcntl
+
+    fd = os.open(str(LOG_LOCK), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        # Another process may have rotated while we waited
+        try:
+            if os.stat(LOG_FILE).st_ino != st.st_ino:
+                return True
+        except OSError:
+            return True
+        stamp = time.strftime("%Y%m%dT%H%M%S") + f"-{os.getpid()}"
+        os.rename(LOG_FILE, LOG_DIR / f"hooks.{stamp}.jsonl")
+        return True
+    finally:
+        os.close(fd)  # Releases the lock
+
+
+def _open():
+    if _state["fd"] is not None:
+        try:
+            # Reopen if another process rotated the file under us
+            if os.fstat(_state["fd"]).st_ino == os.stat(LOG_FILE).st_ino:
+                return _state["fd"]
+        except OSError:
+            pass
+        os.close(_state["fd"])
+        _state["fd"] = None
+    LOG_DIR.mkdir(parents=True, exist_ok=True)
+    try:
+        _rotate_if_due()
+    except OSError:
+        pass
+    _state["fd"] = os.open(str(LOG_FILE), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+    return _state["fd"]
+
+
+def flush():
+    """Append buffered records in one write."""
+    with _lock:
+        records = _buffer[:]
+        _buffer.clear()
+        _state["flushed_at"] = time.monotonic()
+        if not records:
+            return
+        data = "".join(json.dumps(r) + "\n" for r in records).encode("utf-8")
+        try:
+            os.write(_open(), data)
+        except OSError:
+            pass  # Logging never breaks a hook
+
+
+def start_flush_thread(interval: float = FLUSH_INTERVAL):
+    """Flush every interval seconds from a daemon thread (once per process)."""
+    with _lock:
+        if _state["thread"] is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                if _buffer:
+                    flush()
+
+        _state["thread"] = threading.Thread(target=run, name="hook-log-flush", daemon=True)
+        _state["thread"].start()
+
+
+def compress_rotated(keep: int = KEEP_ROTATED):
+    """Gzip rotated logs, drop all but the newest keep, and delete old per-session logs."""
+    import gzip
+    import shutil
+
+    try:
+        names = os.listdir(LOG_DIR)
+    except OSError:
+        return
+    settled = time.time() - ROTATED_SETTLE
+    for name in names:
+        if name.startswith("hooks.") and name.endswith(".jsonl") and name != LOG_FILE.name:
+            path = LOG_DIR / name
+            try:
+                # A process that had it open may still append once before reopening
+                if path.stat().st_mtime > settled:
+                    continue
+                with open(path, "rb") as src, gzip.open(f"{path}.gz.tmp", "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                os.replace(f"{path}.gz.tmp", f"{path}.gz")
+                os.unlink(path)
+            except OSError:
+                pass
+
+    rotated = sorted(n for n in os.listdir(LOG_DIR) if n.startswith("hooks.") and n.endswith(".jsonl.gz"))
+    for name in rotated[:-keep] if keep > 0 else rotated:
+        try:
+            os.unlink(LOG_DIR / name)
+        except OSError:
+            pass
+
+    cutoff = time.time() - LEGACY_MAX_AGE
+    for name in names:
+        if name.startswith("hook_") and name.endswith(".log"):
+            try:
+                path = LOG_DIR / name
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except OSError:
+                pass
+
+
+atexit.register(flush)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+# Memory Hub batch - apply a list of write/record/delete operations in one process
+#
+# Usage (the memory-hub wrapper routes `memory-hub batch` here):
+#   memory-hub batch --json < ops.json
+#   ops:    [{"args": ["write", "..."], "input": null}, ...]
+#   output: {"ok": true, "results": [{"returncode": 0, "stdout": "..."}, ...]}
+#
+# Every operation is validated before any is applied. Operations then run
+# in order; after the first failure the rest are reported as skipped
+# (returncode -1) so callers can retry exactly the part that didn't land.
+
+import json
+import os
+import sys
+from typing import Callable
+
+# Add hooks dir to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+# Operations a batch may contain
+BATCH_COMMANDS = (("write",), ("delete",), ("episode", "record"))
+SKIPPED = -1
+
+
+def validate_ops(ops) -> str:
+    """Return an error message if ops is not a list of write operations, else ""."""
+    if not isinstance(ops, list):
+        return "batch input must be a JSON list"
+    for i, op in enumerate(ops):
+        if not isinstance(op, dict) or not isinstance(op.get("args"), list):
+            return f"operation {i}: expected {{\"args\": [...]}}"
+        args = [str(a) for a in op["args"]]
+        if not any(args[:len(command)] == list(command) for command in BATCH_COMMANDS):
+            return f"operation {i}: only write, episode record and delete are allowed"
+    return ""
+
+
+def run_batch(execute: Callable[[list, str], tuple], ops) -> tuple[dict, int]:
+    """Apply ops with execute(args, input) -> (output, returncode).
+
+    Returns (report, returncode) where returncode is 0 only if every
+    operation succeeded.
+    """
+    error = validate_ops(ops)
+    if error:
+        return {"ok": False, "error": error, "results": []}, 2
+
+    results = []
+    failed = False
+    for op in ops:
+        if failed:
+            results.append({"returncode": SKIPPED, "stdout": ""})
+            continue
+        output, code = execute([str(a) for a in op["args"]], op.get("input"))
+        results.append({"returncode": code, "stdout": output})
+        failed = code != 0
+    return {"ok": not failed, "results": results}, 1 if failed else 0
+
+
+def main():
+    from hub_daemon import resolve_cli_module, run_cli
+
+    try:
+        ops = json.loads(sys.stdin.read())
+    except json.JSONDecodeError as e:
+        print(json.dumps({"ok": False, "error": f"invalid JSON: {e}", "results": []}))
+        sys.exit(2)
+
+    module = resolve_cli_module()
+    if not module:
+        print(json.dumps({"ok": False, "error": "memory-hub CLI module not found", "results": []}))
+        sys.exit(2)
+
+    report, code = run_batch(lambda args, input_data: run_cli(module, args, input_data), ops)
+    print(json.dumps(report))
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+# Memory Hub daemon - keep memory_hub imported and serve CLI calls over a Unix socket
+#
+# Protocol: one JSON object per line in each direction.
+#   request:  {"args": ["assemble", "..."], "input": null, "cwd": "/path"}
+#             {"args": ["batch"], "input": "[{\"args\": [\"write\", ...]}]"}
+#             {"op": "ping"}
+#   response: {"stdout": "...", "returncode": 0}
+#             {"ok": true, "pid": 1234, "cache_hits": 0, "cache_misses": 0}
+#
+# Concurrency: each connection gets a thread in the daemon, which owns the
+# socket, the query cache and the store generation. CLI calls run in a fixed
+# pool of MAX_WORKERS worker processes (this file run with --worker), each
+# started with fork+exec, never a bare fork of the threaded daemon. A worker
+# imports memory_hub once and then serves one call at a time over a pipe,
+# so whatever memory_hub keeps open stays open between calls. Concurrent
+# prompts run side by side on different workers; more requests than workers
+# wait for a free one. A request whose client has already hung up is not
+# started; a read whose client hangs up mid-call has its worker killed and
+# replaced.
+
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import queue
+import re
+import runpy
+import selectors
+import signal
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+from typing import Optional
+
+# Add hooks dir to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from _util import (
+    MEMORY_HUB_BIN,
+    DAEMON_SOCKET,
+    bump_store_generation,
+    get_store_generation,
+    is_write_command,
+    log_message
+)
+import hook_log
+from hub_batch import run_batch
+from query_cache import AssembleCache
+
+# Same candidates install.sh probes when it writes the wrapper
+CLI_MODULE_CANDIDATES = ("cli.commands", "memory_hub.cli", "memory_hub.cli.main")
+
+# Exit after this many idle seconds; the next hook call starts a fresh daemon
+IDLE_TIMEOUT = int(os.environ.get("MEMORY_FABRIC_DAEMON_IDLE", "1800"))
+
+# Max cached assemble results (0 disables the query cache)
+QUERY_CACHE_SIZE = int(os.environ.get("MEMORY_FABRIC_QUERY_CACHE", "256"))
+
+# Worker processes, i.e. CLI calls running at once; further requests wait for a free one
+MAX_WORKERS = max(1, int(os.environ.get("MEMORY_FABRIC_DAEMON_WORKERS", "4")))
+
+
+def resolve_cli_module() -> Optional[str]:
+    """Find the memory-hub CLI module (env override, wrapper script, then candidates)."""
+    module = os.environ.get("MEMORY_HUB_MODULE")
+    if module:
+        return module
+
+    # The wrapper written by install.sh ends in: exec "<python>" -m <module> "$@"
+    try:
+        with open(MEMORY_HUB_BIN) as f:
+            match = re.search(r'-m\s+([A-Za-z0-9_.]+)', f.read())
+            if match:
+                return match.group(1)
+    except OSError:
+        pass
+
+    for candidate in CLI_MODULE_CANDIDATES:
+        try:
+            if importlib.util.find_spec(candidate) is not None:
+                return candidate
+        except (ImportError, ValueError):
+            continue
+    return None
+
+
+def run_cli(module: str, args: list, input_data: str = None, cwd: str = None) -> tuple[str, int]:
+    """Run one memory-hub CLI invocation in-process and return (output, returncode).
+
+    Swaps the process-wide argv, stdio and cwd, so it only runs in a
+    single-threaded process: a daemon worker, one call at a time, or
+    `memory-hub batch`. Modules stay imported between calls, which is where
+    the saving over a fresh wrapper process comes from.
+    """
+    stdout, stderr = io.StringIO(), io.StringIO()
+    saved_argv, saved_stdin, saved_cwd = sys.argv, sys.stdin, os.getcwd()
+    sys.argv = ["memory-hub"] + [str(a) for a in args]
+    sys.stdin = io.StringIO(input_data or "")
+    code = 0
+    try:
+        if cwd and os.path.isdir(cwd):
+            os.chdir(cwd)
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            runpy.run_module(module, run_name="__main__", alter_sys=True)
+    except SystemExit as e:
+        if e.code is None:
+            code = 0
+        elif isinstance(e.code, int):
+            code = e.code
+        else:
+            code = 1
+    except Exception as e:
+        return str(e), 1
+    finally:
+        sys.argv, sys.stdin = saved_argv, saved_stdin
+        try:
+            os.chdir(saved_cwd)
+        except OSError:
+            pass
+    # Same as the wrapper path: a failure with nothing on stdout reports stderr
+    return stdout.getvalue() or (stderr.getvalue() if code else ""), code
+
+
+def client_gone(sock: socket.socket) -> bool:
+    """True if the client has closed its end (e.g. gave up after its timeout)."""
+    try:
+        return sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) == b""
+    except BlockingIOError:
+        return False
+    except OSError:
+        return True
+
+
+def run_request(module: str, args: list, input_data: str = None, cwd: str = None) -> tuple[str, int]:
+    """Run one request's CLI call, or all of a batch's, in this process."""
+    if args[0] == "batch":
+        # Same semantics as `memory-hub batch`, without leaving the worker
+        try:
+            ops = json.loads(input_data or "")
+        except json.JSONDecodeError:
+            ops = None
+        report, code = run_batch(lambda a, i: run_cli(module, a, i, cwd), ops)
+        return json.dumps(report), code
+    return run_cli(module, args, input_data, cwd)
+
+
+def worker_main(module: str):
+    """Worker process: import module, then answer one JSON request line at a time."""
+    # Keep the protocol on private copies of stdin/stdout; stray writes to
+    # fd 1 from the CLI (or anything it runs) go to /dev/null instead
+    requests = os.fdopen(os.dup(0), "rb")
+    replies = os.fdopen(os.dup(1), "wb")
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    try:
+        importlib.import_module(module)
+        ready = {"ok": True}
+    except Exception as e:
+        ready = {"ok": False, "error": f"cannot import {module}: {e}"}
+    replies.write((json.dumps(ready) + "\n").encode("utf-8"))
+    replies.flush()
+    if not ready["ok"]:
+        return
+    for line in requests:  # Ends when the daemon closes the pipe
+        try:
+            request = json.loads(line.decode("utf-8"))
+            output, code = run_request(module, request["args"], request.get("input"), request.get("cwd"))
+        except Exception as e:
+            output, code = str(e), 1
+        replies.write((json.dumps({"stdout": output, "returncode": code}) + "\n").encode("utf-8"))
+        replies.flush()
+
+
+class Worker:
+    """Handle on one worker process."""
+
+    def __init__(self, module: str):
+        self.proc = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--worker", module],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        self._buffer = b""
+
+    def _read_line(self, client: Optional[socket.socket] = None, cancellable: bool = False) -> Optional[bytes]:
+        """Next line from the worker; None if the worker died, or if cancellable and client hung up."""
+        fd = self.proc.stdout.fileno()
+        with selectors.DefaultSelector() as selector:
+            selector.register(fd, selectors.EVENT_READ)
+            if client is not None:
+                selector.register(client, selectors.EVENT_READ)
+            while b"\n" not in self._buffer:
+                for key, _ in selector.select():
+                    if key.fileobj is client:
+                        if cancellable and client_gone(client):
+                            return None
+                        # Only a hang-up matters; stop watching either way
+                        selector.unregister(client)
+                        continue
+                    data = os.read(fd, 65536)
+                    if not data:
+                        return None
+                    self._buffer += data
+        line, _, self._buffer = self._buffer.partition(b"\n")
+        return line
+
+    def wait_ready(self) -> str:
+        """Wait for the worker's import to finish; "" if it is ready, else why not."""
+        line = self._read_line()
+        try:
+            ready = json.loads(line.decode("utf-8")) if line else {}
+        except (ValueError, UnicodeDecodeError):
+            ready = {}
+        return "" if ready.get("ok") else ready.get("error", "worker exited during startup")
+
+    def call(self, request: dict, client: Optional[socket.socket] = None,
+             cancellable: bool = False) -> Optional[tuple[str, int]]:
+        """Send one request and wait for its result.
+
+        Returns None if cancellable and client hung up first; the worker is
+        killed then, and so is one that died: check alive() before reuse.
+        """
+        try:
+            self.proc.stdin.write((json.dumps(request) + "\n").encode("utf-8"))
+            self.proc.stdin.flush()
+        except OSError:
+            self.kill()
+            return "memory-hub worker is gone", 1
+        line = self._read_line(client, cancellable)
+        if line is None:
+            died = self.proc.poll() is not None
+            self.kill()
+            return ("memory-hub call died in the daemon", 1) if died else None
+        try:
+            result = json.loads(line.decode("utf-8"))
+            return result["stdout"], result["returncode"]
+        except (ValueError, KeyError, UnicodeDecodeError):
+            self.kill()
+            return "memory-hub call died in the daemon", 1
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def kill(self):
+        if self.alive():
+            self.proc.kill()
+        self.proc.wait()
+
+    def close(self):
+        """Let the worker finish and exit (it stops at end of input)."""
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+
+
+class WorkerPool:
+    """Fixed set of workers; a request takes an idle one or waits for one."""
+
+    def __init__(self, module: str, size: int):
+        self.module = module
+        self.idle = queue.Queue()
+        workers = [Worker(module) for _ in range(size)]
+        # Imports run in parallel; the daemon serves once all are ready
+        errors = [w.wait_ready() for w in workers]
+        for worker, error in zip(workers, errors):
+            if error:
+                worker.kill()
+            else:
+                self.idle.put(worker)
+        if self.idle.empty():
+            raise RuntimeError(errors[0])
+
+    def run(self, request: dict, client: Optional[socket.socket] = None,
+            cancellable: bool = False) -> Optional[tuple[str, int]]:
+        """Run request on a worker; None if client hung up before or during a cancellable call."""
+        worker = self.idle.get()
+        try:
+            # The client gave up while this waited for a worker: its caller
+            # has already moved on (a queued write will be retried)
+            if client is not None and client_gone(client):
+                return None
+            return worker.call(request, client, cancellable)
+        finally:
+            if not worker.alive():
+                # Killed or crashed: replace it, in this request's thread
+                worker = Worker(self.module)
+                if worker.wait_ready():
+                    worker.kill()
+                    worker = None
+            if worker is not None:
+                self.idle.put(worker)
+
+    def close(self):
+        while not self.idle.empty():
+            self.idle.get().close()
+
+
+class HubRequestHandler(socketserver.StreamRequestHandler):
+    """Handle a single JSON request line."""
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline().decode("utf-8"))
+        except (ValueError, UnicodeDecodeError):
+            self._reply({"stdout": "invalid request", "returncode": 1})
+            return
+
+        if request.get("op") == "ping":
+            cache = self.server.query_cache
+            self._reply({"ok": True, "pid": os.getpid(),
+                         "cache_hits": cache.hits, "cache_misses": cache.misses})
+            return
+
+        args = request.get("args")
+        if not isinstance(args, list) or not args:
+            self._reply({"stdout": "missing args", "returncode": 1})
+            return
+
+        response = self.server.execute(args, request.get("input"), request.get("cwd"), self.connection)
+        if response is None:
+            log_message(f"Daemon: client left, dropped {args[0]} request", "daemon", "debug")
+            return
+        self._reply(response)
+
+    def _reply(self, payload: dict):
+        try:
+            self.wfile.write((json.dumps(payload) + "\n").encode("utf-8"))
+        except OSError:
+            pass  # Client gave up (timeout); nothing to do
+
+
+class HubServer(socketserver.ThreadingUnixStreamServer):
+    """Threaded Unix-socket server that exits after IDLE_TIMEOUT seconds without requests."""
+
+    timeout = IDLE_TIMEOUT
+
+    def __init__(self, path: str, workers: WorkerPool):
+        self.workers = workers
+        self.idle = False
+        self.query_cache = AssembleCache(QUERY_CACHE_SIZE)
+        self.cache_lock = threading.Lock()
+        super().__init__(path, HubRequestHandler)
+
+    def execute(self, args: list, input_data: str = None, cwd: str = None,
+                client: Optional[socket.socket] = None) -> Optional[dict]:
+        """Run one CLI request, answering repeated assembles from the query cache.
+
+        Returns None, without running it, if client hung up before it started.
+        """
+        generation = get_store_generation()
+        with self.cache_lock:
+            cached = self.query_cache.get(args, generation, cwd)
+        if cached is not None:
+            return {"stdout": cached, "returncode": 0}
+
+        is_write = is_write_command(args)
+        # A write always runs to the end
+        result = self.workers.run({"args": args, "input": input_data, "cwd": cwd}, client, cancellable=not is_write)
+        if result is None:
+            return None
+        output, code = result
+        if is_write:
+            # Results tagged with the old generation, including ones read
+            # while this write ran, are ignored from now on
+            bump_store_generation()
+        elif code == 0:
+            with self.cache_lock:
+                self.query_cache.put(args, generation, output, cwd)
+        return {"stdout": output, "returncode": code}
+
+    def handle_timeout(self):
+        self.idle = True
+
+
+def _socket_alive(path: str) -> bool:
+    """Return True if another daemon already answers on path."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(1)
+    try:
+        sock.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+def main():
+    if sys.argv[1:2] == ["--worker"] and len(sys.argv) > 2:
+        worker_main(sys.argv[2])
+        return
+
+    module = resolve_cli_module()
+    if not module:
+        log_message("Daemon: memory-hub CLI module not found, not starting", "daemon")
+        sys.exit(1)
+
+    path = str(DAEMON_SOCKET)
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    if os.path.exists(path):
+        if _socket_alive(path):
+            sys.exit(0)  # Lost the startup race; the other daemon serves
+        os.unlink(path)  # Stale socket from a crashed daemon
+
+    try:
+        # Pay the import cost once per worker, up front
+        workers = WorkerPool(module, MAX_WORKERS)
+    except RuntimeError as e:
+        log_message(f"Daemon: {e}", "daemon")
+        sys.exit(1)
+    try:
+        server = HubServer(path, workers)
+    except OSError as e:
+        workers.close()
+        log_message(f"Daemon: bind failed: {e}", "daemon", "error")
+        sys.exit(1)
+    os.chmod(path, 0o600)
+    # Clean up the socket on uninstall/pkill too
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    log_message(f"Daemon: serving {module} on {path} (pid={os.getpid()})", "daemon")
+    # Hours between requests: don't leave log records sitting in the buffer
+    hook_log.start_flush_thread()
+
+    try:
+        while not server.idle:
+            server.handle_request()
+    finally:
+        server.server_close()
+        workers.close()
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        log_message("Daemon: stopped", "daemon")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+# Memory Fabric Hook Metrics
+# Timing spans per hook stage, buffered in memory and appended to
+# logs/metrics.jsonl once at process exit.
+#
+# Rotation: when metrics.jsonl passes MAX_BYTES the writer renames it to
+# metrics.<stamp>.jsonl (under a flock, like hooks.jsonl) and deletes all
+# but the newest KEEP_ROTATED of those. report reads only the files that
+# can hold records inside its window.
+#
+# Record: {"ts": 1700000000.0, "hook": "UserPromptSubmit", "session_id": "...",
+#          "stage": "assemble", "ms": 12.3}
+#
+# Report: python metrics.py report [--since 24h] [--hook UserPromptSubmit]
+
+import atexit
+import json
+import math
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+# Add hooks dir to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from _util import LOG_DIR
+
+METRICS_FILE = LOG_DIR / "metrics.jsonl"
+METRICS_LOCK = LOG_DIR / ".metrics.lock"
+
+MAX_BYTES = 2 * 1024 * 1024
+KEEP_ROTATED = 5
+
+_context = {"hook": "unknown", "session_id": "general"}
+_spans = []
+_started = time.perf_counter()
+
+
+def metrics_enabled() -> bool:
+    """Check if timing spans are recorded (MEMORY_FABRIC_METRICS=0 disables)."""
+    return os.environ.get("MEMORY_FABRIC_METRICS", "1") != "0"
+
+
+def set_context(hook: str, session_id: str):
+    """Tag every span of this process with the hook name and session id."""
+    _context["hook"] = hook
+    _context["session_id"] = session_id
+
+
+def record(stage: str, ms: float, **fields):
+    """Record one finished span (thread-safe: list.append)."""
+    entry = {"ts": time.time(), "stage": stage, "ms": round(ms, 3)}
+    entry.update(fields)
+    _spans.append(entry)
+
+
+@contextmanager
+def span(stage: str, **fields):
+    """Time the enclosed block as one stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, (time.perf_counter() - start) * 1000, **fields)
+
+
+def timed(stage: str, fn):
+    """Wrap a callable so each call is recorded as a span (for thread-pool tasks)."""
+    def wrapper(*args, **kwargs):
+        with span(stage):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def _rotated_files() -> list:
+    """Rotated metrics files, oldest first."""
+    try:
+        names = os.listdir(LOG_DIR)
+    except OSError:
+        return []
+    return sorted(LOG_DIR / n for n in names
+                  if n.startswith("metrics.") and n.endswith(".jsonl") and n != METRICS_FILE.name)
+
+
+def _rotate_if_due(keep: int = KEEP_ROTATED):
+    """Rename metrics.jsonl aside once it passes MAX_BYTES and prune old rotated files."""
+    try:
+        st = os.stat(METRICS_FILE)
+    except OSError:
+        return
+    if st.st_size < MAX_BYTES:
+        return
+    import fcntl
+
+    fd = os.open(str(METRICS_LOCK), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        # Another process may have rotated while we waited
+        try:
+            if os.stat(METRICS_FILE).st_ino != st.st_ino:
+                return
+        except OSError:
+            return
+        now = time.time()
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.localtime(now)) + f"{now % 1:.6f}"[1:] + f"-{os.getpid()}"
+        os.rename(METRICS_FILE, LOG_DIR / f"metrics.{stamp}.jsonl")
+        rotated = _rotated_files()
+        for path in rotated[:-keep] if keep > 0 else rotated:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+    finally:
+        os.close(fd)  # Releases the lock
+
+
+def flush():
+    """Append buffered spans plus a `total` span for the whole process in one write."""
+    if not metrics_enabled() or _context["hook"] == "unknown":
+        return
+    record("total", (time.perf_counter() - _started) * 1000)
+    lines = []
+    for entry in _spans:
+        entry.setdefault("hook", _context["hook"])
+        entry.setdefault("session_id", _context["session_id"])
+        lines.append(json.dumps(entry))
+    _spans.clear()
+    try:
+        LOG_DIR.mkdir(parents=True, exist_ok=True)
+        _rotate_if_due()
+        with open(METRICS_FILE, "a") as f:
+            f.write("\n".join(lines) + "\n")
+    except OSError:
+        pass
+
+
+atexit.register(flush)
+
+
+def parse_window(text: str) -> float:
+    """Parse a window like 30m, 24h or 7d into seconds."""
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    text = text.strip().lower()
+    if text and text[-1] in units:
+        return float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def load_spans(since: float, hook: str = None) -> dict:
+    """Group span durations by (hook, stage) for records newer than since (epoch)."""
+    groups = {}
+    for path in _rotated_files() + [METRICS_FILE]:
+        try:
+            # A file last written before the window has no record in it
+            if os.stat(path).st_mtime < since:
+                continue
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if entry.get("ts", 0) < since:
+                        continue
+                    if hook and entry.get("hook") != hook:
+                        continue
+                    key = (entry.get("hook", "?"), entry.get("stage", "?"))
+                    groups.setdefault(key, []).append(float(entry.get("ms", 0)))
+        except OSError:
+            pass
+    return groups
+
+
+def report(window: str = "24h", hook: str = None) -> str:
+    """Render p50/p95/p99 per hook and stage as a text table."""
+    groups = load_spans(time.time() - parse_window(window), hook)
+    if not groups:
+        return f"No metrics in the last {window} ({METRICS_FILE})"
+
+    rows = [("hook", "stage", "count", "p50 ms", "p95 ms", "p99 ms", "max ms")]
+    for (hook_name, stage), values in sorted(groups.items()):
+        values.sort()
+        rows.append((
+            hook_name, stage, str(len(values)),
+            f"{percentile(values, 50):.1f}",
+            f"{percentile(values, 95):.1f}",
+            f"{percentile(values, 99):.1f}",
+            f"{values[-1]:.1f}"
+        ))
+    widths = [max(len(r[i]) for r in rows) for i in range(len(rows[0]))]
+    return "\n".join(
+        "  ".join(cell.ljust(w) if i < 2 else cell.rjust(w) for i, (cell, w) in enumerate(zip(r, widths)))
+        for r in rows
+    )
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Memory Fabric hook latency report")
+    sub = parser.add_subparsers(dest="command")
+    rep = sub.add_parser("report", help="p50/p95/p99 per hook stage")
+    rep.add_argument("--since", default="24h", help="time window, e.g. 30m, 24h, 7d (default 24h)")
+    rep.add_argument("--hook", help="only this hook (e.g. UserPromptSubmit)")
+    args = parser.parse_args()
+
+    if args.command != "report":
+        parser.print_help()
+        sys.exit(1)
+    print(report(args.since, args.hook))
+
+
+if __name__ == "__main__":
+    main()
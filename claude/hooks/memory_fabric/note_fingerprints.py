@@ -0,0 +1,149 @@
+from __future__ import annotations
+# Memory Fabric Note Fingerprints
+# SimHash fingerprints of the session notes Stop has written, so repeated
+# turns ("done", retries, status updates) don't each become a new note.
+# Before queuing a note, Stop compares its fingerprint with the session's
+# notes: one within MAX_DISTANCE bits is a near-duplicate. Notes of other
+# sessions of the project only count when the fingerprint is identical, so
+# another session's similar but different note is still written.
+# memory-hub has no way to edit a stored note, so a duplicate is folded into
+# the existing fingerprint (hits + 1, last_seen) and not written.
+#
+# SimHash: each word, number and word pair of the lowercased text votes on
+# 64 bits with its blake2b hash; similar texts share most bits. Numbers are
+# kept as features: "5 passed, 2 failed" and "7 passed, 0 failed" are
+# different results, not a repeat.
+
+import hashlib
+import re
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from _util import RUNTIME_DIR
+
+NOTES_DB = RUNTIME_DIR / "notes.db"
+# Fingerprints differing in at most this many of 64 bits are near-duplicates
+MAX_DISTANCE = 3
+# Fingerprints not seen for this long are dropped
+FINGERPRINT_TTL = 30 * 24 * 3600
+
+WORD_PATTERN = re.compile(r'[a-z]+|\d+')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fingerprints (
+    id         INTEGER PRIMARY KEY,
+    project_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    simhash    INTEGER NOT NULL,
+    hits       INTEGER NOT NULL DEFAULT 1,
+    created_at REAL NOT NULL,
+    last_seen  REAL NOT NULL
+);
+DROP INDEX IF EXISTS fingerprints_project;
+CREATE INDEX IF NOT EXISTS fingerprints_simhash ON fingerprints (project_id, simhash);
+CREATE INDEX IF NOT EXISTS fingerprints_session ON fingerprints (session_id);
+CREATE INDEX IF NOT EXISTS fingerprints_last_seen ON fingerprints (last_seen);
+"""
+
+
+def _connect():
+    import sqlite3
+
+    RUNTIME_DIR.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(NOTES_DB), timeout=5)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+@contextmanager
+def _db():
+    """Connection wrapped in a transaction, closed afterwards."""
+    conn = _connect()
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash of text's words and word pairs (0 for empty text)."""
+    words = WORD_PATTERN.findall(text.lower())
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    if not features:
+        return 0
+    # Hashes as 64-char bit strings: zip() turns them into per-bit columns,
+    # so the votes are counted in C rather than 64 Python steps per feature
+    rows = [format(int.from_bytes(hashlib.blake2b(f.encode("utf-8"), digest_size=8).digest(), "big"), "064b")
+            for f in features]
+    half = len(rows) / 2
+    return int("".join("1" if column.count("1") > half else "0" for column in zip(*rows)), 2)
+
+
+def distance(a: int, b: int) -> int:
+    """Number of differing bits."""
+    return bin(a ^ b).count("1")
+
+
+def _signed(value: int) -> int:
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _find(conn, project_id: str, session_id: str, fingerprint: int) -> Optional[int]:
+    """id of a stored duplicate of fingerprint, or None.
+
+    Near-duplicates are looked for in the session, exact ones in the project.
+    """
+    rows = conn.execute("SELECT id, simhash FROM fingerprints WHERE session_id = ?", (session_id,)).fetchall()
+    best = None
+    best_distance = MAX_DISTANCE + 1
+    for row_id, stored in rows:
+        d = distance(fingerprint, stored & ((1 << 64) - 1))
+        if d < best_distance:
+            best, best_distance = row_id, d
+    if best is None:
+        row = conn.execute(
+            "SELECT id FROM fingerprints WHERE project_id = ? AND simhash = ? ORDER BY id DESC LIMIT 1",
+            (project_id, _signed(fingerprint))
+        ).fetchone()
+        best = row[0] if row else None
+    return best
+
+
+def check(project_id: str, session_id: str, text: str) -> tuple:
+    """(fingerprint, duplicate): duplicate is True if the note repeats a stored one.
+
+    A near-duplicate's hit count is bumped in the same transaction.
+    """
+    fingerprint = simhash(text)
+    if not fingerprint:
+        # No words to compare by
+        return fingerprint, False
+    now = time.time()
+    with _db() as conn:
+        row_id = _find(conn, project_id, session_id, fingerprint)
+        if row_id is None:
+            return fingerprint, False
+        conn.execute("UPDATE fingerprints SET hits = hits + 1, last_seen = ? WHERE id = ?", (now, row_id))
+    return fingerprint, True
+
+
+def add(project_id: str, session_id: str, fingerprint: int):
+    """Record a note that was written."""
+    now = time.time()
+    with _db() as conn:
+        conn.execute(
+            "INSERT INTO fingerprints (project_id, session_id, simhash, created_at, last_seen) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (project_id, session_id, _signed(fingerprint), now, now)
+        )
+
+
+def evict(ttl: float = FINGERPRINT_TTL) -> int:
+    """Delete fingerprints not seen for more than ttl seconds; returns how many."""
+    with _db() as conn:
+        return conn.execute("DELETE FROM fingerprints WHERE last_seen < ?", (time.time() - ttl,)).rowcount
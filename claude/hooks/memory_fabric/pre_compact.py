@@ -13,9 +13,12 @@ from _util import (
     get_project_id,
     get_session_id,
     run_memory_hub,
+    read_cache,
     read_hook_input,
+    write_cache,
     log_message
 )
+import metrics
 
 
 def main():
@@ -24,27 +27,38 @@ def main():
     cwd = hook_input.get("cwd", os.getcwd())
     session_id = get_session_id(hook_input)
 
-    project_id = get_project_id(cwd)
+    metrics.set_context("PreCompact", session_id)
+
+    with metrics.span("project_resolution"):
+        project_id = get_project_id(cwd)
     log_message(f"PreCompact: project={project_id}", session_id)
 
+    # Compaction drops what earlier turns injected: let the next prompt inject it again
+    cache = read_cache(session_id)
+    if cache and cache.get("injected"):
+        cache["injected"] = {}
+        write_cache(session_id, cache)
+
     # Query for key decisions and constraints
     query = "important decisions constraints architecture design"
-    output, code = run_memory_hub([
-        "assemble",
-        query,
-        "--max-tokens", "800",
-        "--type", "decision",
-        "--json"
-    ])
+    with metrics.span("assemble"):
+        output, code = run_memory_hub([
+            "assemble",
+            query,
+            "--max-tokens", "800",
+            "--type", "decision",
+            "--json"
+        ])
 
     if code != 0:
-        log_message(f"Error: {output}", session_id)
+        log_message(f"Error: {output}", session_id, "error")
         sys.exit(0)
 
     try:
-        result = json.loads(output)
+        with metrics.span("parse_json"):
+            result = json.loads(output)
     except json.JSONDecodeError:
-        log_message(f"Failed to parse JSON: {output}", session_id)
+        log_message(f"Failed to parse JSON: {output}", session_id, "error")
         sys.exit(0)
 
     # Build context from result
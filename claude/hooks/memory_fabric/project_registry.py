@@ -0,0 +1,154 @@
+from __future__ import annotations
+# Memory Fabric Project Registry
+# Latest snapshot per project, keyed by project_id and indexed by timestamp.
+# session_end.py upserts one row per session; user_prompt_submit.py reads the top N.
+
+import os
+from contextlib import contextmanager
+from typing import Optional
+
+from _util import RUNTIME_DIR
+
+REGISTRY_DB = RUNTIME_DIR / "registry.db"
+# Bumped on every snapshot write; readers cache against it
+GENERATION_FILE = RUNTIME_DIR / "registry.gen"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    project_id TEXT PRIMARY KEY,
+    git_url    TEXT NOT NULL DEFAULT '',
+    timestamp  TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    summary    TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS projects_updated_at ON projects (updated_at DESC);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def _connect():
+    # Imported here: a cached Recent Projects block never opens the database
+    import sqlite3
+
+    RUNTIME_DIR.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(REGISTRY_DB), timeout=5)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+@contextmanager
+def _db():
+    """Connection wrapped in a transaction, closed afterwards."""
+    conn = _connect()
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def parse_timestamp(timestamp: str) -> Optional[float]:
+    """Parse an ISO-8601 timestamp (naive = local time) to epoch seconds."""
+    from datetime import datetime
+    try:
+        return datetime.fromisoformat(timestamp.strip().replace("Z", "+00:00")).timestamp()
+    except (ValueError, AttributeError):
+        return None
+
+
+def record_snapshot(project_id: str, git_url: str = "", summary: str = "", timestamp: str = None):
+    """Insert or replace the snapshot for project_id.
+
+    Older snapshots never overwrite newer ones, so out-of-order writes
+    (e.g. a backfill) are harmless.
+    """
+    if not project_id:
+        return
+    if not timestamp:
+        from datetime import datetime
+        timestamp = datetime.now().isoformat()
+    updated_at = parse_timestamp(timestamp)
+    if updated_at is None:
+        return
+    with _db() as conn:
+        conn.execute(
+            """
+            INSERT INTO projects (project_id, git_url, timestamp, updated_at, summary)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (project_id) DO UPDATE SET
+                git_url = excluded.git_url,
+                timestamp = excluded.timestamp,
+                updated_at = excluded.updated_at,
+                summary = excluded.summary
+            WHERE excluded.updated_at >= projects.updated_at
+            """,
+            (project_id, git_url or "", timestamp, updated_at, summary or "")
+        )
+    bump_generation()
+
+
+def get_generation() -> str:
+    """Current registry generation ("" if never written).
+
+    Includes the file mtime so two writers racing to the same counter
+    value still produce a new generation.
+    """
+    try:
+        st = GENERATION_FILE.stat()
+        return f"{GENERATION_FILE.read_text().strip()}:{st.st_mtime_ns}"
+    except (OSError, ValueError):
+        return ""
+
+
+def bump_generation():
+    """Invalidate cached views of the registry."""
+    try:
+        current = int(GENERATION_FILE.read_text().strip() or 0)
+    except (OSError, ValueError):
+        current = 0
+    try:
+        RUNTIME_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = GENERATION_FILE.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(str(current + 1))
+        os.replace(tmp, GENERATION_FILE)
+    except OSError:
+        pass
+
+
+def recent_projects(limit: int) -> list:
+    """Return the newest limit projects, newest first."""
+    with _db() as conn:
+        rows = conn.execute(
+            "SELECT project_id, git_url, timestamp, summary FROM projects "
+            "ORDER BY updated_at DESC LIMIT ?",
+            (limit,)
+        ).fetchall()
+    return [
+        {"project_id": pid, "git_url": url, "timestamp": ts, "summary": summary}
+        for pid, url, ts, summary in rows
+    ]
+
+
+def all_projects() -> list:
+    """(project_id, git_url) for every project, oldest snapshot first."""
+    with _db() as conn:
+        return conn.execute("SELECT project_id, git_url FROM projects ORDER BY updated_at").fetchall()
+
+
+def needs_backfill() -> bool:
+    """Check if pre-registry snapshots still have to be imported from memory-hub."""
+    with _db() as conn:
+        return conn.execute("SELECT 1 FROM meta WHERE key = 'backfilled'").fetchone() is None
+
+
+def mark_backfilled():
+    """Record that the one-time import from memory-hub has run."""
+    from datetime import datetime
+    with _db() as conn:
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('backfilled', ?)",
+                     (datetime.now().isoformat(),))
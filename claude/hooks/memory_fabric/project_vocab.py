@@ -0,0 +1,140 @@
+from __future__ import annotations
+# Memory Fabric Project Vocabulary
+# Names a prompt can use to point at a project: every project_id in the
+# registry plus the repo slug of its git remote (github.com/owner/<slug>).
+# Placeholder ids (tmp, default) are left out. A name found in a prompt
+# overrides the session's project, so prompt_matcher only matches
+# distinctive names (with "_", "-" or a digit, like p008_memory_hub) as bare
+# words; a plain word such as "parser" needs "project:parser".
+# Stored as a sorted "alias<TAB>project_id" file next to registry.db so a
+# hook loads it with one read and a split, without opening SQLite.
+# session_end.py adds the current project after each snapshot; the file is
+# rebuilt from the registry when missing and after the memory-hub backfill.
+
+import os
+import re
+from typing import Iterable
+
+from _util import PROJECT_PATTERN, RUNTIME_DIR
+
+VOCAB_FILE = RUNTIME_DIR / "project_vocab.tsv"
+VOCAB_LOCK = RUNTIME_DIR / "project_vocab.lock"
+
+# Last path component of a remote URL, without .git
+# (https://github.com/owner/slug.git, git@github.com:owner/slug, /srv/git/slug)
+REMOTE_SLUG_PATTERN = re.compile(r'([^/:]+?)(?:\.git)?/*$')
+# Names usable as aliases: what prompt_matcher.TOKEN_PATTERN can match
+ALIAS_PATTERN = re.compile(r'[a-z][a-z0-9_\-]{2,79}$')
+# Placeholder project ids, never a name a prompt means
+PLACEHOLDER_NAMES = frozenset(("tmp", "default", "unknown", "general"))
+# A whole well-formed file; checked in one pass so loading can skip per-line checks
+VOCAB_FORMAT = re.compile(r'(?:[a-z0-9_\-]{1,80}\t[a-z0-9_\-]{1,80}\n)*')
+
+
+def remote_slug(git_url: str) -> str:
+    """Lowercased repo name from a git remote URL, or "" if it is not a valid project id."""
+    match = REMOTE_SLUG_PATTERN.search(git_url or "")
+    slug = match.group(1).lower() if match else ""
+    return slug if PROJECT_PATTERN.match(slug) else ""
+
+
+def _read() -> dict:
+    try:
+        text = VOCAB_FILE.read_text(encoding="utf-8")
+    except (OSError, UnicodeDecodeError):
+        return {}
+    if VOCAB_FORMAT.fullmatch(text):
+        fields = text.split()
+        return dict(zip(fields[::2], fields[1::2]))
+    # Damaged or hand-edited: keep the lines that are still valid
+    vocab = {}
+    for line in text.splitlines():
+        alias, _, project_id = line.partition("\t")
+        if PROJECT_PATTERN.match(alias) and PROJECT_PATTERN.match(project_id):
+            vocab[alias] = project_id
+    return vocab
+
+
+def _write(vocab: dict):
+    RUNTIME_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = VOCAB_FILE.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text("".join(f"{alias}\t{vocab[alias]}\n" for alias in sorted(vocab)), encoding="utf-8")
+    os.replace(tmp, VOCAB_FILE)
+
+
+def is_alias(name: str) -> bool:
+    """Check if name can point a prompt at a project (bare-word use also needs is_distinctive)."""
+    return bool(ALIAS_PATTERN.match(name)) and name not in PLACEHOLDER_NAMES
+
+
+def is_distinctive(name: str) -> bool:
+    """Check if name is unlike an everyday word (has "_", "-" or a digit), so it may match bare."""
+    return any(ch in name for ch in "_-0123456789")
+
+
+def _add(vocab: dict, project_id: str, git_url: str):
+    """Add project_id and its remote slug; a slug never shadows another project's id."""
+    if not PROJECT_PATTERN.match(project_id):
+        return
+    if is_alias(project_id):
+        vocab[project_id] = project_id
+    slug = remote_slug(git_url)
+    if slug and is_alias(slug) and vocab.get(slug) != slug:
+        vocab[slug] = project_id
+
+
+def _locked(update):
+    """Run update(vocab) under the vocabulary lock and rewrite the file if it changed."""
+    import fcntl
+
+    RUNTIME_DIR.mkdir(parents=True, exist_ok=True)
+    fd = os.open(str(VOCAB_LOCK), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        vocab = _read()
+        before = dict(vocab)
+        update(vocab)
+        if vocab != before or not VOCAB_FILE.exists():
+            _write(vocab)
+        return vocab
+    finally:
+        os.close(fd)  # Releases the lock
+
+
+def add_project(project_id: str, git_url: str = ""):
+    """Record one project (and its remote slug) in the vocabulary."""
+    _locked(lambda vocab: _add(vocab, project_id, git_url))
+
+
+def rebuild(projects: Iterable[tuple] = None) -> dict:
+    """Rewrite the vocabulary from (project_id, git_url) pairs, oldest first.
+
+    Defaults to every project in the registry.
+    """
+    if projects is None:
+        import project_registry
+        projects = project_registry.all_projects()
+
+    def update(vocab: dict):
+        vocab.clear()
+        for project_id, git_url in projects:
+            _add(vocab, project_id, git_url)
+
+    return _locked(update)
+
+
+def load() -> dict:
+    """alias -> project_id for every known project; built from the registry on first use.
+
+    Every alias passes is_alias() and every project_id matches PROJECT_PATTERN.
+    """
+    if VOCAB_FILE.exists():
+        vocab = _read()
+        # Files written before placeholders were left out
+        for name in PLACEHOLDER_NAMES.intersection(vocab):
+            del vocab[name]
+        return vocab
+    try:
+        return rebuild()
+    except Exception:
+        return {}
@@ -0,0 +1,151 @@
+from __future__ import annotations
+# Memory Fabric Prompt Matcher
+# Finds GitHub repo slugs, project names and error signatures in a
+# prompt (or a pasted log, which can run to hundreds of KB). Everything is
+# compiled once per process and each scan is a fixed number of C-level
+# passes, however many projects or signatures there are:
+#   - GitHub URLs: one search anchored on the literal "github.com/"
+#   - projects: one search for an explicit "project:<name>", else one
+#     tokenizing findall intersected with the distinctive aliases
+#     (KNOWN_PROJECTS plus the registry vocabulary, see project_vocab.py)
+#   - signatures: one search over a trie-shaped alternation of all of them
+# A single combined regex was tried and is slower in CPython: every word
+# becomes a match object handled in Python, and a regex over thousands of
+# project names takes ~100 ms to compile in each hook process.
+
+import re
+from typing import Callable, Iterable, Mapping, Optional, Union
+
+from _util import KNOWN_PROJECTS, PROJECT_PATTERN
+from project_vocab import is_distinctive
+
+GITHUB_PATTERN = re.compile(r'github\.com/([a-zA-Z0-9_\-]+)/([a-zA-Z0-9_\-]+)')
+
+# Words a project name can be: 3+ project-id characters starting with a
+# letter; a project only matches a whole word
+TOKEN_PATTERN = re.compile(r'\b[a-z][a-z0-9_\-]{2,79}\b')
+# Explicit form, for any project name: "project:parser"
+EXPLICIT_PATTERN = re.compile(r'\bproject:([a-z0-9_\-]{1,80})\b')
+
+
+def trie_pattern(words: Iterable[str]) -> str:
+    """Regex alternation matching any of words, factored into a prefix trie."""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}  # End of a word
+
+    def build(node: dict) -> str:
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            # A word ends here but longer ones continue: try the longer first
+            return "(?:" + body + ")?"
+        return body
+
+    return build(trie)
+
+
+class PromptMatcher:
+    """Precompiled project and error-signature matcher."""
+
+    def __init__(self, projects: Union[Mapping[str, str], Iterable[str], Callable[[], Mapping[str, str]]],
+                 signatures: Iterable[str]):
+        # alias -> project_id; a plain list of names maps each name to itself.
+        # A callable is only called on the first project() lookup and must
+        # return lowercase aliases that are already valid (see load_projects).
+        self._project_source = projects
+        self._aliases = None
+        self.signatures = tuple(dict.fromkeys(s.lower() for s in signatures if s))
+        self._signature_re = re.compile(trie_pattern(self.signatures)) if self.signatures else None
+        # Last lowercased text, reused when one prompt is scanned for several things
+        self._lowered = (None, "")
+
+    def _lower(self, text: str) -> str:
+        if self._lowered[0] is not text:
+            self._lowered = (text, text.lower())
+        return self._lowered[1]
+
+    @property
+    def aliases(self) -> dict:
+        """alias -> project_id, loaded on first access."""
+        if self._aliases is None:
+            projects = self._project_source
+            if callable(projects):
+                self._aliases = dict(projects())
+            else:
+                if not isinstance(projects, Mapping):
+                    projects = {p: p for p in projects}
+                self._aliases = {
+                    alias.lower(): project_id for alias, project_id in projects.items()
+                    if PROJECT_PATTERN.match(alias.lower()) and PROJECT_PATTERN.match(project_id)
+                }
+            # Plain words ("parser", "dashboard") only match in the explicit form
+            self._alias_set = frozenset(a for a in self._aliases if is_distinctive(a))
+        return self._aliases
+
+    def github_slug(self, text: str) -> Optional[str]:
+        """Slug of the first github.com/owner/slug URL whose slug is a valid project id."""
+        for match in GITHUB_PATTERN.finditer(text):
+            if PROJECT_PATTERN.match(match.group(2)):
+                return match.group(2)
+        return None
+
+    def project(self, text: str) -> Optional[str]:
+        """project_id named in text: "project:<name>" (any valid name), else the first
+        distinctive known project or alias as a whole word (case-insensitive)."""
+        if not text:
+            return None
+        aliases = self.aliases
+        lowered = self._lower(text)
+        explicit = EXPLICIT_PATTERN.search(lowered) if "project:" in lowered else None
+        if explicit:
+            name = explicit.group(1)
+            return aliases.get(name, name)
+        if not self._alias_set:
+            return None
+        tokens = TOKEN_PATTERN.findall(lowered)
+        hits = self._alias_set.intersection(tokens)
+        if not hits:
+            return None
+        first = next(iter(hits)) if len(hits) == 1 else next(t for t in tokens if t in hits)
+        return aliases[first]
+
+    def signature(self, text: str) -> Optional[str]:
+        """First error signature in text (case-insensitive substring), or None."""
+        if self._signature_re is None or not text:
+            return None
+        match = self._signature_re.search(self._lower(text))
+        return match.group(0) if match else None
+
+
+def load_projects() -> dict:
+    """alias -> project_id: KNOWN_PROJECTS plus every name in the registry vocabulary."""
+    projects = {p: p for p in KNOWN_PROJECTS}
+    try:
+        from project_vocab import load
+        projects.update(load())
+    except Exception:
+        pass
+    return projects
+
+
+# Built on first use; rebuilt if the signature list changes (config reload).
+# The project vocabulary is read on the first project lookup: once per hook.
+_matcher = None
+
+
+def get_matcher(signatures: Iterable[str] = None) -> PromptMatcher:
+    """Process-wide matcher over known projects and the configured error signatures."""
+    global _matcher
+    if signatures is None:
+        from episode_config import get_error_signatures
+        signatures = get_error_signatures()
+    signatures = tuple(dict.fromkeys(s.lower() for s in signatures if s))
+    if _matcher is None or _matcher.signatures != signatures:
+        _matcher = PromptMatcher(load_projects, signatures)
+    return _matcher
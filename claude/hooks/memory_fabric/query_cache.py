@@ -0,0 +1,69 @@
+from __future__ import annotations
+# Memory Fabric Query Cache
+# LRU of `memory-hub assemble` results, held by the daemon and keyed on the
+# normalized prompt plus every other argument (project/type filters,
+# max-tokens, flags) and the caller's cwd. Entries are tagged with the store
+# generation and are ignored once any write has bumped it.
+
+from collections import OrderedDict
+from typing import Optional
+
+# Trailing characters that don't change what a prompt asks for ("continue." == "continue")
+_TRIM = " \t\n.!?,;:"
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    return " ".join(prompt.lower().split()).strip(_TRIM)
+
+
+def cache_key(args: list, cwd: str = "") -> Optional[tuple]:
+    """Cache key for an assemble invocation, or None if args aren't cacheable."""
+    if len(args) < 2 or args[0] != "assemble" or str(args[1]).startswith("--"):
+        return None
+    # Pair up options so ["--type", "decision"] and ["--json"] are order-independent
+    options = []
+    rest = [str(a) for a in args[2:]]
+    i = 0
+    while i < len(rest):
+        if i + 1 < len(rest) and not rest[i + 1].startswith("--"):
+            options.append((rest[i], rest[i + 1]))
+            i += 2
+        else:
+            options.append((rest[i], ""))
+            i += 1
+    return normalize_prompt(str(args[1])), tuple(sorted(options)), cwd or ""
+
+
+class AssembleCache:
+    """Bounded LRU of assemble output, valid for a single store generation."""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, args: list, generation: str, cwd: str = "") -> Optional[str]:
+        key = cache_key(args, cwd)
+        if key is None:
+            return None
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != generation:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, args: list, generation: str, output: str, cwd: str = ""):
+        key = cache_key(args, cwd)
+        if key is None or self.max_entries <= 0:
+            return
+        self._entries[key] = (generation, output)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
@@ -0,0 +1,182 @@
+from __future__ import annotations
+# Memory Fabric Redaction
+# Fallback secret redaction for when P008's memory_hub.redaction is not
+# installed. All rules (built-in plus config.json "redaction.patterns") are
+# compiled into one alternation, so text is rewritten in a single pass
+# instead of one re.sub per rule. Redactor.stream() redacts an iterable of
+# chunks and holds back each chunk's tail so secrets split across chunks
+# are still caught.
+#
+# Every built-in rule starts with a literal ("sk-", "gh", "@", "AKIA"), which
+# lets the regex engine skip straight to candidate characters. Emails are
+# found from their "@" and extended left over the local part in Python; a
+# pattern starting with the local part would be tried at every position.
+# The alternation has no named groups either (they disable that skip): the
+# rule behind a match is found by re-matching the rules at its start.
+#
+# Throughput: python bench/bench_redaction.py
+
+import re
+import string
+from typing import Iterable, Iterator, Optional
+
+# (name, pattern, replacement[, lead]). lead is the characters a match is
+# extended left over (at least one is required). Order matters where
+# patterns overlap: the first rule that matches at a position wins.
+RULES = [
+    ("anthropic_key", r'sk-ant-[a-zA-Z0-9\-_]+', '<REDACTED_TOKEN>'),
+    ("openai_key", r'sk-[a-zA-Z0-9]{20,}', '<REDACTED_TOKEN>'),
+    ("github_token", r'gh[pousr]_[a-zA-Z0-9]{36,}', '<REDACTED_TOKEN>'),
+    ("email", r'@[a-zA-Z0-9.-]+\.[A-Za-z]{2,}', '<REDACTED_EMAIL>', string.ascii_letters + string.digits + "._%+-"),
+    ("aws_key", r'AKIA[0-9A-Z]{16}', '<REDACTED_AWS_KEY>'),
+]
+
+# Characters kept back from each chunk for the next one in stream(); a
+# secret is only split if it needs more than this to match.
+STREAM_HOLD = 1024
+
+
+class Redactor:
+    """Single-pass redaction over a fixed list of rules."""
+
+    def __init__(self, rules: Iterable[tuple]):
+        self.rules = []
+        for name, pattern, replacement, *lead in rules:
+            self.rules.append((re.compile(pattern), replacement, frozenset(lead[0] if lead else "")))
+        self.pattern = re.compile("|".join(f"(?:{r[0].pattern})" for r in self.rules)) if self.rules else None
+
+    def _rewrite(self, text: str, cut: Optional[int] = None) -> tuple:
+        """(redacted text, end): text up to end with every secret in it replaced.
+
+        end is len(text), or with cut, about cut: a secret crossing cut is
+        seen whole, so end stops where it starts.
+        """
+        parts = []
+        last = 0
+        end = len(text) if cut is None else cut
+        match = self.pattern.search(text)
+        while match is not None:
+            pos, stop = match.span()
+            for regex, replacement, lead in self.rules:
+                if regex.match(text, pos):
+                    break
+            # The next match is searched from inside this one: a secret glued
+            # onto another ("a@b.cosk-ant-...", "ghp_...sk-...") starts inside
+            # it when the first one's character class takes the second's
+            # leading characters. The first is cut where the second starts,
+            # or if it no longer matches there, both are redacted as one;
+            # otherwise the second's tail would be left in the text. After a
+            # merge, a third glued secret cuts the second (tail), not the first.
+            inside = []
+            tail, tail_regex = pos, regex
+            following = self.pattern.search(text, pos + 1)
+            while following is not None and following.start() < stop:
+                if following.end() <= stop:
+                    inside.append(following)
+                else:
+                    shorter = tail_regex.match(text, tail, following.start())
+                    if shorter is not None:
+                        stop = shorter.end()
+                        break
+                    stop = following.end()
+                    tail = following.start()
+                    tail_regex = next(r for r, _, _ in self.rules if r.match(text, tail))
+                following = self.pattern.search(text, following.start() + 1)
+            start = pos
+            if lead:
+                while start > last and text[start - 1] in lead:
+                    start -= 1
+                if start == pos:
+                    # Not redacted: rescan from just past it, so secrets
+                    # inside it or glued onto it (which moved stop and
+                    # following past them) are still found
+                    match = self.pattern.search(text, pos + 1)
+                    continue
+            # A cut can leave a match from inside running past stop: it goes next
+            match = next((m for m in inside if m.end() > stop), following)
+            if cut is not None:
+                if start >= cut:
+                    break
+                if stop > cut:
+                    end = start
+                    break
+            parts.append(text[last:start])
+            parts.append(replacement)
+            last = stop
+        parts.append(text[last:end])
+        return "".join(parts), end
+
+    def redact(self, text: str) -> str:
+        """Text with every secret replaced."""
+        if not text or self.pattern is None:
+            return text
+        return self._rewrite(text)[0]
+
+    def stream(self, chunks: Iterable[str], hold: int = STREAM_HOLD) -> Iterator[str]:
+        """Redact a stream of text chunks; yields redacted text in order."""
+        pending = ""
+        for chunk in chunks:
+            pending += chunk
+            # Wait for at least hold new characters, so tiny chunks don't
+            # rescan the held tail each time
+            if len(pending) < 2 * hold:
+                continue
+            if self.pattern is None:
+                done, end = pending[:-hold], len(pending) - hold
+            else:
+                done, end = self._rewrite(pending, len(pending) - hold)
+            pending = pending[end:]
+            if done:
+                yield done
+        if pending:
+            yield self.redact(pending)
+
+
+def config_rules() -> list:
+    """Extra rules from config.json: {"redaction": {"patterns": [...]}}.
+
+    Each entry is a regex string or {"pattern": ..., "replacement": ...};
+    invalid regexes and ones using named groups or backreferences are
+    skipped. A pattern that doesn't start with a literal costs the single
+    pass its fast skip to candidate characters.
+    """
+    from episode_config import get_redaction_patterns
+
+    rules = []
+    for i, entry in enumerate(get_redaction_patterns()):
+        if isinstance(entry, str):
+            pattern, replacement = entry, "<REDACTED>"
+        elif isinstance(entry, dict) and isinstance(entry.get("pattern"), str):
+            pattern, replacement = entry["pattern"], str(entry.get("replacement") or "<REDACTED>")
+        else:
+            continue
+        try:
+            # Must also compile as one branch of the combined alternation
+            re.compile(f"x|(?:{pattern})")
+        except re.error:
+            continue
+        # Group names and numbers change once rules are combined
+        if re.search(r'\(\?P[<=]|\\[1-9]', pattern):
+            continue
+        rules.append((f"config_{i}", pattern, replacement))
+    return rules
+
+
+_redactor: Optional[Redactor] = None
+
+
+def get_redactor() -> Redactor:
+    """Process-wide redactor over the built-in and configured rules."""
+    global _redactor
+    if _redactor is None:
+        try:
+            extra = config_rules()
+        except Exception:
+            extra = []
+        _redactor = Redactor(RULES + extra)
+    return _redactor
+
+
+def redact(text: str) -> str:
+    """Redact secrets in text (single pass)."""
+    return get_redactor().redact(text)
@@ -3,7 +3,6 @@ from __future__ import annotations
 # SessionEnd hook - promote session notes to project memory + global registry + episode auto-record
 
 import json
-import subprocess
 import sys
 import os
 from datetime import datetime
@@ -12,56 +11,67 @@ from datetime import datetime
 sys.path.insert(0, os.path.dirname(__file__))
 
 from _util import (
+    delete_cache,
     get_project_id,
     get_session_id,
-    run_memory_hub,
     read_cache,
     read_hook_input,
     log_message
 )
-from episode_config import get_episodes_auto_record, get_episodes_redact
-
-# Try to import P008 redaction module (installed in memory-fabric venv)
-REDACT_AVAILABLE = False
-try:
-    from memory_hub.redaction import redact as redact_text
-    REDACT_AVAILABLE = True
-except ImportError:
-    # Fallback: simple redaction if P008 not available
-    import re
-
-    def redact_text(text: str) -> str:
-        """Simple fallback redaction if P008 not available."""
-        if not text:
-            return text
-        # Basic patterns
-        text = re.sub(r'sk-[a-zA-Z0-9]{20,}', '<REDACTED_TOKEN>', text)
-        text = re.sub(r'sk-ant-[a-zA-Z0-9\-_]+', '<REDACTED_TOKEN>', text)
-        text = re.sub(r'gh[pousr]_[a-zA-Z0-9]{36,}', '<REDACTED_TOKEN>', text)
-        text = re.sub(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[A-Za-z]{2,}', '<REDACTED_EMAIL>', text)
-        text = re.sub(r'AKIA[0-9A-Z]{16}', '<REDACTED_AWS_KEY>', text)
-        return text
+from episode_config import get_compaction, get_episodes_auto_record, get_episodes_redact, get_error_signatures
+import episode_index
+import hook_log
+import project_registry
+import project_vocab
+import session_evidence
+import session_store
+import session_summary
+from write_queue import submit
+import metrics
+
+# P008 redaction module (installed in memory-fabric venv), imported on first
+# use: only episode auto-record needs it
+_redact = None
+
+# Joins fields redacted in one call; no secret pattern spans it
+FIELD_SEPARATOR = "\n\x1f\n"
+
+
+def redact_text(text: str) -> str:
+    """Redact secrets with P008's redaction module, or the single-pass fallback if it isn't installed."""
+    global _redact
+    if _redact is None:
+        try:
+            from memory_hub.redaction import redact as _redact
+        except ImportError:
+            from redaction import redact as _redact
+    return _redact(text)
+
+
+def redact_fields(*fields: str) -> list:
+    """Redact several fields with one redaction pass over their concatenation."""
+    redacted = redact_text(FIELD_SEPARATOR.join(fields)).split(FIELD_SEPARATOR)
+    if len(redacted) != len(fields):
+        # The redactor touched a separator: fall back to one call per field
+        return [redact_text(f) if f else f for f in fields]
+    return redacted
 
 
 def get_git_remote_url(cwd: str) -> str:
     """Get git remote origin URL if available."""
     try:
-        result = subprocess.run(
-            ["git", "remote", "get-url", "origin"],
-            cwd=cwd,
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
-        if result.returncode == 0:
-            return result.stdout.strip()
+        from git_resolver import resolve
+        return resolve(cwd)["remote_url"]
     except Exception:
-        pass
-    return ""
+        return ""
 
 
-def write_global_registry_snapshot(project_id: str, cwd: str, session_id: str):
-    """Write a user-scope snapshot to the global project registry."""
+def write_global_registry_snapshot(project_id: str, cwd: str, session_id: str) -> dict:
+    """Write a user-scope snapshot to the global project registry.
+
+    Updates the local registry right away and returns the memory-hub write
+    for the caller to queue.
+    """
     git_url = get_git_remote_url(cwd)
     timestamp = datetime.now().isoformat()
 
@@ -73,21 +83,42 @@ def write_global_registry_snapshot(project_id: str, cwd: str, session_id: str):
         if user_prompt:
             summary_line = user_prompt[:100].replace("\n", " ")
 
+    # Indexed registry (latest snapshot per project) read by UserPromptSubmit
+    try:
+        project_registry.record_snapshot(project_id, git_url, summary_line, timestamp)
+    except Exception as e:
+        log_message(f"Error updating project registry: {e}", session_id, "error")
+    # Names a later prompt can use to refer to this project
+    try:
+        project_vocab.add_project(project_id, git_url)
+    except Exception as e:
+        log_message(f"Error updating project vocabulary: {e}", session_id, "error")
+
+    # Keep the snapshot in memory-hub too so it stays searchable
     # Content format: "project_id | git_url | timestamp | what_was_done"
     content = f"{project_id} | {git_url} | {timestamp} | {summary_line}"
 
-    output, code = run_memory_hub([
+    log_message(f"Global registry snapshot queued for {project_id}", session_id)
+    return {"args": [
         "write",
         content,
         "--type", "project_snapshot",
         "--source", "global:project_registry",
-        "--importance", "0.6"
-    ])
+        "--importance", "0.6",
+        "--json"
+    ]}
+
 
+def queue_writes(writes: list, session_id: str):
+    """Hand all of this session's memory-hub writes to the write-behind queue at once."""
+    if not writes:
+        return
+    with metrics.span("queue_write", ops=len(writes)):
+        output, code = submit(writes, session_id)
     if code == 0:
-        log_message(f"Global registry snapshot written for {project_id}", session_id)
+        log_message(f"SessionEnd: {len(writes)} write(s) {output or 'applied'}", session_id)
     else:
-        log_message(f"Error writing registry snapshot: {output}", session_id)
+        log_message(f"SessionEnd: error writing: {output}", session_id, "error")
 
 
 def main():
@@ -96,38 +127,41 @@ def main():
     cwd = hook_input.get("cwd", os.getcwd())
     session_id = get_session_id(hook_input)
 
-    project_id = get_project_id(cwd)
+    metrics.set_context("SessionEnd", session_id)
+
+    with metrics.span("project_resolution"):
+        project_id = get_project_id(cwd)
     log_message(f"SessionEnd: project={project_id}, session={session_id}", session_id)
 
     # Write global project registry snapshot
-    write_global_registry_snapshot(project_id, cwd, session_id)
+    with metrics.span("registry_snapshot"):
+        writes = [write_global_registry_snapshot(project_id, cwd, session_id)]
 
     # Read cached session data
     cache = read_cache(session_id)
 
     if not cache:
         log_message("No cache found, nothing to promote", session_id)
+        queue_writes(writes, session_id)
         sys.exit(0)
 
     # Summarize session - get memories for this session and promote importance
     # Write project-specific summary
     user_prompt = cache.get("user_prompt", "")
-    if user_prompt:
+    # Kept up to date turn by turn (session_summary.py); just rendered here
+    summary_line = session_summary.render(cache.get("summary"), fallback=user_prompt)
+    if summary_line:
         # Write summary to project scope
-        summary_content = f"[session-end:{session_id}] Session summary: {user_prompt[:200]}"
+        summary_content = f"[session-end:{session_id}] Session summary: {summary_line}"
 
-        output, code = run_memory_hub([
+        writes.append({"args": [
             "write",
             summary_content,
             "--type", "summary",
             "--source", f"project:{project_id}",
-            "--importance", "0.5"
-        ])
-
-        if code == 0:
-            log_message(f"Session summary written for {session_id}", session_id)
-        else:
-            log_message(f"Error: {output}", session_id)
+            "--importance", "0.5",
+            "--json"
+        ]})
 
     # Auto-record episode if enabled
     if get_episodes_auto_record() and project_id not in ("default", "tmp"):
@@ -136,26 +170,21 @@ def main():
             intent_raw = user_prompt[:200] if user_prompt else f"Session {session_id}"
             step_raw = f"Session {session_id} ended"
 
-            # Gather evidence from hook.log if available
-            evidence_raw = ""
+            # Outcome and evidence from the workspace hook.log (read from the end, this session only)
+            found = None
             workspace_dir = cache.get("cwd", "") if cache else ""
             if workspace_dir:
                 hook_log_path = os.path.join(workspace_dir, ".memory_fabric", "hook.log")
                 if os.path.exists(hook_log_path):
-                    try:
-                        with open(hook_log_path, 'r') as f:
-                            lines = f.readlines()
-                            # Get last 30 lines
-                            evidence_lines = lines[-30:] if len(lines) > 30 else lines
-                            evidence_raw = "".join(evidence_lines)
-                    except Exception:
-                        pass
+                    with metrics.span("evidence_scan"):
+                        found = session_evidence.extract(hook_log_path, since=cache.get("started_at"),
+                                                         signatures=get_error_signatures())
+            evidence_raw = " ".join(found["evidence"]) if found else ""
 
             # Apply redaction if enabled (default ON)
             if get_episodes_redact():
-                intent = redact_text(intent_raw)
-                step = redact_text(step_raw)
-                evidence = redact_text(evidence_raw) if evidence_raw else ""
+                with metrics.span("redact"):
+                    intent, step, evidence = redact_fields(intent_raw, step_raw, evidence_raw)
                 log_message(f"SessionEnd: auto-recorded episode for {project_id} (redact=on evidence=on)", session_id)
             else:
                 intent = intent_raw
@@ -168,27 +197,55 @@ def main():
                 "episode", "record",
                 "--project", project_id,
                 "--intent", intent,
-                "--outcome", "unknown",
+                "--outcome", found["outcome"] if found else "unknown",
                 "--step", step
             ]
+            if found:
+                cmd.extend(["--attempts", str(found["attempts"]), "--rollbacks", str(found["rollbacks"])])
             if evidence:
-                # Pass evidence via stdin or use a temp file approach
-                # For now, include key evidence in step
-                evidence_snippet = evidence.split('\n')[-3:] if evidence else []
-                if evidence_snippet:
-                    cmd.extend(["--step", f"{step} | Evidence: {' '.join(evidence_snippet)}"])
+                cmd.extend(["--step", f"{step} | Evidence: {evidence}"])
 
-            output, code = run_memory_hub(cmd)
+            writes.append({"args": cmd})
+            # Let the next prompt's pre-filter see this episode without asking memory-hub
+            episode_index.add_episode(project_id, intent, found["error_signatures"] if found else ())
         except Exception as e:
-            log_message(f"SessionEnd: auto-record failed: {e}", session_id)
+            log_message(f"SessionEnd: auto-record failed: {e}", session_id, "error")
 
-    # Clean up cache
-    cache_file = os.path.expanduser(f"~/.claude/hooks/memory_fabric/cache/{session_id}.json")
-    if os.path.exists(cache_file):
+    queue_writes(writes, session_id)
+
+    # Clean up cache, plus what sessions that never reached SessionEnd left behind
+    delete_cache(session_id)
+    try:
+        evicted = session_store.evict()
+        removed = session_store.cleanup_legacy_files()
+        if evicted or removed:
+            log_message(f"SessionEnd: evicted {evicted} stale sessions, removed {removed} legacy cache files",
+                        session_id)
+    except Exception as e:
+        log_message(f"SessionEnd: session cache eviction failed: {e}", session_id, "error")
+    try:
+        import note_fingerprints
+
+        dropped = note_fingerprints.evict()
+        if dropped:
+            log_message(f"SessionEnd: dropped {dropped} stale note fingerprints", session_id)
+    except Exception as e:
+        log_message(f"SessionEnd: note fingerprint eviction failed: {e}", session_id, "error")
+
+    # Age out old notes, snapshots and summaries (detached, at most every few hours)
+    if get_compaction():
         try:
-            os.remove(cache_file)
-        except Exception:
-            pass
+            import compaction
+
+            compaction.maybe_spawn()
+        except Exception as e:
+            log_message(f"SessionEnd: starting compaction failed: {e}", session_id, "error")
+
+    # Compress rotated hook logs and prune old ones
+    try:
+        hook_log.compress_rotated()
+    except Exception as e:
+        log_message(f"SessionEnd: log cleanup failed: {e}", session_id, "error")
 
     # Exit without JSON - session end should not block
     sys.exit(0)
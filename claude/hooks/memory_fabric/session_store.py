@@ -0,0 +1,153 @@
+from __future__ import annotations
+# Memory Fabric Session Store
+# Per-session hook state (last prompt, project, injected items) in one
+# SQLite database in WAL mode, replacing a JSON file per session.
+# UserPromptSubmit writes it, Stop / PreCompact / SessionEnd read it and
+# SessionEnd deletes it. Rows not touched for SESSION_TTL seconds belong to
+# sessions that never reached SessionEnd; SessionEnd evicts them too.
+
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from _util import CACHE_DIR
+
+SESSIONS_DB = CACHE_DIR / "sessions.db"
+# Sessions idle this long are treated as abandoned
+SESSION_TTL = 7 * 24 * 3600
+# Legacy <session_id>.json files removed per SessionEnd until none are left
+LEGACY_CLEANUP_BATCH = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    data       TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def _connect():
+    import sqlite3
+
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(SESSIONS_DB), timeout=5)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+@contextmanager
+def _db():
+    """Connection wrapped in a transaction, closed afterwards."""
+    conn = _connect()
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def _legacy_file(session_id: str):
+    return CACHE_DIR / f"{session_id}.json"
+
+
+def get(session_id: str) -> Optional[dict]:
+    """Stored state for session_id, or None."""
+    with _db() as conn:
+        row = conn.execute("SELECT data FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+    if row is None:
+        # Session started before the store existed: carry its file over once
+        return _import_legacy(session_id)
+    try:
+        return json.loads(row[0])
+    except ValueError:
+        return None
+
+
+def put(session_id: str, data: dict):
+    """Replace the state for session_id (one atomic upsert)."""
+    with _db() as conn:
+        conn.execute(
+            "INSERT INTO sessions (session_id, data, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (session_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+            (session_id, json.dumps(data), time.time())
+        )
+
+
+def delete(session_id: str):
+    """Drop the state for session_id."""
+    with _db() as conn:
+        conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+    try:
+        _legacy_file(session_id).unlink()
+    except OSError:
+        pass
+
+
+def evict(ttl: float = SESSION_TTL) -> int:
+    """Delete sessions idle for more than ttl seconds; returns how many."""
+    with _db() as conn:
+        return conn.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - ttl,)).rowcount
+
+
+def _import_legacy(session_id: str) -> Optional[dict]:
+    path = _legacy_file(session_id)
+    try:
+        data = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict):
+        return None
+    put(session_id, data)
+    try:
+        path.unlink()
+    except OSError:
+        pass
+    return data
+
+
+def cleanup_legacy_files(ttl: float = SESSION_TTL, limit: int = LEGACY_CLEANUP_BATCH) -> int:
+    """Remove up to limit orphaned <session_id>.json files older than ttl.
+
+    Other caches in the directory are named _*.json and are left alone.
+    Runs until a pass finds nothing to remove, then never again.
+    """
+    with _db() as conn:
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_cleaned'").fetchone():
+            return 0
+    cutoff = time.time() - ttl
+    removed = 0
+    remaining = False
+    try:
+        with os.scandir(CACHE_DIR) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".json") or entry.name.startswith("_"):
+                    continue
+                if removed >= limit:
+                    remaining = True
+                    break
+                try:
+                    if entry.stat().st_mtime < cutoff:
+                        os.unlink(entry.path)
+                        removed += 1
+                    else:
+                        # A live session's file; picked up by get() or removed by its SessionEnd
+                        remaining = True
+                except OSError:
+                    pass
+    except OSError:
+        return removed
+    if not remaining:
+        with _db() as conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_cleaned', ?)",
+                         (str(time.time()),))
+    return removed
@@ -0,0 +1,137 @@
+from __future__ import annotations
+# Memory Fabric Session Summary
+# Rolling summary of a session, kept in the session cache under "summary"
+# and updated every turn: UserPromptSubmit adds the prompt, Stop adds the
+# assistant's reply. SessionEnd renders it as the session's summary note
+# without re-reading anything.
+#
+# State (every part is bounded, so an update costs the same on turn 500 as
+# on turn 1):
+#   {"turns": 12,
+#    "first": "the prompt that opened the session",
+#    "prompts": [[score, turn, "salient prompt"], ...],   # best MAX_PROMPTS
+#    "decisions": ["We'll use WAL mode instead of ...", ...],  # newest MAX_DECISIONS
+#    "files": {"path/to/file.py": last_turn, ...},       # newest MAX_FILES
+#    "errors": {"HTTP 401": count, ...}}                  # first MAX_ERRORS seen
+
+import re
+from typing import Iterable
+
+MAX_PROMPTS = 4
+MAX_DECISIONS = 5
+MAX_FILES = 12
+MAX_ERRORS = 8
+# Stored length of a prompt or decision
+ITEM_CHARS = 160
+# Only this much of a message is scanned
+SCAN_CHARS = 4000
+# Prompts with fewer words ("yes", "continue", "ok do it") aren't kept
+MIN_PROMPT_WORDS = 4
+SUMMARY_CHARS = 800
+
+WORD_PATTERN = re.compile(r'[A-Za-z]{3,}')
+FILE_PATTERN = re.compile(
+    r'(?<![\w/.-])(?:[\w.-]+/)*[\w-]+\.(?:py|pyi|js|jsx|ts|tsx|go|rs|java|kt|rb|php|c|h|cc|cpp|hpp|cs|swift'
+    r'|sh|sql|md|rst|txt|json|jsonl|toml|yaml|yml|ini|cfg|html|css|scss|lock)(?![\w/])'
+)
+SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+|\n+')
+DECISION_PATTERN = re.compile(
+    r'\b(?:decided|decision|chose|chosen|going with|go with|switched to|switch to|instead of|'
+    r'root cause|the fix|fixed by|opted|we will|we\'ll|i\'ll use|will use|settled on)\b',
+    re.IGNORECASE
+)
+
+
+def empty() -> dict:
+    return {"turns": 0, "first": "", "prompts": [], "decisions": [], "files": {}, "errors": {}}
+
+
+def _clip(text: str) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= ITEM_CHARS else text[:ITEM_CHARS - 3] + "..."
+
+
+def _add_files(summary: dict, text: str, turn: int):
+    files = summary["files"]
+    for path in FILE_PATTERN.findall(text):
+        files.pop(path, None)
+        files[path] = turn
+    # Insertion order is recency order: the first keys are the stalest
+    while len(files) > MAX_FILES:
+        del files[next(iter(files))]
+
+
+def _add_errors(summary: dict, text: str, signatures: Iterable[str]) -> bool:
+    """Count the signatures text mentions; True if there were any."""
+    lower = text.lower()
+    errors = summary["errors"]
+    found = False
+    for signature in signatures:
+        if signature and signature.lower() in lower:
+            found = True
+            if signature in errors:
+                errors[signature] += 1
+            elif len(errors) < MAX_ERRORS:
+                errors[signature] = 1
+    return found
+
+
+def add_prompt(summary: dict, prompt: str, turn: int, signatures: Iterable[str] = ()) -> dict:
+    """Fold a user prompt into summary (created if empty); returns it."""
+    summary = summary if isinstance(summary, dict) and "prompts" in summary else empty()
+    text = prompt[:SCAN_CHARS]
+    summary["turns"] = max(summary["turns"], turn)
+    _add_files(summary, text, turn)
+    has_error = _add_errors(summary, text, signatures)
+
+    words = WORD_PATTERN.findall(text)
+    if not summary["first"]:
+        summary["first"] = _clip(text)
+    elif len(words) >= MIN_PROMPT_WORDS:
+        # Salience: distinct words, plus file and error mentions
+        score = min(len({w.lower() for w in words}), 40)
+        score += 5 * bool(FILE_PATTERN.search(text)) + 5 * has_error
+        prompts = summary["prompts"]
+        prompts.append([score, turn, _clip(text)])
+        if len(prompts) > MAX_PROMPTS:
+            # Evict the least salient; the older one on a tie
+            prompts.remove(min(prompts, key=lambda p: (p[0], p[1])))
+    return summary
+
+
+def add_response(summary: dict, message: str, turn: int, signatures: Iterable[str] = ()) -> dict:
+    """Fold an assistant reply into summary (created if empty); returns it."""
+    summary = summary if isinstance(summary, dict) and "prompts" in summary else empty()
+    text = message[:SCAN_CHARS]
+    _add_files(summary, text, turn)
+    _add_errors(summary, text, signatures)
+
+    decisions = summary["decisions"]
+    for sentence in SENTENCE_SPLIT.split(text):
+        if DECISION_PATTERN.search(sentence):
+            decision = _clip(sentence)
+            if decision not in decisions:
+                decisions.append(decision)
+            # One decision per reply keeps a chatty turn from flushing the rest
+            break
+    del decisions[:-MAX_DECISIONS]
+    return summary
+
+
+def render(summary: dict, fallback: str = "") -> str:
+    """One-line summary of the session, at most SUMMARY_CHARS long."""
+    if not isinstance(summary, dict) or not summary.get("first"):
+        return fallback[:200]
+    parts = [summary["first"]]
+    later = [p[2] for p in sorted(summary.get("prompts", []), key=lambda p: p[1])]
+    if later:
+        parts.append("Then: " + "; ".join(later))
+    if summary.get("decisions"):
+        parts.append("Decisions: " + "; ".join(summary["decisions"]))
+    if summary.get("files"):
+        parts.append("Files: " + ", ".join(reversed(list(summary["files"]))))
+    if summary.get("errors"):
+        parts.append("Errors: " + ", ".join(summary["errors"]))
+    parts.append(f"Turns: {summary.get('turns', 0)}")
+    text = " | ".join(parts)
+    return text if len(text) <= SUMMARY_CHARS else text[:SUMMARY_CHARS - 3] + "..."
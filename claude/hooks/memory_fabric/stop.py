@@ -12,11 +12,15 @@ sys.path.insert(0, os.path.dirname(__file__))
 from _util import (
     get_project_id,
     get_session_id,
-    run_memory_hub,
     read_cache,
     read_hook_input,
+    write_cache,
     log_message
 )
+from episode_config import get_error_signatures, get_note_dedupe
+from write_queue import submit
+import metrics
+import session_summary
 
 
 def main():
@@ -26,34 +30,66 @@ def main():
     session_id = get_session_id(hook_input)
     assistant_message = hook_input.get("last_assistant_message", "")
 
-    project_id = get_project_id(cwd)
+    metrics.set_context("Stop", session_id)
+
+    with metrics.span("project_resolution"):
+        project_id = get_project_id(cwd)
     log_message(f"Stop: project={project_id}, session={session_id}", session_id)
 
     # Read cached user prompt
-    cache = read_cache(session_id)
+    with metrics.span("cache_read"):
+        cache = read_cache(session_id)
     user_prompt = cache.get("user_prompt", "") if cache else ""
 
     if not user_prompt and not assistant_message:
         # Nothing to write
         sys.exit(0)
 
+    # Fold the reply into the rolling session summary SessionEnd writes
+    if cache is not None and assistant_message:
+        with metrics.span("summary"):
+            cache["summary"] = session_summary.add_response(cache.get("summary"), assistant_message,
+                                                            cache.get("turn", 0), get_error_signatures())
+            write_cache(session_id, cache)
+
     # Write assistant response as a memory
     # Use first 500 chars of response
     content = assistant_message[:500] if assistant_message else user_prompt[:500]
+    fingerprint = None
+    if content and get_note_dedupe():
+        # A near-duplicate of an earlier note is counted against it, not written
+        try:
+            import note_fingerprints
+
+            with metrics.span("note_dedupe"):
+                fingerprint, duplicate = note_fingerprints.check(project_id, session_id, content)
+            if duplicate:
+                log_message(f"Stop: skipped near-duplicate session note for {session_id}", session_id)
+                sys.exit(0)
+        except Exception as e:
+            log_message(f"Stop: note dedupe failed: {e}", session_id, "error")
+
     if content:
-        # Write as a session note
-        output, code = run_memory_hub([
-            "write",
-            f"[session:{session_id}] {content}",
-            "--type", "note",
-            "--source", f"session:{session_id}",
-            "--importance", "0.3"
-        ])
+        # Write as a session note (queued; applied by the background flusher)
+        with metrics.span("queue_write"):
+            output, code = submit([{"args": [
+                "write",
+                f"[session:{session_id}] {content}",
+                "--type", "note",
+                "--source", f"session:{session_id}",
+                "--importance", "0.3",
+                "--json"
+            ]}], session_id)
 
         if code == 0:
-            log_message(f"Wrote session note for {session_id}", session_id)
+            log_message(f"Wrote session note for {session_id} ({output or 'applied'})", session_id)
+            if fingerprint:
+                try:
+                    note_fingerprints.add(project_id, session_id, fingerprint)
+                except Exception as e:
+                    log_message(f"Stop: recording note fingerprint failed: {e}", session_id, "error")
         else:
-            log_message(f"Error writing: {output}", session_id)
+            log_message(f"Error writing: {output}", session_id, "error")
 
     # Exit without JSON output (side-effect only)
     sys.exit(0)
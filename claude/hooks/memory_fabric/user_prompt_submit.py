@@ -3,35 +3,93 @@ from __future__ import annotations
 # UserPromptSubmit hook - inject Memory Fabric context before Claude responds
 
 import json
-import subprocess
 import sys
 import os
-from datetime import datetime
+import threading
+import time
+from typing import Optional
 
 # Add hooks dir to path
 sys.path.insert(0, os.path.dirname(__file__))
 
 from _util import (
+    CACHE_DIR,
     get_project_id,
     extract_project_from_prompt,
     get_session_id,
     run_memory_hub,
+    read_cache,
     read_hook_input,
     write_cache,
     log_message
 )
+import context_budget
+import episode_index
+import metrics
+import project_registry
+import project_vocab
+import session_summary
 from episode_config import (
+    get_context_dedupe,
+    get_context_max_tokens,
     get_episodes_auto_inject,
     get_episodes_max_tokens,
+    get_error_signatures,
+    get_prompt_budget_ms,
+    get_registry_cache_ttl,
+    match_episodes,
     should_smart_inject
 )
 
 # Max recent projects to show
 MAX_RECENT_PROJECTS = 8
 
-
-def fetch_recent_projects() -> list:
+# Text each section adds to the context once it has an item (see render_context)
+SECTION_HEADERS = {
+    "registry": "<!-- GLOBAL_PROJECT_REGISTRY -->\n## Recent Projects\n<!-- END_GLOBAL_PROJECT_REGISTRY -->",
+    "episodes": "<!-- EPISODE_CONTEXT -->\n## Past Episodes\n<!-- END_EPISODE_CONTEXT -->",
+    "memories": "## Relevant Memories",
+    "summaries": "## Summaries",
+}
+# Multipliers on retrieval scores when packing (registry and summaries decay by rank instead)
+SECTION_WEIGHTS = {"registry": 0.3, "episodes": 1.2, "memories": 1.0, "summaries": 0.4}
+# Longest single memory / summary, in tokens; longer ones are cut
+MEMORY_MAX_TOKENS = 120
+SUMMARY_MAX_TOKENS = 80
+# Outer markers, the project override line and the still-in-context reference
+CONTEXT_OVERHEAD_TOKENS = 60
+# Injected-item keys remembered per session
+MAX_INJECTED_KEYS = 500
+
+# Rendered Recent Projects block, reused until TTL or a registry write
+RECENT_BLOCK_CACHE = CACHE_DIR / "_recent_projects.json"
+
+
+def fetch_recent_projects(timeout: float = 30) -> list:
     """Fetch recent project snapshots from global registry."""
+    try:
+        if not project_registry.needs_backfill():
+            return project_registry.recent_projects(MAX_RECENT_PROJECTS)
+    except Exception:
+        return []
+
+    # First run: import the snapshots memory-hub already has into the
+    # registry. Rows recorded before it (doctor.sh, a SessionEnd before the
+    # first prompt) don't count: older snapshots never overwrite them.
+    projects = search_registry_snapshots(timeout)
+    try:
+        for p in projects:
+            project_registry.record_snapshot(p["project_id"], p["git_url"], p["summary"], p["timestamp"])
+        project_registry.mark_backfilled()
+        project_vocab.rebuild()
+        return project_registry.recent_projects(MAX_RECENT_PROJECTS)
+    except Exception:
+        pass
+    return projects[:MAX_RECENT_PROJECTS]
+
+
+def search_registry_snapshots(timeout: float = 30) -> list:
+    """Latest snapshot per project from memory-hub, newest first (pre-registry data)."""
     # Search for project_registry entries using --project filter for exact source match
     output, code = run_memory_hub([
         "search",
@@ -39,7 +97,7 @@ def fetch_recent_projects() -> list:
         "--top-k", "50",  # Fetch more to ensure we get newest
         "--project", "global:project_registry",
         "--json"
-    ])
+    ], timeout=timeout)
 
     if code != 0 or not output.strip():
         return []
@@ -50,41 +108,133 @@ def fetch_recent_projects() -> list:
         return []
 
     # Parse results - format is "project_id | git_url | timestamp | summary"
-    # Use raw content as sort key to get truly latest (includes token number)
-    projects = []
+    latest = {}
     for r in results:
         content = r.get("content", "")
         # Parse: "p009_memory_fabric_global | https://github.com/... | 2026-02-26T... | summary"
         parts = content.split(" | ")
-        if len(parts) >= 1:
-            project_id = parts[0].strip()
-            git_url = parts[1].strip() if len(parts) > 1 else ""
-            timestamp = parts[2].strip() if len(parts) > 2 else ""
-            summary = parts[3].strip() if len(parts) > 3 else ""
-            projects.append({
-                "project_id": project_id,
-                "git_url": git_url,
-                "timestamp": timestamp,
-                "summary": summary,
-                "raw": content  # Use full content for sorting
-            })
-
-    # Sort by full content ascending (so newest is last)
-    projects.sort(key=lambda x: x.get("raw", ""))
-
-    # Deduplicate by project_id - keep the LATEST (iterate reversed to get newest)
-    seen = {}
-    unique = []
-    for p in reversed(projects):  # Iterate newest to oldest
-        pid = p["project_id"]
-        if pid and pid not in seen:
-            seen[pid] = True
-            unique.append(p)  # Keep first occurrence (newest)
-
-    # Reverse back to get correct order (newest first)
-    unique.reverse()
-
-    return unique[:MAX_RECENT_PROJECTS]
+        project_id = parts[0].strip()
+        timestamp = parts[2].strip() if len(parts) > 2 else ""
+        updated_at = project_registry.parse_timestamp(timestamp)
+        if not project_id or updated_at is None:
+            continue
+        if project_id in latest and latest[project_id]["updated_at"] >= updated_at:
+            continue
+        latest[project_id] = {
+            "project_id": project_id,
+            "git_url": parts[1].strip() if len(parts) > 1 else "",
+            "timestamp": timestamp,
+            "updated_at": updated_at,
+            "summary": parts[3].strip() if len(parts) > 3 else ""
+        }
+
+    return sorted(latest.values(), key=lambda p: p["updated_at"], reverse=True)
+
+
+def run_with_deadline(tasks: dict, budget: float, session_id: str) -> dict:
+    """Run named callables concurrently; return results of those done within budget seconds.
+
+    Tasks that miss the deadline or raise are dropped. Workers are daemon
+    threads, so a straggler never keeps the hook alive past the deadline
+    (and concurrent.futures, which pulls in logging, isn't imported).
+    """
+    outcomes = {}
+
+    def run(name, fn):
+        try:
+            outcomes[name] = (True, fn())
+        except Exception as e:
+            outcomes[name] = (False, e)
+
+    threads = {name: threading.Thread(target=run, args=(name, fn), daemon=True) for name, fn in tasks.items()}
+    for thread in threads.values():
+        thread.start()
+    deadline = time.monotonic() + budget
+    for thread in threads.values():
+        thread.join(max(0.0, deadline - time.monotonic()))
+
+    results = {}
+    for name, thread in threads.items():
+        if thread.is_alive():
+            log_message(f"UserPromptSubmit: {name} missed {budget:.1f}s deadline, dropped", session_id, "warning")
+            continue
+        ok, value = outcomes[name]
+        if ok:
+            results[name] = value
+        else:
+            log_message(f"UserPromptSubmit: {name} failed: {value}", session_id, "error")
+    return results
+
+
+def episode_context_of(response) -> str:
+    """episode_context of an `assemble --with-episodes` (output, returncode), or ""."""
+    if not response or response[1] != 0:
+        return ""
+    try:
+        data = json.loads(response[0].strip())
+    except json.JSONDecodeError:
+        return ""
+    context = data.get("episode_context") if isinstance(data, dict) else None
+    return context.strip() if isinstance(context, str) else ""
+
+
+def context_items(recent_block: str, episode_context: str, result: dict, episodes_max_tokens: int) -> list:
+    """Every candidate line for the injected context, scored for context_budget.pack."""
+    items = []
+    # Registry lines have no retrieval score: rank by recency (the block is newest first)
+    for rank, line in enumerate(recent_block.splitlines()[1:]):
+        items.append(context_budget.item("registry", line, SECTION_WEIGHTS["registry"] * 0.9 ** rank))
+
+    # memory-hub renders the episodes (Best Known Path, Pitfalls): kept whole, as one item
+    if episode_context:
+        items.append(context_budget.item("episodes", episode_context, SECTION_WEIGHTS["episodes"],
+                                         episodes_max_tokens))
+
+    for mem in result.get("memories") or []:
+        score = mem.get("score") if isinstance(mem.get("score"), (int, float)) else 0.5
+        text = f"- [{mem.get('type', 'general')}] {mem.get('content', '')}"
+        items.append(context_budget.item("memories", text, SECTION_WEIGHTS["memories"] * score,
+                                         MEMORY_MAX_TOKENS))
+
+    for rank, summary in enumerate(result.get("summaries") or []):
+        text = f"- {summary.get('content', '')}"
+        items.append(context_budget.item("summaries", text, SECTION_WEIGHTS["summaries"] * 0.9 ** rank,
+                                         SUMMARY_MAX_TOKENS))
+    return items
+
+
+def read_recent_block_cache() -> Optional[dict]:
+    """Return the cached Recent Projects block if within TTL and registry unchanged."""
+    ttl = get_registry_cache_ttl()
+    if ttl <= 0:
+        return None
+    try:
+        cached = json.loads(RECENT_BLOCK_CACHE.read_text())
+    except Exception:
+        return None
+    if time.time() - cached.get("created_at", 0) > ttl:
+        return None
+    if cached.get("generation") != project_registry.get_generation():
+        return None
+    return cached
+
+
+def write_recent_block_cache(block: str, count: int, generation: str):
+    """Cache the rendered Recent Projects block against the registry generation."""
+    if get_registry_cache_ttl() <= 0:
+        return
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = RECENT_BLOCK_CACHE.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps({
+            "generation": generation,
+            "created_at": time.time(),
+            "block": block,
+            "count": count
+        }))
+        os.replace(tmp, RECENT_BLOCK_CACHE)
+    except OSError:
+        pass
 
 
 def format_recent_projects_block(projects: list) -> str:
@@ -106,138 +256,218 @@ def format_recent_projects_block(projects: list) -> str:
     return "\n".join(lines)
 
 
+def render_context(sections: dict, project_override: Optional[str], project_id: str,
+                   repeated: Optional[dict] = None) -> str:
+    """Render the MEMORY_FABRIC_CONTEXT block from the packed items, by section.
+
+    repeated counts, per section, the items left out because an earlier
+    turn injected them unchanged; they get a one-line reference instead.
+    """
+    repeated = repeated or {}
+    context_parts = []
+    context_parts.append("<!-- MEMORY_FABRIC_CONTEXT -->")
+    if repeated:
+        counts = ", ".join(f"{n} {section}" for section, n in repeated.items())
+        context_parts.append(f"<!-- STILL_IN_CONTEXT: {counts} from earlier turns, unchanged -->")
+
+    # ALWAYS inject Recent Projects block first (global registry)
+    if sections.get("registry"):
+        context_parts.append("<!-- GLOBAL_PROJECT_REGISTRY -->")
+        context_parts.append("## Recent Projects")
+        context_parts.extend(sections["registry"])
+        context_parts.append("<!-- END_GLOBAL_PROJECT_REGISTRY -->")
+
+    # Add project override marker if applicable
+    if project_override:
+        context_parts.append(f"<!-- PROJECT_OVERRIDE: {project_id} -->")
+
+    # Add episode context if enabled (behind MEMORY_FABRIC_EPISODES=1)
+    if sections.get("episodes"):
+        context_parts.append("<!-- EPISODE_CONTEXT -->")
+        context_parts.append("## Past Episodes")
+        context_parts.extend(sections["episodes"])
+        context_parts.append("<!-- END_EPISODE_CONTEXT -->")
+
+    # Add memories
+    if sections.get("memories"):
+        context_parts.append("## Relevant Memories")
+        context_parts.extend(sections["memories"])
+
+    # Add summaries
+    if sections.get("summaries"):
+        context_parts.append("## Summaries")
+        context_parts.extend(sections["summaries"])
+
+    if not any(sections.get(s) or repeated.get(s) for s in ("memories", "summaries")):
+        context_parts.append("(No relevant memories found)")
+
+    context_parts.append("<!-- END_MEMORY_FABRIC_CONTEXT -->")
+
+    return "\n".join(context_parts)
+
+
+def remember_injected(session_id: str, session_cache: dict, keys: list):
+    """Add keys to the session's injected set, keeping the MAX_INJECTED_KEYS most recent."""
+    injected = session_cache["injected"]
+    for key in keys:
+        injected[key] = session_cache["turn"]
+    if len(injected) > MAX_INJECTED_KEYS:
+        newest = sorted(injected.items(), key=lambda kv: kv[1])[-MAX_INJECTED_KEYS:]
+        session_cache["injected"] = dict(newest)
+    write_cache(session_id, session_cache)
+
+
 def main():
     hook_input = read_hook_input()
 
     cwd = hook_input.get("cwd", os.getcwd())
     session_id = get_session_id(hook_input)
     user_prompt = hook_input.get("userPrompt") or hook_input.get("prompt") or ""
+    metrics.set_context("UserPromptSubmit", session_id)
 
     if not user_prompt:
         # No prompt to process
         sys.exit(0)
 
     # Project Resolver: Check if prompt mentions a known project
-    project_override = extract_project_from_prompt(user_prompt)
+    with metrics.span("project_resolution"):
+        project_override = extract_project_from_prompt(user_prompt)
+        # Use override if found, otherwise use cwd-based detection
+        project_id = project_override or get_project_id(cwd)
 
-    # Use override if found, otherwise use cwd-based detection
     if project_override:
-        project_id = project_override
         log_message(f"UserPromptSubmit: project={project_id} (override), session={session_id}", session_id)
     else:
-        project_id = get_project_id(cwd)
         log_message(f"UserPromptSubmit: project={project_id}, session={session_id}", session_id)
 
+    # Items earlier turns of this session injected (cleared by PreCompact)
+    session_cache = read_cache(session_id) or {}
+    injected = session_cache.get("injected") if get_context_dedupe() else None
+    if not isinstance(injected, dict):
+        injected = {}
+    turn = session_cache.get("turn", 0) + 1
+    with metrics.span("summary"):
+        summary = session_summary.add_prompt(session_cache.get("summary"), user_prompt, turn,
+                                             get_error_signatures())
+
     # Cache the prompt for later write-back
-    write_cache(session_id, {
+    session_cache = {
         "user_prompt": user_prompt,
         "project_id": project_id,
-        "cwd": cwd
-    })
+        "cwd": cwd,
+        "turn": turn,
+        "started_at": session_cache.get("started_at") or time.time(),
+        "injected": injected,
+        "summary": summary
+    }
+    write_cache(session_id, session_cache)
 
-    # ALWAYS fetch recent projects for the global registry snippet
-    recent_projects = fetch_recent_projects()
-    recent_block = format_recent_projects_block(recent_projects)
+    # Optional: Add episode context (always, or smart injection)
+    auto_inject_mode = get_episodes_auto_inject()
+    episodes_enabled = auto_inject_mode in ("1", "smart") and project_id and project_id not in ("tmp", "default")
+    budget = get_prompt_budget_ms() / 1000.0
+    tasks = {}
+    with_episodes = signature_hit = False
+    if episodes_enabled:
+        if auto_inject_mode == "smart":
+            # Local pre-filter: skip the episode retrieval when no stored episode shares words with the prompt
+            with metrics.span("episode_prefilter"):
+                candidate = episode_index.may_match(project_id, user_prompt)
+                stale = episode_index.is_stale(project_id)
+            if stale:
+                # Missing or old index: rebuild it alongside this prompt's (unfiltered) retrieval
+                tasks["episode_index"] = metrics.timed("episode_index_refresh", lambda: episode_index.refresh(
+                    project_id, timeout=budget
+                ))
+            # An error signature triggers smart injection without any episode match
+            signature_hit = should_smart_inject(user_prompt, matches=[])
+            with_episodes = candidate is not False or stale or signature_hit
+            if with_episodes and not signature_hit:
+                tasks["smart"] = metrics.timed("smart_inject_match", lambda: match_episodes(
+                    user_prompt, project_id, k=1, timeout=budget
+                ))
+        else:
+            with_episodes = True
 
-    # Build memory-hub assemble command for project-specific context
+    # Build memory-hub assemble command for project-specific context. With
+    # episodes it is one `assemble --project X --with-episodes` that returns
+    # memories, summaries and memory-hub's rendered episode context together.
+    max_tokens = get_context_max_tokens()
     cmd = [
         "assemble",
         user_prompt,
-        "--max-tokens", "1200",
+        "--max-tokens", str(max_tokens),
         "--json"
     ]
 
-    # If project override detected, add project filter to retrieval
-    if project_override:
+    # If project override detected (or episodes are wanted), add project filter to retrieval
+    if project_override or with_episodes:
         cmd.extend(["--project", project_id])
-
-    # Optional: Add episode context (smart injection)
-    auto_inject_mode = get_episodes_auto_inject()
-    episode_context = ""
-    should_inject = False
-
-    if auto_inject_mode == "1":
-        # Always inject
-        should_inject = True
-    elif auto_inject_mode == "smart":
-        # Smart injection: episode-match driven + error signature fallback
-        should_inject = should_smart_inject(user_prompt, project_id)
-
-    if should_inject and project_id and project_id not in ("tmp", "default"):
-        episode_cmd = cmd.copy()
-        # Add project filter for episode context (needed for both override and cwd-based)
-        if "--project" not in episode_cmd:
-            episode_cmd.extend(["--project", project_id])
-        episode_cmd.append("--with-episodes")
-        ep_output, ep_code = run_memory_hub(episode_cmd)
-        if ep_code == 0:
+    if with_episodes:
+        cmd.append("--with-episodes")
+
+    # All retrievals are independent: run them concurrently under one deadline
+    tasks["assemble"] = metrics.timed("assemble", lambda: run_memory_hub(cmd, timeout=budget))
+    # ALWAYS show recent projects for the global registry snippet (cached between snapshots)
+    recent_cache = read_recent_block_cache()
+    if recent_cache is None:
+        # Read the generation first so a concurrent write invalidates what we render
+        registry_generation = project_registry.get_generation()
+        tasks["registry"] = metrics.timed("registry_fetch", lambda: fetch_recent_projects(timeout=budget))
+
+    results = run_with_deadline(tasks, budget, session_id)
+
+    if recent_cache is not None:
+        metrics.record("registry_fetch", 0.0, cached=True)
+        recent_block, recent_count = recent_cache["block"], recent_cache["count"]
+    else:
+        recent_projects = results.get("registry") or []
+        recent_block, recent_count = format_recent_projects_block(recent_projects), len(recent_projects)
+        if "registry" in results:
+            write_recent_block_cache(recent_block, recent_count, registry_generation)
+
+    # Assemble from whatever finished; a missed or failed assemble only drops memories
+    result = {}
+    if "assemble" in results:
+        output, code = results["assemble"]
+        if code != 0:
+            log_message(f"Error assembling context: {output}", session_id, "error")
+        else:
             try:
-                ep_result = json.loads(ep_output.strip())
-                raw_context = ep_result.get("episode_context", "")
-                # Enforce max tokens
-                max_tokens = get_episodes_max_tokens()
-                if len(raw_context) > max_tokens * 4:
-                    raw_context = raw_context[:max_tokens * 4] + "..."
-                episode_context = raw_context
+                with metrics.span("parse_json"):
+                    # memory-hub may output leading whitespace, strip it
+                    result = json.loads(output.strip())
             except json.JSONDecodeError:
-                pass
+                log_message(f"Failed to parse JSON: {output}", session_id, "error")
 
-    output, code = run_memory_hub(cmd)
+    episode_context = ""
+    # Smart injection: episode-match driven + error signature fallback
+    if with_episodes and (auto_inject_mode == "1" or signature_hit or results.get("smart")):
+        episode_context = episode_context_of(results.get("assemble"))
 
-    if code != 0:
-        log_message(f"Error assembling context: {output}", session_id)
+    if not result and not recent_block and not episode_context:
         sys.exit(0)
 
-    try:
-        # memory-hub may output leading whitespace, strip it
-        result = json.loads(output.strip())
-    except json.JSONDecodeError:
-        log_message(f"Failed to parse JSON: {output}", session_id)
-        sys.exit(0)
-
-    # Build context from result
-    context_parts = []
-    context_parts.append("<!-- MEMORY_FABRIC_CONTEXT -->")
-
-    # ALWAYS inject Recent Projects block first (global registry)
-    if recent_block:
-        context_parts.append(f"<!-- GLOBAL_PROJECT_REGISTRY -->")
-        context_parts.append(recent_block)
-        context_parts.append("<!-- END_GLOBAL_PROJECT_REGISTRY -->")
-
-    # Add project override marker if applicable
-    if project_override:
-        context_parts.append(f"<!-- PROJECT_OVERRIDE: {project_id} -->")
-
-    # Add episode context if enabled (behind MEMORY_FABRIC_EPISODES=1)
-    if episode_context:
-        context_parts.append("<!-- EPISODE_CONTEXT -->")
-        context_parts.append(episode_context)
-        context_parts.append("<!-- END_EPISODE_CONTEXT -->")
-
-    # Add memories
-    memories = result.get("memories", [])
-    if memories:
-        context_parts.append("## Relevant Memories")
-        for mem in memories[:5]:  # Limit to top 5
-            content = mem.get("content", "")[:200]
-            mtype = mem.get("type", "general")
-            context_parts.append(f"- [{mtype}] {content}")
-
-    # Add summaries
-    summaries = result.get("summaries", [])
-    if summaries:
-        context_parts.append("## Summaries")
-        for s in summaries[:3]:
-            content = s.get("content", "")[:150]
-            context_parts.append(f"- {content}")
-
-    if not memories and not summaries:
-        context_parts.append("(No relevant memories found)")
-
-    context_parts.append("<!-- END_MEMORY_FABRIC_CONTEXT -->")
-
-    context = "\n".join(context_parts)
+    # One token budget across all sections, spent on the best items per token.
+    # Items already injected earlier in the session are only referenced.
+    with metrics.span("budget"):
+        items = context_items(recent_block, episode_context, result, get_episodes_max_tokens())
+        keys = [context_budget.item_key(it) for it in items]
+        repeated = {}
+        fresh = []
+        for it, key in zip(items, keys):
+            if key in injected:
+                repeated[it["section"]] = repeated.get(it["section"], 0) + 1
+            else:
+                it["key"] = key
+                fresh.append(it)
+        chosen = context_budget.pack(fresh, max_tokens - CONTEXT_OVERHEAD_TOKENS, headers=SECTION_HEADERS,
+                                     caps={"episodes": get_episodes_max_tokens()})
+    with metrics.span("render"):
+        context = render_context(context_budget.by_section(chosen), project_override, project_id, repeated)
+
+    if chosen and get_context_dedupe():
+        remember_injected(session_id, session_cache, [it["key"] for it in chosen])
 
     # Output JSON for hook
     output_json = {
@@ -248,7 +478,9 @@ def main():
     }
 
     print(json.dumps(output_json))
-    log_message(f"Injected context ({len(context)} chars), recent_projects={len(recent_projects)}", session_id)
+    log_message(f"Injected context ({len(context)} chars, ~{context_budget.estimate_tokens(context)} tokens, "
+                f"{len(chosen)}/{len(items)} items, {sum(repeated.values())} already injected), "
+                f"recent_projects={recent_count}", session_id)
 
 
 if __name__ == "__main__":
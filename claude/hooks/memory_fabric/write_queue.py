@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+# Memory Fabric Write Queue
+# Write-behind journal for Stop/SessionEnd: hooks append a record and return,
+# a detached flusher (this file run as a script) applies the writes.
+#
+# Journal record (one JSON object per line):
+#   {"id": "...", "ts": 1700000000.0, "session_id": "...", "attempts": 0,
+#    "retry_at": 0, "ops": [{"args": ["write", "..."], "input": null}]}
+#
+# Records are applied in `memory-hub batch` calls. Delivery is
+# at-least-once: a flusher that crashes mid-batch re-applies that batch on
+# the next run.
+
+import fcntl
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+# Add hooks dir to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from _util import RUNTIME_DIR, log_message, run_memory_hub, run_memory_hub_batch, spawn_detached
+from hub_batch import SKIPPED
+
+QUEUE_DIR = RUNTIME_DIR / "queue"
+JOURNAL = QUEUE_DIR / "journal.jsonl"
+# Held briefly by appenders and by the flusher while it swaps the journal out
+JOURNAL_LOCK = QUEUE_DIR / "journal.lock"
+# Held by the single running flusher
+FLUSH_LOCK = QUEUE_DIR / "flush.lock"
+DEAD_LETTER = QUEUE_DIR / "dead.jsonl"
+
+MAX_ATTEMPTS = 5
+# Stop flushing after this many seconds; whatever is left waits for the next run
+FLUSH_TIME_BUDGET = 120
+FLUSH_TIMEOUT = 30
+# Operations per `memory-hub batch` call
+BATCH_MAX_OPS = 50
+# While only records waiting for retry are left, check for new ones this often
+RETRY_POLL = 1.0
+
+
+@contextmanager
+def _locked(path: Path, blocking: bool = True):
+    """Hold an exclusive flock on path; yields False if non-blocking and busy."""
+    QUEUE_DIR.mkdir(parents=True, exist_ok=True)
+    fd = os.open(str(path), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+    finally:
+        os.close(fd)  # Releases the lock
+
+
+def _append(path: Path, records: list):
+    """Append records to a journal file in one write."""
+    if not records:
+        return
+    data = "".join(json.dumps(r) + "\n" for r in records).encode("utf-8")
+    with _locked(JOURNAL_LOCK):
+        fd = os.open(str(path), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+
+def enqueue(ops: list, session_id: str = "general", spawn: bool = True) -> bool:
+    """Queue memory-hub write operations ({"args": [...], "input": ...}) as one record.
+
+    Returns False if the journal could not be written; callers should then
+    fall back to running the writes directly.
+    """
+    record = {
+        "id": os.urandom(16).hex(),
+        "ts": time.time(),
+        "session_id": session_id,
+        "attempts": 0,
+        "retry_at": 0,
+        "ops": ops
+    }
+    try:
+        _append(JOURNAL, [record])
+    except OSError as e:
+        log_message(f"WriteQueue: enqueue failed: {e}", session_id, "error")
+        return False
+    if spawn:
+        ensure_flusher()
+    return True
+
+
+def ensure_flusher():
+    """Start a detached flusher unless one is already running."""
+    with _locked(FLUSH_LOCK, blocking=False) as acquired:
+        if not acquired:
+            return  # Running flusher re-checks the journal before it exits
+    try:
+        spawn_detached([sys.executable, os.path.abspath(__file__)])
+    except OSError:
+        pass
+
+
+def apply_ops(ops: list) -> list:
+    """Apply ops; return (returncode, output) per op, SKIPPED after the first failure."""
+    if len(ops) > 1:
+        results = run_memory_hub_batch(ops, timeout=FLUSH_TIMEOUT)
+        if results is not None:
+            return [(r.get("returncode", 1), r.get("stdout", "")) for r in results]
+
+    # Single op, or no batch support (wrapper predates it): one call per op
+    outcomes = []
+    failed = False
+    for op in ops:
+        if failed:
+            outcomes.append((SKIPPED, ""))
+            continue
+        output, code = run_memory_hub(op.get("args", []), op.get("input"), timeout=FLUSH_TIMEOUT)
+        outcomes.append((code, output))
+        failed = code != 0
+    return outcomes
+
+
+def apply_record(record: dict) -> tuple[bool, str]:
+    """Apply one record's operations in order; stop at the first failure."""
+    for code, output in apply_ops(record.get("ops", [])):
+        if code != 0:
+            return False, output
+    return True, ""
+
+
+def _chunks(records: list) -> list:
+    """Group records so each batch call carries at most BATCH_MAX_OPS operations."""
+    chunks, current, size = [], [], 0
+    for record in records:
+        n = len(record.get("ops", []))
+        if current and size + n > BATCH_MAX_OPS:
+            chunks.append(current)
+            current, size = [], 0
+        current.append(record)
+        size += n
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _read_records(path: Path) -> list:
+    records = []
+    try:
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    pass  # Torn line from a crash during append
+    except OSError:
+        pass
+    return records
+
+
+def _mark_done(done_path: Path, ids: list):
+    if ids:
+        with open(done_path, "a") as f:
+            f.write("".join(i + "\n" for i in ids))
+
+
+def _process_file(path: Path, deadline: float) -> int:
+    """Apply every due record in a swapped-out journal file; return how many were applied.
+
+    Ids of records that landed are appended to a .done file next to it, so
+    a crash only re-applies the batch that was in flight. Failed records are
+    requeued before they are marked, so a crash in between duplicates them
+    rather than losing them.
+    """
+    done_path = path.with_suffix(".done")
+    done = set()
+    try:
+        done = set(done_path.read_text().split())
+    except OSError:
+        pass
+
+    due, carry, dead = [], [], []
+    for record in _read_records(path):
+        if record.get("id") in done:
+            continue
+        if record.get("retry_at", 0) > time.time():
+            carry.append(record)
+        else:
+            due.append(record)
+
+    applied = 0
+    failing = False
+    # (session_id, args, output) of every write that landed, for the compaction ledger
+    landed = []
+    for chunk in _chunks(due):
+        # After one failure memory-hub is likely down: don't burn a timeout per batch
+        if failing or time.time() > deadline:
+            carry.extend(chunk)
+            continue
+        outcomes = apply_ops([op for record in chunk for op in record.get("ops", [])])
+        offset = 0
+        finished = []
+        for record in chunk:
+            n = len(record.get("ops", []))
+            results, offset = outcomes[offset:offset + n], offset + n
+            bad = next((i for i, (code, _) in enumerate(results) if code != 0), None)
+            landed.extend((record.get("session_id", "general"), op.get("args", []), output)
+                          for op, (code, output) in zip(record.get("ops", []), results) if code == 0)
+            if bad is None:
+                applied += 1
+                finished.append(record.get("id", ""))
+            else:
+                failing = True
+                code, error = results[bad]
+                # Retry only the operations that didn't land
+                record["ops"] = record["ops"][bad:]
+                if code != SKIPPED:
+                    record["attempts"] = record.get("attempts", 0) + 1
+                    record["last_error"] = error[:500]
+                if record.get("attempts", 0) >= MAX_ATTEMPTS:
+                    dead.append(record)
+                    log_message(f"WriteQueue: giving up on {record.get('id')}: {error[:200]}",
+                                record.get("session_id", "general"), "error")
+                else:
+                    record["retry_at"] = time.time() + 2 ** record.get("attempts", 0)
+                    carry.append(record)
+        _mark_done(done_path, finished)
+
+    try:
+        from compaction import record_writes
+        record_writes(landed)
+    except Exception as e:
+        log_message(f"WriteQueue: ledger update failed: {e}", "write_queue", "error")
+
+    # Requeue before marking and deleting, so a crash here duplicates rather than loses
+    _append(JOURNAL, carry)
+    _append(DEAD_LETTER, dead)
+    _mark_done(done_path, [r.get("id", "") for r in carry + dead])
+    for p in (path, done_path):
+        try:
+            p.unlink()
+        except OSError:
+            pass
+    return applied
+
+
+def flush(time_budget: float = FLUSH_TIME_BUDGET) -> int:
+    """Apply queued writes until the journal is drained; return records applied."""
+    deadline = time.time() + time_budget
+    total = 0
+    with _locked(FLUSH_LOCK, blocking=False) as acquired:
+        if not acquired:
+            return 0  # Another flusher is running
+
+        # Files left behind by a flusher that crashed
+        for leftover in sorted(QUEUE_DIR.glob("journal.*.processing")):
+            total += _process_file(leftover, deadline)
+
+        while time.time() < deadline:
+            wait = _seconds_until_due()
+            if wait is None:
+                break  # Drained
+            if wait > 0:
+                # Only records waiting for retry are left: sleep until the
+                # first is due, if that is within the budget. Polling picks
+                # up records queued meanwhile.
+                if time.time() + wait > deadline:
+                    break
+                time.sleep(min(wait, RETRY_POLL))
+                continue
+            with _locked(JOURNAL_LOCK):
+                if not JOURNAL.exists() or JOURNAL.stat().st_size == 0:
+                    continue
+                batch = QUEUE_DIR / f"journal.{time.time_ns()}.processing"
+                os.replace(JOURNAL, batch)
+            total += _process_file(batch, deadline)
+    return total
+
+
+def submit(ops: list, session_id: str = "general") -> tuple[str, int]:
+    """Queue ops, or run them right away if the journal can't be written.
+
+    Returns (output, returncode) like run_memory_hub.
+    """
+    if enqueue(ops, session_id):
+        return "queued", 0
+    ok, error = apply_record({"ops": ops})
+    return ("", 0) if ok else (error, 1)
+
+
+def _has_due_records() -> bool:
+    now = time.time()
+    return any(r.get("retry_at", 0) <= now for r in _read_records(JOURNAL))
+
+
+def _seconds_until_due() -> Optional[float]:
+    """Seconds until the first journal record is due (<= 0: now), or None if it is empty."""
+    retry_at = [r.get("retry_at", 0) for r in _read_records(JOURNAL)]
+    return min(retry_at) - time.time() if retry_at else None
+
+
+def pending_count() -> int:
+    """Number of records waiting in the journal (for doctor/diagnostics)."""
+    return len(_read_records(JOURNAL)) + sum(
+        len(_read_records(p)) for p in QUEUE_DIR.glob("journal.*.processing")
+    )
+
+
+def main():
+    import hook_log
+
+    hook_log.start_flush_thread()
+    applied = flush()
+    if applied:
+        log_message(f"WriteQueue: flushed {applied} record(s)", "write_queue")
+    # A hook may have appended after our last check but before we released the lock
+    if _has_due_records():
+        ensure_flusher()
+
+
+if __name__ == "__main__":
+    main()
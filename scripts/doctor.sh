@@ -5,7 +5,7 @@ ROOT="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)"
 HOME_DIR="${HOME}"
 VENV_PY="${HOME_DIR}/.local/share/memory-fabric/venv/bin/python"
 WRAPPER="${HOME_DIR}/.local/share/memory-fabric/bin/memory-hub"
-HOOK="${HOME_DIR}/.claude/hooks/memory_fabric/user_prompt_submit.py"
+HOOK="${HOME_DIR}/.claude/hooks/memory_fabric/dispatch.py"
 
 # Helper functions for fail-fast
 fail() {
@@ -26,13 +26,13 @@ echo "==> Check assemble punctuation (FTS sanitize regression)"
 ok "assemble punctuation"
 
 echo "==> Hook mock: prompt field"
-cat <<'JSON' | "${VENV_PY}" "${HOOK}" | python3 -m json.tool >/dev/null || fail "UserPromptSubmit prompt field"
+cat <<'JSON' | "${VENV_PY}" "${HOOK}" UserPromptSubmit | python3 -m json.tool >/dev/null || fail "UserPromptSubmit prompt field"
 {"hookEventName":"UserPromptSubmit","session_id":"doctor-prompt","cwd":"${ROOT}","prompt":"hello, do you see my project memory?"}
 JSON
 ok "UserPromptSubmit(prompt)"
 
 echo "==> Hook mock: userPrompt field"
-cat <<'JSON' | "${VENV_PY}" "${HOOK}" | python3 -m json.tool >/dev/null || fail "UserPromptSubmit userPrompt field"
+cat <<'JSON' | "${VENV_PY}" "${HOOK}" UserPromptSubmit | python3 -m json.tool >/dev/null || fail "UserPromptSubmit userPrompt field"
 {"hookEventName":"UserPromptSubmit","session_id":"doctor-userPrompt","cwd":"${ROOT}","userPrompt":"hello, do you see my project memory?"}
 JSON
 ok "UserPromptSubmit(userPrompt)"
@@ -40,7 +40,7 @@ ok "UserPromptSubmit(userPrompt)"
 echo "==> Hook mock: project override detection"
 # Test from outside project directory - should detect p009_memory_fabric_global
 INPUT='{"hookEventName":"UserPromptSubmit","session_id":"doctor-override","cwd":"/tmp","prompt":"status of p009_memory_fabric_global"}'
-OUTPUT=$(echo "$INPUT" | "${VENV_PY}" "${HOOK}")
+OUTPUT=$(echo "$INPUT" | "${VENV_PY}" "${HOOK}" UserPromptSubmit)
 # Extract and check additionalContext - must contain override marker
 CHECK_RESULT=$(echo "$OUTPUT" | python3 -c "
 import sys, json
@@ -60,7 +60,7 @@ ok "Project override detected from /tmp directory"
 echo "==> Hook mock: no override (existing behavior)"
 # Test without project mention - should NOT include override marker
 INPUT2='{"hookEventName":"UserPromptSubmit","session_id":"doctor-no-override","cwd":"/tmp","prompt":"hello world"}'
-OUTPUT2=$(echo "$INPUT2" | "${VENV_PY}" "${HOOK}")
+OUTPUT2=$(echo "$INPUT2" | "${VENV_PY}" "${HOOK}" UserPromptSubmit)
 CHECK_RESULT2=$(echo "$OUTPUT2" | python3 -c "
 import sys, json
 try:
@@ -79,12 +79,18 @@ ok "No override marker when prompt has no project mention"
 echo "==> Global Project Registry: write snapshot and verify retrieval"
 # Step 1: Write a registry snapshot for p009_memory_fabric_global
 REGISTRY_TOKEN="REGISTRY_E2E_TOKEN_$(date +%s)"
-"${WRAPPER}" write "p009_memory_fabric_global | https://github.com/test/p009 | 2026-02-26T12:00:00Z | ${REGISTRY_TOKEN}" --type project_snapshot --source "global:project_registry" >/dev/null || fail "write registry snapshot"
+# Same path session_end.py uses: upsert into the indexed registry
+"${VENV_PY}" -c "
+import sys
+sys.path.insert(0, '$(dirname "${HOOK}")')
+import project_registry
+project_registry.record_snapshot('p009_memory_fabric_global', 'https://github.com/test/p009', '${REGISTRY_TOKEN}')
+" || fail "write registry snapshot"
 echo "Wrote registry token: ${REGISTRY_TOKEN}"
 
 # Step 2: Call hook with generic prompt asking about recent projects
 INPUT_REG='{"hookEventName":"UserPromptSubmit","session_id":"doctor-registry","cwd":"/tmp","prompt":"what projects have we been working on recently?"}'
-OUTPUT_REG=$(echo "$INPUT_REG" | "${VENV_PY}" "${HOOK}")
+OUTPUT_REG=$(echo "$INPUT_REG" | "${VENV_PY}" "${HOOK}" UserPromptSubmit)
 
 # Step 3: Assert Recent Projects block exists AND contains the registry token
 # Must check both: section exists AND token is in that section
@@ -130,7 +136,7 @@ sleep 3
 
 # Step 2: From /tmp, call hook with prompt mentioning the project
 INPUT3='{"hookEventName":"UserPromptSubmit","session_id":"doctor-e2e","cwd":"/tmp","prompt":"status of p009_memory_fabric_global"}'
-OUTPUT3=$(echo "$INPUT3" | "${VENV_PY}" "${HOOK}")
+OUTPUT3=$(echo "$INPUT3" | "${VENV_PY}" "${HOOK}" UserPromptSubmit)
 
 # Step 3: Assert the unique token appears ONLY in the "## Relevant Memories" section
 # This is critical: Recent Projects block may contain old tokens, so we must check Relevant Memories
@@ -235,7 +241,7 @@ if [[ "${EPISODES_AUTO_INJECT:-smart}" == "smart" ]]; then
 
   # Step 2: SMART trigger prompt should INJECT episode
   SMART_TRIGGER_INPUT='{"hookEventName":"UserPromptSubmit","session_id":"smart-yes","cwd":"/tmp","prompt":"fix openclaw doctor e2e strict"}'
-  SMART_TRIGGER_OUTPUT=$(echo "$SMART_TRIGGER_INPUT" | "${VENV_PY}" "${HOOK}" 2>&1)
+  SMART_TRIGGER_OUTPUT=$(echo "$SMART_TRIGGER_INPUT" | "${VENV_PY}" "${HOOK}" UserPromptSubmit 2>&1)
 
   # Check if EPISODE_CONTEXT marker appears (actual injection indicator)
   if echo "$SMART_TRIGGER_OUTPUT" | python3 -c "import sys,json; d=json.load(sys.stdin); ctx=d.get('hookSpecificOutput',{}).get('additionalContext',''); print('INJECT' if '<!-- EPISODE_CONTEXT -->' in ctx else 'NO_INJECT')" 2>/dev/null | grep -q "INJECT"; then
@@ -246,7 +252,7 @@ if [[ "${EPISODES_AUTO_INJECT:-smart}" == "smart" ]]; then
 
   # Step 3: Generic prompt should NOT inject (check for EPISODE_CONTEXT marker, not token in memories)
   GENERIC_INPUT='{"hookEventName":"UserPromptSubmit","session_id":"smart-no","cwd":"/tmp","prompt":"hello how are you"}'
-  GENERIC_OUTPUT=$(echo "$GENERIC_INPUT" | "${VENV_PY}" "${HOOK}" 2>&1)
+  GENERIC_OUTPUT=$(echo "$GENERIC_INPUT" | "${VENV_PY}" "${HOOK}" UserPromptSubmit 2>&1)
 
   # Check specifically for EPISODE_CONTEXT markers - that's the actual injection indicator
   if echo "$GENERIC_OUTPUT" | python3 -c "import sys,json; d=json.load(sys.stdin); ctx=d.get('hookSpecificOutput',{}).get('additionalContext',''); print('NO_INJECT' if '<!-- EPISODE_CONTEXT -->' not in ctx else 'INJECT')" 2>/dev/null | grep -q "NO_INJECT"; then
@@ -37,11 +37,9 @@ mkdir -p "${CLAUDE_DIR}/hooks"
 
 echo "==> [3/7] Install/Update hooks (copy code, keep cache/logs)"
 mkdir -p "${HOOKS_DST}"
-cp -f "${HOOKS_SRC}/_util.py" "${HOOKS_DST}/_util.py"
-cp -f "${HOOKS_SRC}/user_prompt_submit.py" "${HOOKS_DST}/user_prompt_submit.py"
-cp -f "${HOOKS_SRC}/stop.py" "${HOOKS_DST}/stop.py"
-cp -f "${HOOKS_SRC}/pre_compact.py" "${HOOKS_DST}/pre_compact.py"
-cp -f "${HOOKS_SRC}/session_end.py" "${HOOKS_DST}/session_end.py"
+for src in "${HOOKS_SRC}"/*.py; do
+  cp -f "${src}" "${HOOKS_DST}/$(basename "${src}")"
+done
 mkdir -p "${HOOKS_DST}/cache" "${HOOKS_DST}/logs"
 
 echo "==> [4/7] Ensure runtime venv + install p008"
@@ -77,11 +75,35 @@ fi
 
 cat > "${WRAPPER}" <<EOF
 #!/usr/bin/env bash
-exec "${VENV_DIR}/bin/python" -m ${ENTRYPOINT_MODULE} "\$@"
+# Every command not known to be read-only appends to store.gen (before and
+# after), so cached query results are invalidated
+GEN="${RUNTIME_DIR}/store.gen"
+case "\${1:-} \${2:-}" in
+  " "|"--help "*|"-h "*|"assemble "*|"search "*|"episode match"|"episode list")
+    exec "${VENV_DIR}/bin/python" -m ${ENTRYPOINT_MODULE} "\$@"
+    ;;
+esac
+if [ "\${1:-}" = "batch" ]; then
+  # memory-hub batch: JSON list of write/record operations on stdin, applied in one process
+  shift
+  printf . >> "\${GEN}" 2>/dev/null || true
+  "${VENV_DIR}/bin/python" "${HOOKS_DST}/hub_batch.py" "\$@"
+  rc=\$?
+  printf . >> "\${GEN}" 2>/dev/null || true
+  exit \$rc
+fi
+printf . >> "\${GEN}" 2>/dev/null || true
+"${VENV_DIR}/bin/python" -m ${ENTRYPOINT_MODULE} "\$@"
+rc=\$?
+printf . >> "\${GEN}" 2>/dev/null || true
+exit \$rc
 EOF
 chmod +x "${WRAPPER}"
 "${WRAPPER}" --help >/dev/null
 
+# Hooks run through dispatch.py, which imports them: precompile so the first event is fast too
+"${VENV_DIR}/bin/python" -m compileall -q "${HOOKS_DST}" >/dev/null || true
+
 echo "==> [6/7] Patch ~/.claude/settings.json (backup + merge hooks block)"
 mkdir -p "${CLAUDE_DIR}"
 if [ -f "${SETTINGS}" ]; then
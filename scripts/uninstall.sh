@@ -7,6 +7,10 @@ CLAUDE_DIR="${HOME_DIR}/.claude"
 SETTINGS="${CLAUDE_DIR}/settings.json"
 HOOKS_DST="${CLAUDE_DIR}/hooks/memory_fabric"
 
+echo "==> Stop memory-hub daemon (if running)"
+pkill -f "hooks/memory_fabric/hub_daemon.py" 2>/dev/null || true
+rm -f "${HOME_DIR}/.local/share/memory-fabric/run/memory-hub.sock"
+
 echo "==> Remove hooks directory (keeps backups)"
 rm -rf "${HOOKS_DST}" || true
 